@@ -0,0 +1,380 @@
+"""
+Editing files that are too large to load into a QPlainTextEdit.
+
+The file is memory-mapped, so the operating system only reads the parts of it
+that are used. A background thread finds where each line starts, and reports
+its progress as it goes. The editor only ever puts the lines that fit into its
+window into a QPlainTextEdit. A separate scroll bar moves that window through
+the whole file.
+
+Edits are kept apart from the file. The document is a list of pieces, each of
+which is either a range of lines of the file or a list of edited lines. When
+the window moves, its lines replace the range of the document that it showed.
+Saving streams the unchanged ranges straight from the mapping, and the edited
+lines from memory, into a temporary file that then replaces the original.
+Writing over the original in place would change the mapping under our feet
+whenever an edit changes the length of the file. The file's line endings, \n or
+\r\n, are kept apart from the lines too, and written back for edited lines.
+"""
+
+from bisect import bisect_right
+from document_io import file_mode
+from PyQt6.QtCore import QObject, Qt, pyqtSignal
+from PyQt6.QtWidgets import QHBoxLayout, QPlainTextEdit, QScrollBar, QWidget
+from threading import Thread
+
+import mmap
+import numpy as np
+import os
+import tempfile
+
+class LargeFile(QObject):
+
+    # How many bytes the background thread looks for line breaks in at a time.
+    # It reports its progress after each chunk:
+    CHUNK_SIZE = 16 * 1024 * 1024
+
+    # Emitted in the background thread. Qt delivers them in the main thread:
+    progress = pyqtSignal(int)
+    indexed = pyqtSignal()
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self.is_modified = False
+        self._file = open(path, 'rb')
+        self._map_file()
+        # _starts[i] is the byte offset where line i starts. Once the whole
+        # file is indexed, it ends with the size of the file + 1, as if the
+        # last line ended with a line break:
+        self._starts = np.zeros(1, dtype=np.int64)
+        self._is_indexed = False
+        self._is_closed = False
+        # The document is made of pieces. A piece is either a (start, end)
+        # range of lines of the file, or a list of edited lines:
+        self._pieces = []
+        self._piece_starts = [0]
+        self._thread = Thread(target=self._index, daemon=True)
+    def _map_file(self):
+        self._size = os.fstat(self._file.fileno()).st_size
+        # Empty files can't be mapped:
+        self._map = b''
+        if self._size:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        # The file's line ending is that of its first line:
+        first_break = self._map.find(b'\n', 0, self.CHUNK_SIZE)
+        is_crlf = first_break > 0 and self._map[first_break - 1] == ord('\r')
+        self.newline = b'\r\n' if is_crlf else b'\n'
+    def start_indexing(self):
+        """
+        Starts finding the lines in a background thread. Connect to the
+        signals first.
+        """
+        self._thread.start()
+    def close(self):
+        self._is_closed = True
+        if self._thread.is_alive():
+            self._thread.join()
+        if self._size:
+            self._map.close()
+        self._file.close()
+    @property
+    def is_indexed(self):
+        return self._is_indexed
+    def line_count(self):
+        """
+        The number of lines in the document, or of those that were indexed so
+        far.
+        """
+        return self._piece_starts[-1]
+    def _index(self):
+        # Runs in a background thread.
+        starts = np.zeros(2, dtype=np.int64)
+        count = 1
+        for offset in range(0, self._size, self.CHUNK_SIZE):
+            if self._is_closed:
+                return
+            length = min(self.CHUNK_SIZE, self._size - offset)
+            chunk = np.frombuffer(self._map, np.uint8, length, offset)
+            line_breaks = np.flatnonzero(chunk == ord('\n'))
+            del chunk
+            if count + len(line_breaks) + 1 > len(starts):
+                grown = np.empty(max(2 * len(starts), count + len(line_breaks) + 1), dtype=np.int64)
+                grown[:count] = starts[:count]
+                starts = grown
+            starts[count:count + len(line_breaks)] = line_breaks + (offset + 1)
+            count += len(line_breaks)
+            # Publish the lines found so far. All but the last are complete:
+            self._starts = starts
+            self._set_pieces([(0, count - 1)])
+            self.progress.emit(100 * (offset + length) // self._size)
+        starts[count] = self._size + 1
+        self._starts = starts[:count + 1]
+        self._set_pieces([(0, count)])
+        self._is_indexed = True
+        self.indexed.emit()
+    def _set_pieces(self, pieces):
+        starts = [0]
+        for piece in pieces:
+            starts.append(starts[-1] + _piece_length(piece))
+        # Replace both at once, so other threads never see them out of step:
+        self._pieces, self._piece_starts = pieces, starts
+    def lines(self, first, count):
+        """
+        Returns up to `count` lines of the document from line `first` onwards.
+        """
+        pieces, piece_starts = self._pieces, self._piece_starts
+        end = min(first + count, piece_starts[-1])
+        result = []
+        index = bisect_right(piece_starts, first) - 1
+        while first < end:
+            piece = pieces[index]
+            offset = first - piece_starts[index]
+            num_lines = min(end, piece_starts[index + 1]) - first
+            if isinstance(piece, list):
+                result.extend(piece[offset:offset + num_lines])
+            else:
+                start = piece[0] + offset
+                data = self._line_bytes(start, start + num_lines)
+                lines = data.decode('utf-8', 'replace').split('\n')
+                if self.newline == b'\r\n':
+                    # QPlainTextEdit would turn each \r into a line break:
+                    lines = [line[:-1] if line.endswith('\r') else line for line in lines]
+                result.extend(lines)
+            first += num_lines
+            index += 1
+        return result
+    def _line_bytes(self, start, end):
+        # The lines from `start` to `end` of the file, without the last line
+        # break.
+        return self._map[self._starts[start]:self._starts[end] - 1]
+    def replace(self, first, count, lines):
+        """
+        Replaces `count` lines of the document from line `first` onwards by the
+        given list of lines.
+        """
+        self._wait_for_index()
+        end = self._piece_starts[-1]
+        pieces = self._slice(0, first) + [list(lines)] + self._slice(first + count, end)
+        self._set_pieces([piece for piece in pieces if _piece_length(piece)])
+        self.is_modified = True
+    def _slice(self, first, end):
+        # The pieces that make up the lines from `first` to `end`.
+        result = []
+        for piece, start in zip(self._pieces, self._piece_starts):
+            piece_end = start + _piece_length(piece)
+            if start < end and first < piece_end:
+                result.append(_piece_slice(piece, max(first - start, 0), min(end, piece_end) - start))
+        return result
+    def _wait_for_index(self):
+        if not self._is_indexed:
+            self._thread.join()
+    def save(self, path):
+        """
+        Writes the document to `path`. Afterwards, this object refers to the
+        saved file.
+        """
+        self._wait_for_index()
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(path))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                new_starts = self._write(f)
+            # mkstemp(...) creates the file with mode 0600:
+            os.chmod(temp_path, file_mode(path))
+            # The mapping must be closed before the file can be replaced on
+            # Windows:
+            if self._size:
+                self._map.close()
+            self._file.close()
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            if self._file.closed:
+                # The unchanged original is still needed, eg. to save the
+                # document elsewhere:
+                self._file = open(self.path, 'rb')
+                self._map_file()
+            raise
+        # The saved file's line index is known from writing it. So there is
+        # no need to index it again:
+        self.path = path
+        self._file = open(path, 'rb')
+        self._map_file()
+        self._starts = new_starts
+        self._set_pieces([(0, len(new_starts) - 1)])
+        self.is_modified = False
+    def _write(self, f):
+        # Returns the line index of what was written.
+        newline = self.newline
+        new_starts = []
+        position = 0
+        for i, piece in enumerate(self._pieces):
+            if i:
+                f.write(newline)
+                position += len(newline)
+            if isinstance(piece, list):
+                data = [line.encode('utf-8') for line in piece]
+                lengths = np.fromiter((len(line) + len(newline) for line in data), np.int64, len(data))
+                new_starts.append(position + np.cumsum(lengths) - lengths)
+                for block in range(0, len(data), 10000):
+                    f.write(newline.join(data[block:block + 10000]))
+                    if block + 10000 < len(data):
+                        f.write(newline)
+                position += int(lengths.sum()) - len(newline)
+            else:
+                start, end = piece
+                new_starts.append(self._starts[start:end] - self._starts[start] + position)
+                first_byte = int(self._starts[start])
+                last_byte = int(self._starts[end]) - 1
+                if newline == b'\r\n' and first_byte < last_byte < self._size and \
+                        self._map[last_byte - 1] == ord('\r'):
+                    # The line break after the piece is written above, \r and
+                    # all:
+                    last_byte -= 1
+                with memoryview(self._map) as view:
+                    for offset in range(first_byte, last_byte, self.CHUNK_SIZE):
+                        f.write(view[offset:min(offset + self.CHUNK_SIZE, last_byte)])
+                position += last_byte - first_byte
+        new_starts.append(np.array([position + 1], dtype=np.int64))
+        return np.concatenate(new_starts)
+
+def _piece_length(piece):
+    return len(piece) if isinstance(piece, list) else piece[1] - piece[0]
+
+def _piece_slice(piece, start, end):
+    if isinstance(piece, list):
+        return piece[start:end]
+    return piece[0] + start, piece[0] + end
+
+class LargeFileEditor(QWidget):
+    """
+    Shows a LargeFile in a QPlainTextEdit, a window of lines at a time.
+    """
+
+    progress = pyqtSignal(int)
+    indexed = pyqtSignal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._file = None
+        self._first = 0
+        self._num_shown = 0
+        self._text = _WindowTextEdit(self)
+        self._scroll_bar = QScrollBar(Qt.Orientation.Vertical)
+        self._scroll_bar.valueChanged.connect(self._show_lines)
+        layout = QHBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.setSpacing(0)
+        layout.addWidget(self._text)
+        layout.addWidget(self._scroll_bar)
+    def open(self, path):
+        """
+        Opens the file at `path` instead of the current one. Raises OSError if
+        it can't be opened, and then keeps the current one.
+        """
+        large_file = LargeFile(path)
+        self.close_file()
+        self._file = large_file
+        self._file.progress.connect(self._on_progress)
+        self._file.indexed.connect(self._on_indexed)
+        self._file.start_indexing()
+        self._first = 0
+        self._show_lines(0)
+    def close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._text.clear()
+    def is_modified(self):
+        if self._file is None:
+            return False
+        return self._file.is_modified or self._text.document().isModified()
+    def save(self, path):
+        """
+        Raises OSError if the file can't be saved. The edits are then kept.
+        """
+        self._commit()
+        self._file.save(path)
+        self._text.document().setModified(False)
+    def scroll_by(self, num_lines):
+        self._scroll_bar.setValue(self._scroll_bar.value() + num_lines)
+    def window_size(self):
+        return self._scroll_bar.pageStep()
+    def resizeEvent(self, e):
+        super().resizeEvent(e)
+        self._update_scroll_bar()
+        self._show_lines(self._scroll_bar.value())
+    def _on_progress(self, percent):
+        self._update_scroll_bar()
+        if self._num_shown < self._scroll_bar.pageStep():
+            self._show_lines(self._first)
+        self.progress.emit(percent)
+    def _on_indexed(self):
+        self._update_scroll_bar()
+        self._show_lines(self._first)
+        self.indexed.emit()
+    def _update_scroll_bar(self):
+        line_height = self._text.fontMetrics().lineSpacing()
+        window_size = max(self._text.viewport().height() // line_height, 1)
+        num_lines = self._file.line_count() if self._file else 0
+        self._scroll_bar.setPageStep(window_size)
+        self._scroll_bar.setRange(0, max(num_lines - window_size, 0))
+    def _commit(self):
+        # Puts the edits in the window into the document.
+        if self._text.document().isModified():
+            lines = self._text.toPlainText().split('\n')
+            self._file.replace(self._first, self._num_shown, lines)
+            # The window now shows the lines that replaced the old ones:
+            self._num_shown = len(lines)
+            self._text.document().setModified(False)
+            self._update_scroll_bar()
+    def _show_lines(self, first):
+        if self._file is None:
+            return
+        if self._text.document().isModified() and not self._file.is_indexed:
+            # Edits can only be put into the document once it is complete.
+            # Until then, keep showing the edited window:
+            return
+        self._commit()
+        cursor = self._text.textCursor()
+        row = cursor.blockNumber() + self._first - first
+        column = cursor.positionInBlock()
+        self._first = first
+        lines = self._file.lines(first, self._scroll_bar.pageStep())
+        self._num_shown = len(lines)
+        self._text.setPlainText('\n'.join(lines))
+        self._text.document().setModified(False)
+        if not lines:
+            return
+        # Keep the cursor on the same line of the document, as long as it is
+        # in the window:
+        block = self._text.document().findBlockByNumber(min(max(row, 0), len(lines) - 1))
+        cursor.setPosition(block.position() + min(column, block.length() - 1))
+        self._text.setTextCursor(cursor)
+
+class _WindowTextEdit(QPlainTextEdit):
+    """
+    A QPlainTextEdit that leaves scrolling to the LargeFileEditor.
+    """
+    def __init__(self, editor):
+        super().__init__()
+        self._editor = editor
+        self.setLineWrapMode(QPlainTextEdit.LineWrapMode.NoWrap)
+        self.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+    def wheelEvent(self, e):
+        self._editor.scroll_by(-3 * e.angleDelta().y() // 120)
+    def keyPressEvent(self, e):
+        key = e.key()
+        block = self.textCursor().blockNumber()
+        last_block = self.document().blockCount() - 1
+        if key == Qt.Key.Key_Up and block == 0:
+            self._editor.scroll_by(-1)
+        elif key == Qt.Key.Key_Down and block == last_block:
+            self._editor.scroll_by(1)
+        elif key == Qt.Key.Key_PageUp:
+            self._editor.scroll_by(-self._editor.window_size())
+        elif key == Qt.Key.Key_PageDown:
+            self._editor.scroll_by(self._editor.window_size())
+        else:
+            super().keyPressEvent(e)
@@ -1,41 +1,132 @@
 from PyQt6.QtWidgets import *
 from PyQt6.QtGui import QKeySequence, QAction
+from PyQt6.QtCore import QStandardPaths
+from document_io import AutosaveJournal, FileWorker
+from large_file import LargeFileEditor
+
+import os
+
+# Files at least this large are edited a window of lines at a time:
+LARGE_FILE_SIZE = 64 * 1024 * 1024
 
 class MainWindow(QMainWindow):
     def closeEvent(self, e):
-        if not text.document().isModified():
+        if not is_modified():
+            close_files()
             return
         answer = QMessageBox.question(
             window, None,
             "You have unsaved changes. Save before closing?",
-            QMessageBox.Save | QMessageBox.Discard | QMessageBox.Cancel
+            QMessageBox.StandardButton.Save | QMessageBox.StandardButton.Discard |
+            QMessageBox.StandardButton.Cancel
         )
-        if answer & QMessageBox.Save:
-            save()
-            if text.document().isModified():
-                # This happens when the user closes the Save As... dialog.
-                # We do not want to close the window in this case because it
-                # would throw away unsaved changes.
+        if answer == QMessageBox.StandardButton.Save:
+            saving = save()
+            # Wait for the background thread to write the file:
+            if (saving is not None and saving.result()) or is_modified():
+                # This happens when saving fails, or when the user closes the
+                # Save As... dialog. We do not want to close the window in
+                # this case because it would throw away unsaved changes.
                 e.ignore()
-        elif answer & QMessageBox.Cancel:
+            else:
+                close_files()
+        elif answer == QMessageBox.StandardButton.Discard:
+            close_files()
+        else:
             e.ignore()
 
 app = QApplication([])
 app.setApplicationName("Text Editor")
 text = QPlainTextEdit()
+large_text = LargeFileEditor()
+editors = QStackedWidget()
+editors.addWidget(text)
+editors.addWidget(large_text)
 window = MainWindow()
-window.setCentralWidget(text)
+window.setCentralWidget(editors)
+
+def is_large_file():
+    return editors.currentWidget() is large_text
+
+def is_modified():
+    if is_large_file():
+        return large_text.is_modified()
+    return text.document().isModified()
+
+large_text.progress.connect(
+    lambda percent: window.statusBar().showMessage(f"Loading... {percent}%")
+)
+large_text.indexed.connect(lambda: window.statusBar().showMessage("Loaded", 2000))
 
 file_path = None
 
+# Files are read and written in a background thread. Unsaved changes are
+# written to a journal every few seconds, so they can be recovered if the app
+# crashes:
+worker = FileWorker()
+journal = AutosaveJournal(text.document(), os.path.join(
+    QStandardPaths.writableLocation(QStandardPaths.StandardLocation.AppLocalDataLocation),
+    "autosave.journal"
+), worker)
+
+def discard_journal():
+    journal.stop()
+    worker.wait()
+
+def close_files():
+    # Stops the background threads before the window goes away. Otherwise,
+    # they may emit signals of objects that Qt has already deleted:
+    large_text.close_file()
+    discard_journal()
+
+def on_opened(path, contents):
+    global file_path
+    large_text.close_file()
+    journal.stop()
+    text.setPlainText(contents)
+    editors.setCurrentWidget(text)
+    file_path = path
+    journal.start(path)
+worker.opened.connect(on_opened)
+
+def on_saved(path):
+    global file_path
+    file_path = path
+worker.saved.connect(on_saved)
+
+def on_save_failed(path, message):
+    text.document().setModified(True)
+    show_save_error(path, message)
+worker.save_failed.connect(on_save_failed)
+
+def show_save_error(path, message):
+    QMessageBox.warning(window, None, f"Could not save {path}:\n{message}")
+
+def on_open_failed(path, message):
+    QMessageBox.warning(window, None, f"Could not open {path}:\n{message}")
+worker.open_failed.connect(on_open_failed)
+
 menu = window.menuBar().addMenu("&File")
 open_action = QAction("&Open")
 def open_file():
     global file_path
     path = QFileDialog.getOpenFileName(window, "Open")[0]
-    if path:
-        text.setPlainText(open(path).read())
+    if not path:
+        return
+    try:
+        is_large = os.path.getsize(path) >= LARGE_FILE_SIZE
+        if is_large:
+            large_text.open(path)
+    except OSError as e:
+        # An exception that escapes a slot would abort the app:
+        on_open_failed(path, str(e))
+        return
+    if is_large:
+        journal.stop()
+        editors.setCurrentWidget(large_text)
         file_path = path
+    else:
+        worker.open(path)
 open_action.triggered.connect(open_file)
 open_action.setShortcut(QKeySequence.StandardKey.Open)
 menu.addAction(open_action)
@@ -43,22 +134,31 @@ menu.addAction(open_action)
 save_action = QAction("&Save")
 def save():
     if file_path is None:
-        save_as()
-    else:
-        with open(file_path, "w") as f:
-            f.write(text.toPlainText())
-        text.document().setModified(False)
+        return save_as()
+    return save_to(file_path)
+def save_to(path):
+    global file_path
+    if is_large_file():
+        try:
+            large_text.save(path)
+        except OSError as e:
+            # The large file editor still has the edits and is still modified:
+            show_save_error(path, str(e))
+        else:
+            file_path = path
+        return None
+    text.document().setModified(False)
+    # file_path is only updated once the file was written, by on_saved(...):
+    return journal.save(path, text.toPlainText())
 save_action.triggered.connect(save)
 save_action.setShortcut(QKeySequence.StandardKey.Save)
 menu.addAction(save_action)
 
 save_as_action = QAction("Save &As...")
 def save_as():
-    global file_path
     path = QFileDialog.getSaveFileName(window, "Save As")[0]
     if path:
-        file_path = path
-        save()
+        return save_to(path)
 save_as_action.triggered.connect(save_as)
 menu.addAction(save_as_action)
 
@@ -80,5 +180,13 @@ def show_about_dialog():
     QMessageBox.about(window, "About Text Editor", text)
 about_action.triggered.connect(show_about_dialog)
 
+if journal.exists() and not journal.is_stale() and QMessageBox.question(
+    window, None, "The editor did not exit normally. Recover your unsaved changes?"
+) == QMessageBox.StandardButton.Yes:
+    file_path = journal.recover()
+    journal.start(file_path, text.toPlainText())
+else:
+    journal.start(None)
+
 window.show()
 app.exec()
@@ -0,0 +1,268 @@
+"""
+Opening and saving files without blocking the GUI, and autosaving.
+
+FileWorker reads and writes files in a background thread. A save writes to a
+temporary file next to the target, and then renames it over the target. So a
+crash in the middle of saving never leaves a half-written file behind.
+
+AutosaveJournal protects the edits since the last save. Rewriting the whole
+document every few seconds would be as slow as saving. Instead, the journal
+starts with a snapshot, ie. the file that was last opened or saved, and then
+only appends the changes reported by QTextDocument.contentsChange. When the
+app starts, it checks for a journal that was left behind by a crash, and
+replays it on top of the snapshot.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+from PyQt6.QtGui import QTextCursor
+
+import json
+import os
+import stat
+import tempfile
+
+class FileWorker(QObject):
+
+    # These are emitted in the background thread. Qt delivers them in the
+    # main thread:
+    opened = pyqtSignal(str, str)
+    open_failed = pyqtSignal(str, str)
+    saved = pyqtSignal(str)
+    save_failed = pyqtSignal(str, str)
+
+    def __init__(self):
+        super().__init__()
+        # A single thread, so tasks run in the order they were submitted:
+        self._pool = ThreadPoolExecutor(1)
+    def open(self, path):
+        """
+        Reads the file in the background. Emits `opened` with its text.
+        """
+        self._pool.submit(self._open, path)
+    def save(self, path, text, then=None):
+        """
+        Writes `text` to `path` in the background. `then(path)` is called in
+        the background thread when the file was written. Returns a Future whose
+        result is None, or an error message.
+        """
+        return self._pool.submit(self._save, path, text, then)
+    def submit(self, fn, *args):
+        return self._pool.submit(fn, *args)
+    def wait(self):
+        """
+        Waits for all tasks submitted so far.
+        """
+        self._pool.submit(lambda: None).result()
+    def _open(self, path):
+        # Runs in the background thread.
+        try:
+            with open(path) as f:
+                text = f.read()
+        except (OSError, UnicodeDecodeError) as e:
+            self.open_failed.emit(path, str(e))
+        else:
+            self.opened.emit(path, text)
+    def _save(self, path, text, then):
+        # Runs in the background thread.
+        try:
+            write_atomically(path, text)
+        except (OSError, UnicodeEncodeError) as e:
+            self.save_failed.emit(path, str(e))
+            return str(e)
+        if then is not None:
+            then(path)
+        self.saved.emit(path)
+
+def write_atomically(path, text):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(path))
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        # mkstemp(...) creates the file with mode 0600:
+        os.chmod(temp_path, file_mode(path))
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+def file_mode(path):
+    """
+    Returns the permissions for writing the file at `path`: Those of the
+    existing file, or the default ones for a new file.
+    """
+    try:
+        return stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        return 0o666 & ~_UMASK
+
+def _get_umask():
+    # The umask can only be read by setting it. Do this once, while no other
+    # threads create files:
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+_UMASK = _get_umask()
+
+class AutosaveJournal(QObject):
+
+    # How often the changes are written to the journal, in milliseconds:
+    INTERVAL = 5000
+
+    # When the changes in the journal add up to more than this many
+    # characters, the journal is started again with a snapshot of the text:
+    MAX_CHANGES = 4 * 1024 * 1024
+
+    def __init__(self, document, path, worker):
+        super().__init__()
+        self.path = path
+        self._document = document
+        self._worker = worker
+        self._changes = []
+        self._num_changed = 0
+        # The file the journal's snapshot refers to. Only used in the
+        # background thread, so it changes in step with the journal:
+        self._file_path = None
+        self._is_recording = False
+        self._timer = QTimer(self)
+        self._timer.timeout.connect(self.flush)
+    def start(self, file_path, text=None):
+        """
+        Starts a new journal on top of the given file as it is on disk. Call
+        this after the document was loaded from `file_path`, or cleared if it
+        is None. If the document's `text` differs from the file, pass it too.
+        """
+        self._discard_changes()
+        self._worker.submit(self._write_snapshot, file_path, text)
+        if not self._is_recording:
+            self._document.contentsChange.connect(self._on_contents_change)
+            self._is_recording = True
+            self._timer.start(self.INTERVAL)
+    def stop(self):
+        """
+        Stops recording changes and deletes the journal. Eg. before loading
+        a file into the document, or when the app exits normally.
+        """
+        if self._is_recording:
+            self._document.contentsChange.disconnect(self._on_contents_change)
+            self._is_recording = False
+            self._timer.stop()
+        self._discard_changes()
+        self._worker.submit(self._remove)
+    def save(self, file_path, text):
+        """
+        Saves the document in the background. Once it is saved, the journal
+        starts again on top of the saved file.
+        """
+        # If saving fails, the journal must still have all changes since its
+        # snapshot:
+        self.flush()
+        return self._worker.save(file_path, text, self._write_snapshot)
+    def flush(self):
+        """
+        Appends the changes since the last flush to the journal.
+        """
+        if self._num_changed > self.MAX_CHANGES:
+            # Replaying would take longer than loading a snapshot:
+            self._discard_changes()
+            text = self._document.toPlainText()
+            self._worker.submit(self._write_text_snapshot, text)
+        elif self._changes:
+            changes = self._changes
+            self._changes = []
+            self._worker.submit(self._append, changes)
+    def exists(self):
+        return os.path.exists(self.path)
+    def recover(self):
+        """
+        Replays the journal into the document. Returns the path of the file
+        the edits were made to, or None for a new file.
+        """
+        with open(self.path, encoding='utf-8') as f:
+            header = json.loads(f.readline())
+            if 'text' in header:
+                text = header['text']
+            elif header['path'] is None:
+                text = ''
+            else:
+                with open(header['path']) as document_file:
+                    text = document_file.read()
+            self._document.setPlainText(text)
+            cursor = QTextCursor(self._document)
+            end = self._document.characterCount() - 1
+            for line in f:
+                try:
+                    position, num_removed, added = json.loads(line)
+                except ValueError:
+                    # The app crashed while writing this line.
+                    break
+                # Qt counts the paragraph separator at the end of the
+                # document in some changes. Leave it out:
+                cursor.setPosition(min(position, end))
+                cursor.setPosition(min(position + num_removed, end), QTextCursor.MoveMode.KeepAnchor)
+                cursor.insertText(added)
+                end = self._document.characterCount() - 1
+        self._document.setModified(True)
+        return header['path']
+    def is_stale(self):
+        """
+        True if the file the journal was started on has changed since. Then
+        the journal can't be replayed.
+        """
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                header = json.loads(f.readline())
+        except (OSError, ValueError):
+            return True
+        if 'text' in header or header['path'] is None:
+            return False
+        try:
+            stat = os.stat(header['path'])
+        except OSError:
+            return True
+        return [stat.st_size, stat.st_mtime_ns] != header['stat']
+    def _on_contents_change(self, position, num_removed, num_added):
+        added = ''
+        if num_added:
+            cursor = QTextCursor(self._document)
+            cursor.setPosition(position)
+            end = min(position + num_added, self._document.characterCount() - 1)
+            cursor.setPosition(end, QTextCursor.MoveMode.KeepAnchor)
+            # selectedText() separates paragraphs with U+2029:
+            added = cursor.selectedText().replace('\u2029', '\n')
+        self._changes.append((position, num_removed, added))
+        self._num_changed += len(added) + 1
+    def _discard_changes(self):
+        self._changes = []
+        self._num_changed = 0
+    def _write_text_snapshot(self, text):
+        # Runs in the background thread.
+        self._write_snapshot(self._file_path, text)
+    def _write_snapshot(self, file_path, text=None):
+        # Runs in the background thread.
+        self._file_path = file_path
+        header = {'path': file_path}
+        if text is not None:
+            header['text'] = text
+        elif file_path is not None:
+            stat = os.stat(file_path)
+            header['stat'] = [stat.st_size, stat.st_mtime_ns]
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        write_atomically(self.path, json.dumps(header) + '\n')
+    def _append(self, changes):
+        # Runs in the background thread.
+        lines = [json.dumps(change) + '\n' for change in changes]
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.writelines(lines)
+            f.flush()
+            os.fsync(f.fileno())
+    def _remove(self):
+        # Runs in the background thread.
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
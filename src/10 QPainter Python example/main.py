@@ -2,24 +2,82 @@ from PyQt6.QtWidgets import *
 from PyQt6.QtGui import *
 from PyQt6.QtCore import *
 from PyQt6.QtMultimedia import QSound
+from document_io import AutosaveJournal, FileWorker
+
+import os
 
 class PlainTextEdit(QPlainTextEdit):
+
+    # The holes are kept in a grid of cells this many pixels wide, so only
+    # those near the area that is drawn need to be looked at:
+    CELL_SIZE = 64
+
     def __init__(self):
         super().__init__()
-        self._holes = []
+        self._holes = {}
+        self._num_holes = 0
         self._bullet = QPixmap("bullet.png")
         size = self._bullet.size()
-        self._offset = QPoint(size.width() / 2, size.height() / 2)
+        self._offset = QPoint(size.width() // 2, size.height() // 2)
+        # Each hole is drawn onto this transparent layer once. Painting then
+        # only copies the part of the layer that needs to be repainted:
+        self._layer = QPixmap()
     def mousePressEvent(self, e):
-        self._holes.append(e.pos())
+        hole = e.pos()
+        cell = (hole.x() // self.CELL_SIZE, hole.y() // self.CELL_SIZE)
+        # Numbered, so overlapping holes are always drawn in the same order:
+        self._holes.setdefault(cell, []).append((self._num_holes, hole))
+        self._num_holes += 1
+        self._update_layer()
+        painter = QPainter(self._layer)
+        painter.drawPixmap(hole - self._offset, self._bullet)
+        painter.end()
         super().mousePressEvent(e)
-        self.viewport().update()
+        self.viewport().update(QRect(hole - self._offset, self._bullet.size()))
         QSound.play("shot.wav")
     def paintEvent(self, e):
         super().paintEvent(e)
+        self._update_layer()
+        rect = QRectF(e.rect())
+        ratio = self._layer.devicePixelRatio()
+        source = QRectF(rect.topLeft() * ratio, rect.size() * ratio)
         painter = QPainter(self.viewport())
-        for hole in self._holes:
+        painter.drawPixmap(rect, self._layer, source)
+    def _update_layer(self):
+        # Makes the layer as large as the viewport, and draws the holes in
+        # the parts that are new.
+        size = self.viewport().size()
+        ratio = self.viewport().devicePixelRatio()
+        old_layer = self._layer
+        if old_layer.deviceIndependentSize() == QSizeF(size) and \
+                old_layer.devicePixelRatio() == ratio:
+            return
+        self._layer = QPixmap(size * ratio)
+        self._layer.setDevicePixelRatio(ratio)
+        self._layer.fill(Qt.GlobalColor.transparent)
+        new_area = QRegion(QRect(QPoint(), size))
+        painter = QPainter(self._layer)
+        if not old_layer.isNull() and old_layer.devicePixelRatio() == ratio:
+            painter.drawPixmap(0, 0, old_layer)
+            old_size = old_layer.deviceIndependentSize().toSize()
+            new_area = new_area.subtracted(QRegion(QRect(QPoint(), old_size)))
+        if new_area.isEmpty():
+            return
+        painter.setClipRegion(new_area)
+        for hole in self._holes_in(new_area.boundingRect()):
             painter.drawPixmap(hole - self._offset, self._bullet)
+    def _holes_in(self, rect):
+        # The holes that may cover part of the given rectangle, in the order
+        # they were made.
+        size = self._bullet.size()
+        rect = rect.adjusted(-size.width(), -size.height(), size.width(), size.height())
+        columns = range(rect.left() // self.CELL_SIZE, rect.right() // self.CELL_SIZE + 1)
+        rows = range(rect.top() // self.CELL_SIZE, rect.bottom() // self.CELL_SIZE + 1)
+        holes = []
+        for x in columns:
+            for y in rows:
+                holes.extend(hole for hole in self._holes.get((x, y), ()) if rect.contains(hole[1]))
+        return [hole for _, hole in sorted(holes, key=lambda hole: hole[0])]
 
 app = QApplication([])
 text = PlainTextEdit()
@@ -30,15 +88,24 @@ text.setPlainText("Click with the mouse below to shoot ;-)")
 class MainWindow(QMainWindow):
     def closeEvent(self, e):
         if not text.document().isModified():
+            discard_journal()
             return
         answer = QMessageBox.question(
             window, None,
             "You have unsaved changes. Save before closing?",
-            QMessageBox.Save | QMessageBox.Discard | QMessageBox.Cancel
+            QMessageBox.StandardButton.Save | QMessageBox.StandardButton.Discard |
+            QMessageBox.StandardButton.Cancel
         )
-        if answer & QMessageBox.Save:
-            save()
-        elif answer & QMessageBox.Cancel:
+        if answer == QMessageBox.StandardButton.Save:
+            saving = save()
+            # Wait for the background thread to write the file:
+            if (saving is not None and saving.result()) or text.document().isModified():
+                e.ignore()
+            else:
+                discard_journal()
+        elif answer == QMessageBox.StandardButton.Discard:
+            discard_journal()
+        else:
             e.ignore()
 
 app.setApplicationName("Text Editor")
@@ -47,14 +114,43 @@ window.setCentralWidget(text)
 
 file_path = None
 
+worker = FileWorker()
+journal = AutosaveJournal(text.document(), os.path.join(
+    QStandardPaths.writableLocation(QStandardPaths.StandardLocation.AppLocalDataLocation),
+    "autosave.journal"
+), worker)
+
+def discard_journal():
+    journal.stop()
+    worker.wait()
+
+def on_opened(path, contents):
+    global file_path
+    journal.stop()
+    text.setPlainText(contents)
+    file_path = path
+    journal.start(path)
+worker.opened.connect(on_opened)
+
+def on_saved(path):
+    global file_path
+    file_path = path
+worker.saved.connect(on_saved)
+
+def on_save_failed(path, message):
+    text.document().setModified(True)
+    QMessageBox.warning(window, None, f"Could not save {path}:\n{message}")
+worker.save_failed.connect(on_save_failed)
+worker.open_failed.connect(
+    lambda path, message: QMessageBox.warning(window, None, f"Could not open {path}:\n{message}")
+)
+
 menu = window.menuBar().addMenu("&File")
 open_action = QAction("&Open")
 def open_file():
-    global file_path
     path = QFileDialog.getOpenFileName(window, "Open")[0]
     if path:
-        text.setPlainText(open(path).read())
-        file_path = path
+        worker.open(path)
 open_action.triggered.connect(open_file)
 open_action.setShortcut(QKeySequence.Open)
 menu.addAction(open_action)
@@ -62,22 +158,21 @@ menu.addAction(open_action)
 save_action = QAction("&Save")
 def save():
     if file_path is None:
-        save_as()
-    else:
-        with open(file_path, "w") as f:
-            f.write(text.toPlainText())
-        text.document().setModified(False)
+        return save_as()
+    return save_to(file_path)
+def save_to(path):
+    text.document().setModified(False)
+    # file_path is only updated once the file was written, by on_saved(...):
+    return journal.save(path, text.toPlainText())
 save_action.triggered.connect(save)
 save_action.setShortcut(QKeySequence.Save)
 menu.addAction(save_action)
 
 save_as_action = QAction("Save &As...")
 def save_as():
-    global file_path
     path = QFileDialog.getSaveFileName(window, "Save As")[0]
     if path:
-        file_path = path
-        save()
+        return save_to(path)
 save_as_action.triggered.connect(save_as)
 menu.addAction(save_as_action)
 
@@ -99,5 +194,14 @@ def show_about_dialog():
     QMessageBox.about(window, "About Text Editor", text)
 about_action.triggered.connect(show_about_dialog)
 
+if journal.exists() and not journal.is_stale() and QMessageBox.question(
+    window, None, "The editor did not exit normally. Recover your unsaved changes?"
+) == QMessageBox.StandardButton.Yes:
+    file_path = journal.recover()
+    journal.start(file_path, text.toPlainText())
+else:
+    # The journal starts with the text the editor shows initially:
+    journal.start(None, text.toPlainText())
+
 window.show()
 app.exec()
\ No newline at end of file
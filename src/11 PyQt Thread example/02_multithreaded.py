@@ -1,12 +1,12 @@
 from PyQt6.QtCore import *
 from PyQt6.QtWidgets import *
-from requests import Session
+from chat import ChatClient
+from collections import deque
 from threading import Thread
-from time import sleep
+import sys
 
 name = input("Please enter your name: ")
-chat_url = "https://build-system.fman.io/chat"
-server = Session()
+chat_url = sys.argv[1] if len(sys.argv) > 1 else "https://build-system.fman.io/chat"
 
 # GUI:
 app = QApplication([])
@@ -21,29 +21,24 @@ window.setLayout(layout)
 window.show()
 
 # Event handlers:
-new_messages = []
-def fetch_new_messages():
-    while True:
-        response = server.get(chat_url).text
-        if response:
-            new_messages.append(response)
-        sleep(.5)
-
-thread = Thread(target=fetch_new_messages, daemon=True)
+new_messages = deque()
+chat = ChatClient(chat_url, on_message=new_messages.append)
+
+thread = Thread(target=chat.receive_forever, daemon=True)
 thread.start()
 
 def display_new_messages():
     while new_messages:
-        text_area.appendPlainText(new_messages.pop(0))
+        text_area.appendPlainText(new_messages.popleft())
 
 def send_message():
-    server.post(chat_url, {"name": name, "message": message.text()})
+    chat.send(name, message.text())
     message.clear()
 
 # Signals:
 message.returnPressed.connect(send_message)
 timer = QTimer()
 timer.timeout.connect(display_new_messages)
-timer.start(1000)
+timer.start(50)
 
 app.exec()
\ No newline at end of file
@@ -1,13 +1,12 @@
 from PyQt6.QtCore import *
 from PyQt6.QtWidgets import *
-from requests import Session
+from chat import ChatClient
 from threading import Thread
 from threadutil import run_in_main_thread
-from time import sleep
+import sys
 
 name = input("Please enter your name: ")
-chat_url = "https://build-system.fman.io/chat"
-server = Session()
+chat_url = sys.argv[1] if len(sys.argv) > 1 else "https://build-system.fman.io/chat"
 
 # GUI:
 app = QApplication([])
@@ -22,22 +21,16 @@ window.setLayout(layout)
 window.show()
 
 append_message = run_in_main_thread(text_area.appendPlainText)
-
-def fetch_new_messages():
-    while True:
-        response = server.get(chat_url).text
-        if response:
-            append_message(response)
-        sleep(.5)
+chat = ChatClient(chat_url, on_message=append_message)
 
 def send_message():
-    server.post(chat_url, {"name": name, "message": message.text()})
+    chat.send(name, message.text())
     message.clear()
 
 # Signals:
 message.returnPressed.connect(send_message)
 
-thread = Thread(target=fetch_new_messages, daemon=True)
+thread = Thread(target=chat.receive_forever, daemon=True)
 thread.start()
 
 app.exec()
\ No newline at end of file
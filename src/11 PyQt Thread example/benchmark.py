@@ -0,0 +1,62 @@
+"""
+Compares how quickly the chat client receives messages when it polls the
+server and when it streams them over a single connection. Runs against the
+local stand-in server in chat_server.py:
+
+    python benchmark.py [num_messages]
+
+For each mode, this sends num_messages messages as fast as possible and
+reports how many arrived per second, their end-to-end latency and how many
+HTTP requests the server had to handle.
+"""
+
+from chat import ChatClient
+from chat_server import ChatServer
+from collections import deque
+from statistics import median
+from threading import Thread
+from time import perf_counter, sleep
+
+import sys
+
+def run(mode, num_messages, deadline):
+    server = ChatServer(('localhost', 0))
+    server.start()
+    received = deque()
+    def on_message(text):
+        received.append((text, perf_counter()))
+    receiver = ChatClient(server.url, on_message, stream=mode == 'streaming')
+    Thread(target=receiver.receive_forever, daemon=True).start()
+    # Give the receiver time to connect:
+    sleep(.2)
+    sender = ChatClient(server.url, None)
+    start = perf_counter()
+    for _ in range(num_messages):
+        sender.send('benchmark', repr(perf_counter()))
+    while len(received) < num_messages and perf_counter() - start < deadline:
+        sleep(.01)
+    end = perf_counter()
+    latencies = [
+        arrived - float(text.split(': ', 1)[1]) for text, arrived in received
+    ]
+    num_requests = server.room.num_requests - num_messages
+    server.stop()
+    return len(received), end - start, latencies, num_requests
+
+def main():
+    num_messages = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    print('%-10s %9s %10s %12s %12s %9s' % (
+        'mode', 'received', 'msgs/sec', 'median (ms)', 'max (ms)', 'requests'
+    ))
+    for mode in ('polling', 'streaming'):
+        received, elapsed, latencies, num_requests = \
+            run(mode, num_messages, deadline=10)
+        print('%-10s %9d %10.1f %12.1f %12.1f %9d' % (
+            mode, received, received / elapsed,
+            median(latencies) * 1000 if latencies else float('nan'),
+            max(latencies) * 1000 if latencies else float('nan'),
+            num_requests
+        ))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+A chat client that receives messages over a single, long-lived connection.
+
+Instead of asking the server for new messages every half second, it sends one
+request that the server keeps open. The server then streams each message to
+the client as soon as it arrives. Messages are passed to a callback in the
+background thread that calls receive_forever(). The callback must therefore be
+thread-safe, such as deque.append or a function wrapped by
+threadutil.run_in_main_thread.
+
+If the server does not support streaming, then the client falls back to polling
+it every poll_interval seconds, like the original examples.
+"""
+
+from json import loads
+from requests import Session
+from requests.exceptions import RequestException
+from time import sleep
+
+class ChatClient:
+    def __init__(self, url, on_message, stream=True, poll_interval=.5,
+                 read_timeout=30):
+        self.url = url
+        self._on_message = on_message
+        self._stream = stream
+        self._poll_interval = poll_interval
+        # The server sends a heartbeat more often than this. If we don't
+        # receive anything for this long, then the connection is dead:
+        self._read_timeout = read_timeout
+        # A Session is not thread-safe. So use one for receiving messages in
+        # the background thread and another one for sending them:
+        self._receiving = Session()
+        self._sending = Session()
+        self._next_id = None
+    def send(self, name, message):
+        self._sending.post(self.url, {"name": name, "message": message})
+    def receive_forever(self):
+        while True:
+            try:
+                if self._stream:
+                    self._receive_stream()
+                else:
+                    self._poll()
+            except (RequestException, ValueError, KeyError, TypeError):
+                # A network error, or a garbled message from the server.
+                # Reconnect, and continue after the last message we received:
+                sleep(self._poll_interval)
+    def _receive_stream(self):
+        params = {"stream": 1}
+        if self._next_id is not None:
+            # Don't miss messages that arrived while we were reconnecting:
+            params["since"] = self._next_id
+        response = self._receiving.get(
+            self.url, params=params, stream=True,
+            timeout=(self._poll_interval * 10, self._read_timeout)
+        )
+        with response:
+            if response.headers.get("X-Chat-Stream") != "1":
+                # The server ignored our request to stream messages.
+                self._handle_poll_response(response)
+                sleep(self._poll_interval)
+                return
+            # chunk_size=None yields data as soon as it arrives:
+            for line in response.iter_lines(chunk_size=None):
+                if not line:
+                    # A heartbeat.
+                    continue
+                message = loads(line)
+                self._next_id = message["id"] + 1
+                self._on_message(message["text"])
+    def _poll(self):
+        self._handle_poll_response(self._receiving.get(self.url))
+        sleep(self._poll_interval)
+    def _handle_poll_response(self, response):
+        if response.text:
+            self._on_message(response.text)
@@ -0,0 +1,146 @@
+"""
+A local stand-in for the chat server. Start it with
+
+    python chat_server.py [port]
+
+and pass its URL to the examples, eg.:
+
+    python 02_multithreaded.py http://localhost:8000/chat
+
+It supports two ways of receiving messages:
+
+ * GET /chat returns the next message, or nothing if there is none. This is
+   what the polling clients use.
+ * GET /chat?stream=1[&since=<id>] keeps the connection open and streams
+   messages as they arrive. Each one is sent as a line of JSON of the form
+   {"id": ..., "text": ...}. Empty lines are heartbeats.
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from json import dumps
+from threading import Condition, Thread
+from urllib.parse import parse_qs, urlparse
+
+import sys
+
+class ChatRoom:
+    def __init__(self):
+        self._messages = []
+        self._next_polled = 0
+        self._condition = Condition()
+        self._is_closed = False
+        self.num_requests = 0
+    def count_request(self):
+        with self._condition:
+            self.num_requests += 1
+    def post(self, text):
+        with self._condition:
+            self._messages.append(text)
+            self._condition.notify_all()
+    def poll(self):
+        with self._condition:
+            if self._next_polled < len(self._messages):
+                self._next_polled += 1
+                return self._messages[self._next_polled - 1]
+            return ''
+    def wait(self, since, timeout):
+        """
+        Returns the messages from index `since` onwards. Waits up to `timeout`
+        seconds for one to arrive. Returns None if the room was closed.
+        """
+        with self._condition:
+            self._condition.wait_for(
+                lambda: len(self._messages) > since or self._is_closed,
+                timeout
+            )
+            if self._is_closed:
+                return None
+            return self._messages[since:]
+    def __len__(self):
+        with self._condition:
+            return len(self._messages)
+    def close(self):
+        with self._condition:
+            self._is_closed = True
+            self._condition.notify_all()
+
+class ChatRequestHandler(BaseHTTPRequestHandler):
+
+    # Required for persistent connections and chunked responses:
+    protocol_version = 'HTTP/1.1'
+
+    HEARTBEAT_INTERVAL = 15
+
+    def do_POST(self):
+        self.server.room.count_request()
+        length = int(self.headers.get('Content-Length', 0))
+        form = parse_qs(self.rfile.read(length).decode('utf-8'))
+        name = form.get('name', [''])[0]
+        message = form.get('message', [''])[0]
+        self.server.room.post(name + ': ' + message)
+        self._send_text('')
+    def do_GET(self):
+        self.server.room.count_request()
+        query = parse_qs(urlparse(self.path).query)
+        if query.get('stream') == ['1']:
+            since = int(query.get('since', [len(self.server.room)])[0])
+            self._stream(since)
+        else:
+            self._send_text(self.server.room.poll())
+    def _send_text(self, text):
+        body = text.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    def _stream(self, since):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.send_header('X-Chat-Stream', '1')
+        self.end_headers()
+        try:
+            while True:
+                messages = self.server.room.wait(since, self.HEARTBEAT_INTERVAL)
+                if messages is None:
+                    break
+                lines = ''.join(
+                    dumps({'id': since + i, 'text': text}) + '\n'
+                    for i, text in enumerate(messages)
+                )
+                self._write_chunk(lines or '\n')
+                since += len(messages)
+            self._write_chunk('')
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+    def _write_chunk(self, text):
+        data = text.encode('utf-8')
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+        self.wfile.flush()
+    def log_message(self, format, *args):
+        pass
+
+class ChatServer(ThreadingHTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self, address=('localhost', 8000)):
+        super().__init__(address, ChatRequestHandler)
+        self.room = ChatRoom()
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return 'http://%s:%d/chat' % (host, port)
+    def start(self):
+        Thread(target=self.serve_forever, daemon=True).start()
+    def stop(self):
+        self.room.close()
+        self.shutdown()
+        self.server_close()
+
+if __name__ == '__main__':
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8000
+    server = ChatServer(('localhost', port))
+    print('Chat server running at ' + server.url)
+    server.serve_forever()
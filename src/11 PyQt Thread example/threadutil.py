@@ -1,22 +1,94 @@
-from PyQt6.QtCore import QObject, pyqtSignal
+from collections import deque
+from PyQt6.QtCore import QObject, Qt, pyqtSignal, pyqtSlot
+from threading import Lock
 
-class CurrentThread(QObject):
+class Dispatcher(QObject):
+    """
+    Runs functions submitted from any thread in the thread this object lives
+    in. Pending calls are run in batches, once per event loop iteration. Calls
+    submitted with the same key collapse into the most recent one.
+    """
 
-    _on_execute = pyqtSignal(object, tuple, dict)
+    _wake_up = pyqtSignal()
 
     def __init__(self):
-        super(QObject, self).__init__()
-        self._on_execute.connect(self._execute_in_thread)
+        super().__init__()
+        # deque.append(...) and .popleft() are atomic, so submitting a call
+        # never blocks on the thread that runs it.
+        self._calls = deque()
+        self._latest_calls = {}
+        self._is_scheduled = False
+        self._wake_up.connect(
+            self._run_pending_calls, Qt.ConnectionType.QueuedConnection
+        )
 
-    def execute(self, f, args, kwargs):
-        self._on_execute.emit(f, args, kwargs)
+    def execute(self, f, args, kwargs, key=None):
+        if key is None:
+            self._calls.append((f, args, kwargs))
+        else:
+            self._latest_calls[key] = (f, args, kwargs)
+            self._calls.append(_Coalesced(key))
+        self._schedule()
 
-    def _execute_in_thread(self, f, args, kwargs):
-        f(*args, **kwargs)
+    def _schedule(self):
+        # Two threads may both see False here. The worst this can do is cause
+        # an empty batch.
+        if not self._is_scheduled:
+            self._is_scheduled = True
+            self._wake_up.emit()
 
-main_thread = CurrentThread()
+    # Declaring this as a slot makes Qt invoke it in the thread this object
+    # has been moved to, rather than in the thread that created it.
+    @pyqtSlot()
+    def _run_pending_calls(self):
+        self._is_scheduled = False
+        try:
+            # Only run the calls that are already here. Otherwise, a thread
+            # that keeps submitting calls could starve the event loop.
+            for _ in range(len(self._calls)):
+                call = self._calls.popleft()
+                if isinstance(call, _Coalesced):
+                    call = self._latest_calls.pop(call.key, None)
+                    if call is None:
+                        # An earlier entry with the same key already ran it.
+                        continue
+                f, args, kwargs = call
+                f(*args, **kwargs)
+        finally:
+            if self._calls:
+                self._schedule()
 
-def run_in_main_thread(f):
+class _Coalesced:
+    def __init__(self, key):
+        self.key = key
+
+_dispatchers = {}
+_dispatchers_lock = Lock()
+
+def dispatcher_for(thread):
+    """
+    Returns the single, long-lived Dispatcher for the given QThread.
+    """
+    with _dispatchers_lock:
+        try:
+            return _dispatchers[thread]
+        except KeyError:
+            result = _dispatchers[thread] = Dispatcher()
+            result.moveToThread(thread)
+            thread.finished.connect(lambda: _forget_dispatcher(thread))
+            return result
+
+def _forget_dispatcher(thread):
+    with _dispatchers_lock:
+        _dispatchers.pop(thread, None)
+
+main_thread = Dispatcher()
+
+def run_in_main_thread(f, key=None):
+    """
+    If key is given, calls that have not run yet are replaced by newer ones
+    with the same key. Use this for updates where only the latest matters.
+    """
     def result(*args, **kwargs):
-        main_thread.execute(f, args, kwargs)
-    return result
\ No newline at end of file
+        main_thread.execute(f, args, kwargs, key)
+    return result
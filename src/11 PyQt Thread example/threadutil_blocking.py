@@ -8,19 +8,57 @@ It allows you to receive results from the function invocation:
     
     # Runs the above function in the main thread and prints '2':
     print(return_2())
+
+The caller is blocked until the function has run in the main thread. If you
+don't want that, use submit_in_main_thread(...). It returns a
+concurrent.futures.Future right away. This lets you fan out many calls and
+wait for all of them, with a timeout, or cancel calls that haven't started:
+
+    @submit_in_main_thread
+    def get_text(i):
+        return text_areas[i].toPlainText()
+
+    futures = [get_text(i) for i in range(10)]
+    texts = [future.result(timeout=5) for future in futures]
+
+For asyncio code, run_in_main_thread_async(...) does the same, but returns a
+coroutine that you can await.
 """
 
+from asyncio import wrap_future
+from concurrent.futures import Future, InvalidStateError, TimeoutError
 from functools import wraps
-from PyQt6.QtCore import pyqtSignal, QObject, QThread
+from PyQt6.QtCore import QThread
 from PyQt6.QtWidgets import QApplication
-from threading import Event, get_ident
+from threading import get_ident
+from threadutil import dispatcher_for
+
+def run_in_thread(thread_fn, timeout=None):
+    def decorator(f):
+        @wraps(f)
+        def result(*args, **kwargs):
+            thread = thread_fn()
+            return Executor.instance().run_in_thread(
+                thread, f, args, kwargs, timeout
+            )
+        return result
+    return decorator
 
-def run_in_thread(thread_fn):
+def submit_in_thread(thread_fn):
     def decorator(f):
         @wraps(f)
         def result(*args, **kwargs):
             thread = thread_fn()
-            return Executor.instance().run_in_thread(thread, f, args, kwargs)
+            return Executor.instance().submit_in_thread(thread, f, args, kwargs)
+        return result
+    return decorator
+
+def run_in_thread_async(thread_fn):
+    def decorator(f):
+        submit = submit_in_thread(thread_fn)(f)
+        @wraps(f)
+        async def result(*args, **kwargs):
+            return await wrap_future(submit(*args, **kwargs))
         return result
     return decorator
 
@@ -34,6 +72,8 @@ def _main_thread():
     raise RuntimeError('Could not determine main thread')
 
 run_in_main_thread = run_in_thread(_main_thread)
+submit_in_main_thread = submit_in_thread(_main_thread)
+run_in_main_thread_async = run_in_thread_async(_main_thread)
 
 def is_in_main_thread():
     return QThread.currentThread() == _main_thread()
@@ -48,65 +88,66 @@ class Executor:
             cls._INSTANCE = cls(QApplication.instance())
         return cls._INSTANCE
     def __init__(self, app):
-        self._pending_tasks = []
+        self._pending_tasks = set()
         self._app_is_about_to_quit = False
         app.aboutToQuit.connect(self._about_to_quit)
     def _about_to_quit(self):
         self._app_is_about_to_quit = True
-        for task in self._pending_tasks:
+        # Copy because other threads may remove tasks while we iterate:
+        for task in list(self._pending_tasks):
             task.set_exception(SystemExit())
-            task.has_run.set()
-    def run_in_thread(self, thread, f, args, kwargs):
+    def run_in_thread(self, thread, f, args, kwargs, timeout=None):
+        future = self.submit_in_thread(thread, f, args, kwargs)
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            # Don't let the function run after its caller has given up:
+            future.cancel()
+            raise
+    def submit_in_thread(self, thread, f, args, kwargs):
+        task = Task(f, args, kwargs)
         if QThread.currentThread() == thread:
-            return f(*args, **kwargs)
+            task()
         elif self._app_is_about_to_quit:
             # In this case, the target thread's event loop most likely is not
             # running any more. This would mean that our task (which is
             # submitted to the event loop via signals/slots) is never run.
-            raise SystemExit()
-        task = Task(f, args, kwargs)
-        self._pending_tasks.append(task)
-        try:
-            receiver = Receiver(task)
-            receiver.moveToThread(thread)
-            sender = Sender()
-            sender.signal.connect(receiver.slot)
-            sender.signal.emit()
-            task.has_run.wait()
-            return task.result
-        finally:
-            self._pending_tasks.remove(task)
+            task.set_exception(SystemExit())
+        else:
+            self._pending_tasks.add(task)
+            task.future.add_done_callback(
+                lambda _: self._pending_tasks.discard(task)
+            )
+            dispatcher_for(thread).execute(task, (), {})
+        return task.future
 
 class Task:
     def __init__(self, fn, args, kwargs):
         self._fn = fn
         self._args = args
         self._kwargs = kwargs
-        self.has_run = Event()
-        self._result = self._exception = None
+        self.future = Future()
     def __call__(self):
+        # The future may have been cancelled, or failed by _about_to_quit():
+        if self.future.done() or \
+                not self.future.set_running_or_notify_cancel():
+            return
         try:
-            self._result = self._fn(*self._args, **self._kwargs)
+            result = self._fn(*self._args, **self._kwargs)
         except Exception as e:
-            self._exception = e
-        finally:
-            self.has_run.set()
+            self.set_exception(e)
+        except BaseException as e:
+            # Eg. SystemExit. Fail the future so the caller doesn't wait
+            # forever, but let the exception carry on in this thread:
+            self.set_exception(e)
+            raise
+        else:
+            try:
+                self.future.set_result(result)
+            except InvalidStateError:
+                pass
     def set_exception(self, exception):
-        self._exception = exception
-    @property
-    def result(self):
-        if not self.has_run.is_set():
-            raise ValueError("Hasn't run.")
-        if self._exception:
-            raise self._exception
-        return self._result
-
-class Sender(QObject):
-    signal = pyqtSignal()
-
-class Receiver(QObject):
-    def __init__(self, callback, parent=None):
-        super().__init__(parent)
-        self.callback = callback
-    def slot(self):
-        self.callback()
\ No newline at end of file
+        try:
+            self.future.set_exception(exception)
+        except InvalidStateError:
+            pass
@@ -0,0 +1,404 @@
+"""
+A model of the file system that never blocks the GUI.
+
+Directories are listed with os.scandir(...) on a pool of background threads.
+Their entries are passed to the model in batches as they are found, so a
+directory with 100,000 files starts showing files right away, and a slow
+network drive only delays its own contents. Directories are only listed when
+the view asks for their contents, ie. when you expand them.
+
+The model keeps what it has read. A QFileSystemWatcher (which uses inotify on
+Linux) tells it when a listed directory changes. It then lists the directory
+again and updates just the rows that changed.
+
+The size of a directory is the total size of the files in it and its
+subdirectories. It is only computed when the view shows the directory, in a
+separate background thread.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from PyQt6.QtCore import QAbstractItemModel, QCoreApplication, QFileSystemWatcher, \
+    QModelIndex, Qt, pyqtSignal
+from PyQt6.QtWidgets import QFileIconProvider
+from time import monotonic
+
+import os
+import sys
+
+class FileSystemModel(QAbstractItemModel):
+
+    HEADERS = ('Name', 'Size', 'Kind', 'Date Modified')
+
+    # How many entries a background thread collects before passing on the
+    # first batch, or how long it waits at most, in seconds. Each batch makes
+    # the view lay out all rows of the directory again. So later batches are
+    # made larger, in proportion to the number of entries so far:
+    BATCH_SIZE = 500
+    BATCH_INTERVAL = .05
+
+    # These are emitted in background threads. Qt delivers them in the main
+    # thread, where the model may be changed:
+    _entries_found = pyqtSignal(object, int, object)
+    _listing_done = pyqtSignal(object, int, object)
+    _size_computed = pyqtSignal(object, int, object)
+
+    def __init__(self, root_path, num_threads=4):
+        super().__init__()
+        self._root = _Node(os.path.basename(root_path), root_path, None, True)
+        self._listing_pool = ThreadPoolExecutor(num_threads)
+        # Adding up directory sizes can take long. Use separate threads for it
+        # so it doesn't hold up listing directories:
+        self._size_pool = ThreadPoolExecutor(1)
+        self._is_shut_down = False
+        self._watcher = QFileSystemWatcher()
+        self._watcher.directoryChanged.connect(self._on_directory_changed)
+        self._watched = {}
+        icons = QFileIconProvider()
+        self._folder_icon = icons.icon(QFileIconProvider.IconType.Folder)
+        self._file_icon = icons.icon(QFileIconProvider.IconType.File)
+        self._entries_found.connect(self._on_entries_found)
+        self._listing_done.connect(self._on_listing_done)
+        self._size_computed.connect(self._on_size_computed)
+        app = QCoreApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(self.shut_down)
+        self.fetchMore(QModelIndex())
+    def shut_down(self):
+        """
+        Stops the background threads, so they don't delay exiting the app.
+        """
+        self._is_shut_down = True
+        self._listing_pool.shutdown(wait=False, cancel_futures=True)
+        self._size_pool.shutdown(wait=False, cancel_futures=True)
+    # The view calls index(...) and hasChildren(...) for every row of an
+    # expanded directory whenever its rows change. So they are kept short.
+    def index(self, row, column, parent=QModelIndex()):
+        node = parent.internalPointer() if parent.isValid() else self._root
+        children = node.children
+        if children is None or not 0 <= row < len(children):
+            return QModelIndex()
+        return self.createIndex(row, column, children[row])
+    def parent(self, index):
+        if not index.isValid():
+            return QModelIndex()
+        parent = index.internalPointer().parent
+        if parent is self._root:
+            return QModelIndex()
+        return self.createIndex(self._row(parent), 0, parent)
+    def rowCount(self, parent=QModelIndex()):
+        if parent.column() > 0:
+            return 0
+        children = self._node(parent).children
+        return len(children) if children else 0
+    def columnCount(self, parent=QModelIndex()):
+        return len(self.HEADERS)
+    def hasChildren(self, parent=QModelIndex()):
+        if not parent.isValid():
+            return True
+        node = parent.internalPointer()
+        if node.children is None:
+            # Don't list the directory just to find out whether it's empty:
+            return node.is_dir
+        return bool(node.children)
+    def canFetchMore(self, parent):
+        node = self._node(parent)
+        return node.is_dir and node.children is None
+    def fetchMore(self, parent):
+        node = self._node(parent)
+        if node.children is None and node.is_dir:
+            node.children = []
+            self._list(node, streaming=True)
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        node = index.internalPointer()
+        column = index.column()
+        if role == Qt.ItemDataRole.DisplayRole:
+            if column == 0:
+                return node.name
+            if column == 1:
+                return _format_size(self._size(node))
+            if column == 2:
+                return 'Folder' if node.is_dir else _kind(node.name)
+            if column == 3 and node.mtime is not None:
+                return datetime.fromtimestamp(node.mtime).strftime('%Y-%m-%d %H:%M')
+        elif role == Qt.ItemDataRole.DecorationRole and column == 0:
+            return self._folder_icon if node.is_dir else self._file_icon
+        elif role == Qt.ItemDataRole.TextAlignmentRole and column == 1:
+            return Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter
+        return None
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole or orientation != Qt.Orientation.Horizontal:
+            return None
+        return self.HEADERS[section]
+    def filePath(self, index):
+        return self._node(index).path
+    def _node(self, index):
+        return index.internalPointer() if index.isValid() else self._root
+    def _index(self, node, column=0):
+        if node is self._root:
+            return QModelIndex()
+        return self.createIndex(self._row(node), column, node)
+    def _list(self, node, streaming):
+        node.generation += 1
+        self._listing_pool.submit(self._scan, node, node.generation, streaming)
+    def _scan(self, node, generation, streaming):
+        # Runs in a background thread.
+        entries = []
+        num_found = 0
+        batch_size = self.BATCH_SIZE
+        interval = self.BATCH_INTERVAL
+        last_batch = monotonic()
+        try:
+            with os.scandir(node.path) as it:
+                for entry in it:
+                    if self._is_shut_down:
+                        return
+                    entries.append(_stat(entry))
+                    if streaming and (len(entries) >= batch_size or
+                                      monotonic() - last_batch > interval):
+                        self._entries_found.emit(node, generation, entries)
+                        num_found += len(entries)
+                        batch_size = max(batch_size, num_found)
+                        interval = min(interval * 2, 1)
+                        entries = []
+                        last_batch = monotonic()
+        except OSError:
+            # Eg. permission denied. Show the directory as empty.
+            pass
+        if streaming:
+            if entries:
+                self._entries_found.emit(node, generation, entries)
+            self._listing_done.emit(node, generation, None)
+        else:
+            self._listing_done.emit(node, generation, entries)
+    def _on_entries_found(self, node, generation, entries):
+        if generation == node.generation:
+            self._append(node, entries)
+    def _on_listing_done(self, node, generation, entries):
+        if generation != node.generation:
+            return
+        if entries is not None:
+            self._merge(node, entries)
+        if node.path not in self._watched:
+            self._watched[node.path] = node
+            self._watcher.addPath(node.path)
+    def _append(self, node, entries):
+        children = node.children
+        first = len(children)
+        self.beginInsertRows(self._index(node), first, first + len(entries) - 1)
+        for row, (name, is_dir, size, mtime) in enumerate(entries, first):
+            child = _Node(name, os.path.join(node.path, name), node, is_dir)
+            child.row = row
+            child.size = size
+            child.mtime = mtime
+            children.append(child)
+        self.endInsertRows()
+    def _merge(self, node, entries):
+        """
+        Updates the children of `node` to a new listing of its directory.
+        """
+        new = {entry[0]: entry for entry in entries}
+        self._remove_rows(node, [
+            row for row, child in enumerate(node.children) if child.name not in new
+        ])
+        for child in node.children:
+            name, is_dir, size, mtime = new.pop(child.name)
+            if (is_dir, size, mtime) != (child.is_dir, child.size, child.mtime):
+                child.size = size
+                child.mtime = mtime
+                if is_dir != child.is_dir:
+                    # A file became a directory or the other way around. What
+                    # was read of the old directory is no longer valid:
+                    self._remove_children(child)
+                    child.is_dir = is_dir
+                self.dataChanged.emit(self._index(child), self._index(child, 3))
+        if new:
+            self._append(node, list(new.values()))
+    def _remove_rows(self, parent, rows):
+        """
+        Removes the given rows, which must be in ascending order. Adjacent
+        rows are removed together, from the bottom up so the rows above stay
+        valid.
+        """
+        runs = []
+        for row in rows:
+            if runs and runs[-1][1] == row - 1:
+                runs[-1][1] = row
+            else:
+                runs.append([row, row])
+        children = parent.children
+        for first, last in reversed(runs):
+            self.beginRemoveRows(self._index(parent), first, last)
+            removed = children[first:last + 1]
+            del children[first:last + 1]
+            # Renumbering the rows below each run would take quadratic time.
+            # Instead, they are renumbered when one of them is needed:
+            if first < len(children):
+                parent.first_stale_row = min(parent.first_stale_row, first)
+            self.endRemoveRows()
+            for child in removed:
+                self._forget(child)
+    def _row(self, node):
+        parent = node.parent
+        # Stale rows are too large, never too small:
+        if node.row >= parent.first_stale_row:
+            children = parent.children
+            for row in range(parent.first_stale_row, len(children)):
+                children[row].row = row
+            parent.first_stale_row = _ALL_ROWS_VALID
+        return node.row
+    def _remove_children(self, node):
+        if node.children:
+            self._remove_rows(node, range(len(node.children)))
+        self._forget(node)
+        node.children = None
+        node.total_size = None
+        node.is_sizing = False
+    def _forget(self, node):
+        node.generation += 1
+        node.size_version += 1
+        if self._watched.pop(node.path, None) is not None:
+            self._watcher.removePath(node.path)
+        for child in node.children or ():
+            self._forget(child)
+    def _on_directory_changed(self, path):
+        node = self._watched.get(path)
+        if node is None:
+            return
+        # The directory's size and the sizes of its parents are out of date:
+        ancestor = node
+        while ancestor is not None:
+            ancestor.size_version += 1
+            ancestor.is_sizing = False
+            if ancestor.total_size is not None:
+                ancestor.total_size = None
+                if ancestor is not self._root:
+                    index = self._index(ancestor, 1)
+                    self.dataChanged.emit(index, index)
+            ancestor = ancestor.parent
+        if os.path.isdir(path):
+            self._list(node, streaming=False)
+    def _size(self, node):
+        if not node.is_dir:
+            return node.size
+        if node.total_size is None and not node.is_sizing:
+            node.is_sizing = True
+            # The totals of subdirectories that are known and watched are up
+            # to date. Only the others need to be added up again:
+            subdirectories = {}
+            for child in node.children or ():
+                if child.is_dir:
+                    total = child.total_size if child.path in self._watched else None
+                    subdirectories[child.name] = (child, child.size_version, total)
+            self._size_pool.submit(
+                self._add_up_sizes, node, node.size_version, subdirectories
+            )
+        return node.total_size
+    def _add_up_sizes(self, node, version, subdirectories):
+        # Runs in a background thread.
+        total = 0
+        try:
+            with os.scandir(node.path) as it:
+                entries = list(it)
+        except OSError:
+            entries = []
+        for entry in entries:
+            try:
+                if not entry.is_dir(follow_symlinks=False):
+                    total += entry.stat(follow_symlinks=False).st_size
+                    continue
+            except OSError:
+                continue
+            child, child_version, size = subdirectories.get(entry.name, (None, 0, None))
+            if size is None:
+                size = self._tree_size(entry.path)
+                if size is None:
+                    return
+                if child is not None:
+                    self._size_computed.emit(child, child_version, size)
+            total += size
+        self._size_computed.emit(node, version, total)
+    def _tree_size(self, path):
+        # Runs in a background thread. Returns None when shutting down.
+        total = 0
+        directories = [path]
+        while directories:
+            if self._is_shut_down:
+                return None
+            try:
+                with os.scandir(directories.pop()) as it:
+                    for entry in it:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                directories.append(entry.path)
+                            else:
+                                total += entry.stat(follow_symlinks=False).st_size
+                        except OSError:
+                            pass
+            except OSError:
+                pass
+        return total
+    def _on_size_computed(self, node, version, total):
+        if version != node.size_version:
+            return
+        node.is_sizing = False
+        node.total_size = total
+        if node is not self._root:
+            index = self._index(node, 1)
+            self.dataChanged.emit(index, index)
+
+_ALL_ROWS_VALID = sys.maxsize
+
+class _Node:
+    __slots__ = (
+        'name', 'path', 'parent', 'is_dir', 'row', 'size', 'mtime', 'children',
+        'total_size', 'is_sizing', 'size_version', 'generation',
+        'first_stale_row'
+    )
+    def __init__(self, name, path, parent, is_dir):
+        self.name = name
+        self.path = path
+        self.parent = parent
+        self.is_dir = is_dir
+        self.row = 0
+        # The rows of the children from this one on may be out of date:
+        self.first_stale_row = _ALL_ROWS_VALID
+        self.size = None
+        self.mtime = None
+        # None until the directory is listed:
+        self.children = None
+        self.total_size = None
+        self.is_sizing = False
+        # Incremented whenever the directory is listed, or its contents
+        # change. Results from background threads that were started before
+        # are then ignored:
+        self.generation = 0
+        self.size_version = 0
+
+def _stat(entry):
+    is_dir = False
+    try:
+        is_dir = entry.is_dir()
+        stat = entry.stat()
+    except OSError:
+        # Eg. a broken symbolic link.
+        try:
+            stat = entry.stat(follow_symlinks=False)
+        except OSError:
+            return entry.name, False, None, None
+    return entry.name, is_dir, stat.st_size, stat.st_mtime
+
+def _kind(name):
+    extension = os.path.splitext(name)[1]
+    return extension[1:].upper() + ' File' if extension else 'File'
+
+def _format_size(size):
+    if size is None:
+        return ''
+    for unit in ('bytes', 'KB', 'MB', 'GB'):
+        if size < 1024:
+            return '%d %s' % (size, unit) if unit == 'bytes' else '%.1f %s' % (size, unit)
+        size /= 1024
+    return '%.1f TB' % size
@@ -1,12 +1,12 @@
+from filesystem_model import FileSystemModel
 from os.path import expanduser
 from PyQt6.QtWidgets import *
 
 home_directory = expanduser('~')
 
 app = QApplication([])
-model = QDirModel()
+model = FileSystemModel(home_directory)
 view = QTreeView()
 view.setModel(model)
-view.setRootIndex(model.index(home_directory))
 view.show()
-app.exec()
\ No newline at end of file
+app.exec()
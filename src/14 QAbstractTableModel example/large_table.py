@@ -0,0 +1,24 @@
+from PyQt6.QtWidgets import *
+from lazy_table_model import LazyTableModel, CsvSource, SqliteSource, GeneratorSource
+
+import sys
+
+def synthetic_rows(start):
+    for i in range(start, 50_000_000):
+        yield i, 'Item %d' % i, (i * 7919) % 100003 / 100
+
+if len(sys.argv) == 2:
+    # Eg. python large_table.py data.csv
+    model = LazyTableModel(CsvSource(sys.argv[1]))
+elif len(sys.argv) == 3:
+    # Eg. python large_table.py data.sqlite people
+    model = LazyTableModel(SqliteSource(sys.argv[1], sys.argv[2]))
+else:
+    source = GeneratorSource(["Number", "Name", "Price"], synthetic_rows)
+    model = LazyTableModel(source, formatters=['{:,}'.format, str, '{:.2f}'.format])
+
+app = QApplication([])
+view = QTableView()
+view.setModel(model)
+view.show()
+app.exec()
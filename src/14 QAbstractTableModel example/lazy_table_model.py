@@ -0,0 +1,150 @@
+"""
+A table model for tables that are too large to load into memory. Instead of
+keeping all rows in a list, it reads them from a source in chunks of
+chunk_size rows. Qt asks for more rows via canFetchMore/fetchMore as the user
+scrolls down. Only the max_chunks most recently used chunks are kept in memory.
+Chunks that were dropped are read again from the source when needed.
+
+A source has the attributes `headers` and `start`, and a method
+`read(position, count)` that returns up to `count` rows from `position`,
+along with the position of the row after them. Positions are opaque to the
+model: They are byte offsets for CSV files, rowids for SQLite tables and row
+numbers for generators.
+"""
+
+from collections import OrderedDict
+from itertools import islice
+from PyQt6.QtCore import QAbstractTableModel, QModelIndex, Qt
+
+import csv
+import sqlite3
+
+class LazyTableModel(QAbstractTableModel):
+    def __init__(self, source, formatters=None, chunk_size=1024, max_chunks=64):
+        super().__init__()
+        self._source = source
+        self._headers = list(source.headers)
+        # One function per column that turns a value into the displayed text.
+        # Choosing them up front keeps data() free of type checks:
+        self._formatters = list(formatters or [str] * len(self._headers))
+        self._chunk_size = chunk_size
+        self._max_chunks = max_chunks
+        self._chunks = OrderedDict()
+        # Where each chunk we know of starts in the source:
+        self._positions = [source.start]
+        self._num_rows = 0
+        self._at_end = False
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._num_rows
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._headers)
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        chunk_index, offset = divmod(index.row(), self._chunk_size)
+        column = index.column()
+        row = self._chunk(chunk_index)[offset]
+        # CSV rows can be shorter than the header, and SQLite values NULL:
+        if column >= len(row) or row[column] is None:
+            return ''
+        return self._formatters[column](row[column])
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole or orientation != Qt.Orientation.Horizontal:
+            return None
+        return self._headers[section]
+    def canFetchMore(self, parent):
+        return not parent.isValid() and not self._at_end
+    def fetchMore(self, parent):
+        if parent.isValid() or self._at_end:
+            return
+        chunk_index = len(self._positions) - 1
+        rows, next_position = \
+            self._source.read(self._positions[chunk_index], self._chunk_size)
+        if len(rows) < self._chunk_size:
+            self._at_end = True
+        else:
+            self._positions.append(next_position)
+        if rows:
+            first = self._num_rows
+            self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+            self._num_rows += len(rows)
+            self._remember(chunk_index, rows)
+            self.endInsertRows()
+    def _chunk(self, chunk_index):
+        try:
+            rows = self._chunks[chunk_index]
+        except KeyError:
+            rows, _ = self._source.read(
+                self._positions[chunk_index], self._chunk_size
+            )
+            self._remember(chunk_index, rows)
+        else:
+            self._chunks.move_to_end(chunk_index)
+        return rows
+    def _remember(self, chunk_index, rows):
+        self._chunks[chunk_index] = rows
+        if len(self._chunks) > self._max_chunks:
+            self._chunks.popitem(last=False)
+
+class CsvSource:
+    """
+    Reads rows from a CSV file whose first row contains the headers. Fields
+    are returned as strings.
+    """
+    def __init__(self, path, encoding='utf-8', **fmtparams):
+        self._file = open(path, 'rb')
+        self._encoding = encoding
+        self._fmtparams = fmtparams
+        self._position = 0
+        rows, self.start = self.read(0, 1)
+        # An empty file has no header row, and so no columns:
+        self.headers = rows[0] if rows else []
+    def read(self, position, count):
+        # csv.reader only asks for the next line when it needs it. So after
+        # each row, self._position is the offset of the row after it:
+        reader = csv.reader(self._lines(position), **self._fmtparams)
+        rows = list(islice(reader, count))
+        return rows, self._position
+    def _lines(self, position):
+        self._file.seek(position)
+        self._position = position
+        for line in self._file:
+            self._position += len(line)
+            yield line.decode(self._encoding)
+    def close(self):
+        self._file.close()
+
+class SqliteSource:
+    """
+    Reads the rows of a table in an SQLite database in the order of their
+    rowids. Each chunk is found via the rowid index, so reading a chunk at the
+    end of the table is as fast as reading one at the start.
+    """
+    def __init__(self, path, table):
+        self._connection = sqlite3.connect(path)
+        table = '"%s"' % table.replace('"', '""')
+        cursor = self._connection.execute('SELECT * FROM %s LIMIT 0' % table)
+        self.headers = [description[0] for description in cursor.description]
+        self.start = -2 ** 63
+        self._query = \
+            'SELECT rowid, * FROM %s WHERE rowid >= ? ORDER BY rowid LIMIT ?' % table
+    def read(self, position, count):
+        rows = self._connection.execute(self._query, (position, count)).fetchall()
+        if not rows:
+            return [], position
+        return [row[1:] for row in rows], rows[-1][0] + 1
+    def close(self):
+        self._connection.close()
+
+class GeneratorSource:
+    """
+    Reads rows from a function that, given a row number, returns an iterable
+    over the rows from that number onwards.
+    """
+    start = 0
+    def __init__(self, headers, rows_from):
+        self.headers = headers
+        self._rows_from = rows_from
+    def read(self, position, count):
+        rows = list(islice(self._rows_from(position), count))
+        return rows, position + len(rows)
@@ -0,0 +1,84 @@
+"""
+Compares QSqlTableModel with KeysetTableModel on a large projects table:
+
+    python initdb.py 5000000
+    python benchmark.py [num_rows]
+
+For each model, this scrolls through the first num_rows rows one screen at a
+time, sorts the table by income and scrolls through it again. It reports how
+long each step took and how much memory the process used at its peak. Each
+model is measured in a separate process, so their memory doesn't mix.
+"""
+
+from os.path import exists
+from PyQt6.QtCore import QModelIndex, Qt
+from PyQt6.QtSql import *
+from PyQt6.QtWidgets import *
+from resource import getrusage, RUSAGE_SELF
+from statistics import median
+from subprocess import run
+from time import perf_counter
+
+import sys
+
+def measure(model_name, num_rows):
+    app = QApplication([])
+    start = perf_counter()
+    if model_name == 'keyset':
+        from keyset_model import KeysetTableModel
+        model = KeysetTableModel("projects.db", "projects")
+    else:
+        db = QSqlDatabase.addDatabase("QSQLITE")
+        db.setDatabaseName("projects.db")
+        db.open()
+        model = QSqlTableModel(None, db)
+        model.setTable("projects")
+        model.select()
+    view = QTableView()
+    view.setModel(model)
+    view.resize(800, 600)
+    view.show()
+    app.processEvents()
+    opened = perf_counter() - start
+    latencies = scroll(app, view, model, num_rows)
+    start = perf_counter()
+    model.sort(2, Qt.SortOrder.DescendingOrder)
+    view.repaint()
+    sorted_in = perf_counter() - start
+    latencies += scroll(app, view, model, num_rows)
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS:
+    peak = getrusage(RUSAGE_SELF).ru_maxrss / (1024 if sys.platform != 'darwin' else 1024 ** 2)
+    print('%-8s %10.1f %10.1f %12.2f %12.2f %13.0f' % (
+        model_name, opened * 1000, sorted_in * 1000, median(latencies) * 1000,
+        max(latencies) * 1000, peak
+    ))
+    if model_name == 'keyset':
+        model.close()
+
+def scroll(app, view, model, num_rows):
+    rows_per_screen = view.viewport().height() // view.rowHeight(0)
+    latencies = []
+    for row in range(0, num_rows, rows_per_screen):
+        start = perf_counter()
+        # This is what the view does when you drag the scroll bar to the end:
+        while model.rowCount() <= row and model.canFetchMore(QModelIndex()):
+            model.fetchMore(QModelIndex())
+        view.scrollTo(model.index(row, 0), QAbstractItemView.ScrollHint.PositionAtTop)
+        view.repaint()
+        latencies.append(perf_counter() - start)
+        app.processEvents()
+    return latencies
+
+if __name__ == '__main__':
+    if not exists("projects.db"):
+        print("File projects.db does not exist. Please run initdb.py.")
+        sys.exit()
+    if len(sys.argv) > 1 and sys.argv[1] in ('qsql', 'keyset'):
+        measure(sys.argv[1], int(sys.argv[2]))
+    else:
+        num_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+        print('%-8s %10s %10s %12s %12s %13s' % (
+            'model', 'open (ms)', 'sort (ms)', 'median (ms)', 'max (ms)', 'peak RSS (MB)'
+        ))
+        for model_name in ('qsql', 'keyset'):
+            run([sys.executable, __file__, model_name, str(num_rows)])
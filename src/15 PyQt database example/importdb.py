@@ -0,0 +1,124 @@
+"""
+Imports projects from CSV or JSON Lines files into projects.db:
+
+    python importdb.py projects.csv [more_projects.jsonl ...]
+
+CSV files need a header row that names the columns url, descr and income. In
+JSON Lines files, each line is an object with these keys. The files are read
+as a stream, so they can be larger than memory.
+
+The rows are inserted with executemany(...) in batches, each in its own
+transaction. During the import, SQLite is set up for speed: The journal is
+written ahead (WAL) and only synced at checkpoints, and the indexes are
+dropped and rebuilt at the end. Building an index once from all rows is much
+faster than updating it for every row.
+"""
+
+from contextlib import contextmanager
+from itertools import islice
+from json import loads
+from time import perf_counter
+
+import csv
+import sqlite3
+import sys
+
+COLUMNS = ('url', 'descr', 'income')
+
+def read_csv(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        for record in csv.DictReader(f):
+            yield tuple(record[column] for column in COLUMNS)
+
+def read_jsonl(path):
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                record = loads(line)
+                yield tuple(record.get(column) for column in COLUMNS)
+
+def create_table(connection):
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS projects
+        (url TEXT, descr TEXT, income INTEGER)
+    """)
+
+def create_indexes(connection):
+    for column in COLUMNS:
+        connection.execute(
+            "CREATE INDEX IF NOT EXISTS projects_%s ON projects (%s)" % (column, column)
+        )
+    connection.commit()
+
+@contextmanager
+def tuned_for_loading(connection):
+    """
+    Sets pragmas for a bulk load and drops the indexes of the projects table.
+    Afterwards, rebuilds the indexes and checkpoints the write-ahead log.
+    """
+    connection.commit()
+    indexes = connection.execute(
+        "SELECT name, sql FROM sqlite_master "
+        "WHERE type = 'index' AND tbl_name = 'projects' AND sql IS NOT NULL"
+    ).fetchall()
+    for name, _ in indexes:
+        connection.execute('DROP INDEX "%s"' % name.replace('"', '""'))
+    # WAL stays on for the database. The others only last for this connection:
+    connection.execute("PRAGMA journal_mode = WAL")
+    connection.execute("PRAGMA synchronous = NORMAL")
+    connection.execute("PRAGMA cache_size = -262144")  # 256 MB
+    connection.execute("PRAGMA temp_store = MEMORY")
+    try:
+        yield
+    finally:
+        for _, sql in indexes:
+            connection.execute(sql)
+        connection.commit()
+        connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+def bulk_load(connection, rows, batch_size=50000, on_progress=None):
+    """
+    Inserts the (url, descr, income) tuples from the iterable `rows`.
+    Returns how many there were.
+    """
+    rows = iter(rows)
+    num_rows = 0
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return num_rows
+        # One transaction per batch. Committing after every row would make
+        # SQLite write to disk for every row.
+        with connection:
+            connection.executemany("INSERT INTO projects VALUES (?, ?, ?)", batch)
+        num_rows += len(batch)
+        if on_progress:
+            on_progress(num_rows)
+
+def main(paths):
+    connection = sqlite3.connect("projects.db")
+    create_table(connection)
+    start = perf_counter()
+    def report(num_rows):
+        rate = num_rows / (perf_counter() - start)
+        sys.stderr.write("\r%d rows, %.0f rows/sec" % (num_rows, rate))
+    num_rows = 0
+    with tuned_for_loading(connection):
+        for path in paths:
+            rows = read_jsonl(path) if path.endswith('.jsonl') else read_csv(path)
+            num_rows += bulk_load(
+                connection, rows, on_progress=lambda n: report(num_rows + n)
+            )
+        loaded = perf_counter()
+    create_indexes(connection)
+    end = perf_counter()
+    connection.close()
+    print("\nImported %d rows in %.1fs (%.0f rows/sec), including %.1fs for indexes." % (
+        num_rows, end - start, num_rows / (end - start), end - loaded
+    ))
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    main(sys.argv[1:])
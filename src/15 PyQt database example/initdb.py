@@ -1,4 +1,22 @@
+from importdb import bulk_load, create_indexes, tuned_for_loading
+from itertools import cycle
+
 import sqlite3
+import sys
+
+def synthetic_projects(num_rows):
+    """
+    Generates made-up projects, for trying the example with a large table.
+    """
+    ideas = cycle(['Uber', 'Airbnb', 'Tinder', 'Netflix', 'Slack', 'Spotify', 'Etsy'])
+    animals = cycle(['giraffes', 'drones', 'otters', 'llamas', 'pigeons', 'snails'])
+    domains = cycle(['.io', '.com', '.ai', '.net', '.app'])
+    for i, idea, animal, domain in zip(range(num_rows), ideas, animals, domains):
+        url = '%s%d%s' % (animal, i, domain)
+        descr = '%s, but with %s' % (idea, animal)
+        income = i * 7919 % 250000
+        yield url, descr, income
+
 connection = sqlite3.connect("projects.db")
 cursor = connection.cursor()
 cursor.execute("""
@@ -10,4 +28,11 @@ cursor.execute("""INSERT INTO projects VALUES
     ('dronesweaters.com', 'Clothes for cold drones', 3000),
     ('hummingpro.io', 'Online humming courses', 120000)
 """)
-connection.commit()
\ No newline at end of file
+connection.commit()
+if len(sys.argv) > 1:
+    # Eg. `python initdb.py 5000000` adds five million made-up projects. Run
+    # `python main.py --keyset` to view them.
+    with tuned_for_loading(connection):
+        bulk_load(connection, synthetic_projects(int(sys.argv[1])))
+    # The keyset model needs these to sort quickly:
+    create_indexes(connection)
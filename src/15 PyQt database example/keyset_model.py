@@ -0,0 +1,213 @@
+"""
+A read-only model for SQLite tables with millions of rows.
+
+QSqlTableModel keeps every row it has fetched in memory. This model instead
+reads the table in pages of page_size rows and only keeps the max_pages most
+recently used ones. Pages are found with keyset pagination: Instead of
+`LIMIT ... OFFSET n`, which makes SQLite step over n rows, each page is
+selected with `WHERE (key, rowid) > (last key of previous page, its rowid)`.
+With an index on the key column, reading a page far down the table is as fast
+as reading the first one. Sorting by a column makes it the key, so the columns
+you sort by should be indexed and contain no NULLs.
+
+Whenever the view shows a new page, the pages before and after it are read in
+a background thread with its own connection. By the time you scroll there,
+they are usually in memory already. The thread is stopped by close(), which
+the model calls when the application is about to quit.
+"""
+
+from collections import OrderedDict
+from PyQt6.QtCore import QAbstractTableModel, QCoreApplication, QModelIndex, \
+    QObject, Qt, pyqtSignal
+from queue import Queue
+from threading import Thread
+
+import sqlite3
+
+class KeysetTableModel(QAbstractTableModel):
+    def __init__(self, path, table, page_size=256, max_pages=32):
+        super().__init__()
+        self._table = _quote(table)
+        self._page_size = page_size
+        self._max_pages = max_pages
+        self._connection = sqlite3.connect(path)
+        cursor = self._connection.execute('SELECT * FROM %s LIMIT 0' % self._table)
+        self._columns = [description[0] for description in cursor.description]
+        self._sort_column = None
+        self._descending = False
+        self._filter = ''
+        self._filter_params = ()
+        self._generation = 0
+        self._prefetcher = _Prefetcher(path)
+        self._prefetcher.page_loaded.connect(self._on_page_loaded)
+        # The thread must not emit signals after Qt has deleted the prefetcher:
+        QCoreApplication.instance().aboutToQuit.connect(self.close)
+        self._reset()
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._num_rows
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._columns)
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        page_no, offset = divmod(index.row(), self._page_size)
+        rows, _ = self._page(page_no)
+        return rows[offset][index.column()]
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if orientation == Qt.Orientation.Horizontal:
+            return self._columns[section]
+        return section + 1
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder):
+        self.beginResetModel()
+        self._sort_column = column
+        self._descending = order == Qt.SortOrder.DescendingOrder
+        self._reset()
+        self.endResetModel()
+    def setFilter(self, where, params=()):
+        """
+        Only shows the rows that match the SQL condition `where`, eg.
+        setFilter('income > ?', (1000,)).
+        """
+        self.beginResetModel()
+        self._filter = where
+        self._filter_params = tuple(params)
+        self._reset()
+        self.endResetModel()
+    def close(self):
+        """
+        Stops the background thread. Call this when you no longer need the
+        model, unless the application is about to quit anyway.
+        """
+        self._prefetcher.stop()
+    def canFetchMore(self, parent):
+        return not parent.isValid() and not self._at_end
+    def fetchMore(self, parent):
+        if parent.isValid() or self._at_end:
+            return
+        page_no = len(self._page_starts) - 1
+        # The background thread has usually read this page already:
+        rows, end = self._page(page_no)
+        if len(rows) < self._page_size:
+            self._at_end = True
+        else:
+            self._page_starts.append(end)
+            # Now that we know where the next page starts, read it ahead:
+            self._prefetch(page_no + 1)
+        if rows:
+            first = self._num_rows
+            self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+            self._num_rows += len(rows)
+            self.endInsertRows()
+    def _reset(self):
+        # Pages that are still being read for the old order are ignored:
+        self._generation += 1
+        self._pages = OrderedDict()
+        self._requested = set()
+        # The key and rowid of the last row before each page we know of:
+        self._page_starts = [None]
+        self._last_page_no = None
+        self._num_rows = 0
+        self._at_end = False
+        if self._sort_column is None:
+            key = 'rowid'
+        else:
+            key = _quote(self._columns[self._sort_column])
+        order = 'DESC' if self._descending else 'ASC'
+        after = '<' if self._descending else '>'
+        select = 'SELECT %s, rowid, * FROM %s WHERE ' % (key, self._table)
+        condition = '(%s) AND ' % self._filter if self._filter else ''
+        order_by = ' ORDER BY %s %s, rowid %s LIMIT ?' % (key, order, order)
+        self._queries = (
+            select + condition + '1' + order_by,
+            select + condition + '(%s, rowid) %s (?, ?)' % (key, after) + order_by
+        )
+    def _page(self, page_no):
+        try:
+            page = self._pages[page_no]
+        except KeyError:
+            page = _read_page(
+                self._connection, self._queries, self._filter_params,
+                self._page_starts[page_no], self._page_size
+            )
+            self._remember(page_no, page)
+        else:
+            self._pages.move_to_end(page_no)
+        if page_no != self._last_page_no:
+            self._last_page_no = page_no
+            self._prefetch(page_no + 1)
+            self._prefetch(page_no - 1)
+        return page
+    def _prefetch(self, page_no):
+        if not 0 <= page_no < len(self._page_starts):
+            # We don't know where this page starts yet.
+            return
+        if page_no in self._pages or page_no in self._requested:
+            return
+        self._requested.add(page_no)
+        self._prefetcher.request(
+            self._generation, page_no, self._queries, self._filter_params,
+            self._page_starts[page_no], self._page_size
+        )
+    def _on_page_loaded(self, generation, page_no, page):
+        if generation != self._generation:
+            return
+        self._requested.discard(page_no)
+        if page_no not in self._pages:
+            self._remember(page_no, page)
+    def _remember(self, page_no, page):
+        self._pages[page_no] = page
+        if len(self._pages) > self._max_pages:
+            self._pages.popitem(last=False)
+
+class _Prefetcher(QObject):
+
+    # Emitted in the background thread. Qt delivers it in the main thread.
+    page_loaded = pyqtSignal(int, int, object)
+
+    def __init__(self, path):
+        super().__init__()
+        self._requests = Queue()
+        self._thread = Thread(target=self._run, args=(path,), daemon=True)
+        self._thread.start()
+    def stop(self):
+        """
+        Stops the thread once it has read the page it is reading, if any.
+        """
+        if self._thread.is_alive():
+            self._requests.put(None)
+            self._thread.join()
+    def request(self, generation, page_no, queries, params, start, page_size):
+        self._latest_generation = generation
+        self._requests.put((generation, page_no, queries, params, start, page_size))
+    def _run(self, path):
+        # An SQLite connection may only be used in the thread that created it:
+        connection = sqlite3.connect(path)
+        while True:
+            request = self._requests.get()
+            if request is None:
+                break
+            generation, page_no, queries, params, start, page_size = request
+            if generation != self._latest_generation:
+                # The user sorted or filtered since this was requested.
+                continue
+            page = _read_page(connection, queries, params, start, page_size)
+            self.page_loaded.emit(generation, page_no, page)
+        connection.close()
+
+def _read_page(connection, queries, params, start, page_size):
+    """
+    Returns the rows of the page that starts after `start`, and the key and
+    rowid of its last row.
+    """
+    first_page, next_page = queries
+    if start is None:
+        result = connection.execute(first_page, params + (page_size,)).fetchall()
+    else:
+        result = connection.execute(next_page, params + start + (page_size,)).fetchall()
+    end = result[-1][:2] if result else start
+    return [row[2:] for row in result], end
+
+def _quote(identifier):
+    return '"%s"' % identifier.replace('"', '""')
@@ -9,13 +9,19 @@ if not exists("projects.db"):
     sys.exit()
 
 app = QApplication([])
-db = QSqlDatabase.addDatabase("QSQLITE")
-db.setDatabaseName("projects.db")
-db.open()
-model = QSqlTableModel(None, db)
-model.setTable("projects")
-model.select()
 view = QTableView()
+if "--keyset" in sys.argv:
+    # For tables with millions of rows. See keyset_model.py.
+    from keyset_model import KeysetTableModel
+    model = KeysetTableModel("projects.db", "projects")
+    view.setSortingEnabled(True)
+else:
+    db = QSqlDatabase.addDatabase("QSQLITE")
+    db.setDatabaseName("projects.db")
+    db.open()
+    model = QSqlTableModel(None, db)
+    model.setTable("projects")
+    model.select()
 view.setModel(model)
 view.show()
 app.exec()
\ No newline at end of file
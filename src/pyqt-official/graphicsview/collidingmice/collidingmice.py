@@ -43,16 +43,22 @@
 
 
 import math
+import time
 
+import numpy as np
+
+from PyQt5 import sip
 from PyQt5.QtCore import (qAbs, QLineF, QPointF, QRectF, qrand, qsrand, Qt,
         QTime, QTimer)
-from PyQt5.QtGui import (QBrush, QColor, QPainter, QPainterPath, QPixmap,
-        QPolygonF)
+from PyQt5.QtGui import (QBrush, QColor, QImage, QPainter, QPainterPath,
+        QPixmap, QPolygonF)
 from PyQt5.QtWidgets import (QApplication, QGraphicsItem, QGraphicsScene,
         QGraphicsView, QGraphicsWidget)
 
 import mice_rc
 
+from mouseswarm import MouseSwarm
+
 
 class Mouse(QGraphicsItem):
     Pi = math.pi
@@ -78,7 +84,7 @@ class Mouse(QGraphicsItem):
         # explicit timer instead.
         self.timer = QTimer()
         self.timer.timeout.connect(self.timerEvent)
-        self.timer.start(1000 / 33)
+        self.timer.start(1000 // 33)
 
     @staticmethod
     def normalizeAngle(angle):
@@ -97,8 +103,13 @@ class Mouse(QGraphicsItem):
         return path;
 
     def paint(self, painter, option, widget):
+        Mouse.drawMouse(painter, self.color, self.mouseEyeDirection,
+                bool(self.scene().collidingItems(self)))
+
+    @staticmethod
+    def drawMouse(painter, color, eyeDirection, colliding):
         # Body.
-        painter.setBrush(self.color)
+        painter.setBrush(color)
         painter.drawEllipse(-10, -20, 20, 40)
 
         # Eyes.
@@ -111,11 +122,11 @@ class Mouse(QGraphicsItem):
         painter.drawEllipse(QRectF(-2, -22, 4, 4))
 
         # Pupils.
-        painter.drawEllipse(QRectF(-8.0 + self.mouseEyeDirection, -17, 4, 4))
-        painter.drawEllipse(QRectF(4.0 + self.mouseEyeDirection, -17, 4, 4))
+        painter.drawEllipse(QRectF(-8.0 + eyeDirection, -17, 4, 4))
+        painter.drawEllipse(QRectF(4.0 + eyeDirection, -17, 4, 4))
 
         # Ears.
-        if self.scene().collidingItems(self):
+        if colliding:
             painter.setBrush(Qt.red)
         else:
             painter.setBrush(Qt.darkYellow)
@@ -189,6 +200,150 @@ class Mouse(QGraphicsItem):
         self.setPos(self.mapToParent(0, -(3 + math.sin(self.speed) * 3)))
 
 
+
+class SwarmItem(QGraphicsItem):
+    """Draws all the mice of a MouseSwarm as one item.
+
+    Every mouse looks the same apart from its colour, the direction of its
+    eyes and the colour of its ears. So each possible look is drawn once into
+    an atlas, and all mice are drawn as rotated pieces of it in one call.
+    """
+
+    # The part of a mouse's coordinates that its drawing covers.
+    SpriteRect = QRectF(-18, -23, 36, 62)
+
+    # The number of colours of mice, and the number of positions of the eyes
+    # between -2 and 2.
+    ColorCount = 32
+    EyeSteps = 17
+
+    def __init__(self, swarm):
+        super(SwarmItem, self).__init__()
+
+        self.swarm = swarm
+        self.colors = np.random.randint(0, SwarmItem.ColorCount, swarm.count)
+        self.atlas = self.createAtlas()
+
+        # A fragment is the x, y, sourceLeft, sourceTop, width, height,
+        # scaleX, scaleY, rotation and opacity of a piece of the atlas.
+        self.fragments = sip.array(QPainter.PixmapFragment, swarm.count)
+        self.fragmentData = np.frombuffer(memoryview(self.fragments),
+                np.float64).reshape(-1, 10)
+        self.fragmentData[:, 4] = SwarmItem.SpriteRect.width()
+        self.fragmentData[:, 5] = SwarmItem.SpriteRect.height()
+        self.fragmentData[:, 6:8] = 1.0
+        self.fragmentData[:, 9] = 1.0
+
+        radius = 2 * swarm.homeRadius
+        self.rect = QRectF(-radius, -radius, 2 * radius, 2 * radius)
+
+    def createAtlas(self):
+        rect = SwarmItem.SpriteRect
+        width = int(rect.width())
+        height = int(rect.height())
+        image = QImage(SwarmItem.EyeSteps * width,
+                SwarmItem.ColorCount * 2 * height,
+                QImage.Format_ARGB32_Premultiplied)
+        image.fill(Qt.transparent)
+
+        painter = QPainter(image)
+        painter.setRenderHint(QPainter.Antialiasing)
+        for color in range(SwarmItem.ColorCount):
+            mouseColor = QColor(qrand() % 256, qrand() % 256, qrand() % 256)
+            for colliding in (False, True):
+                for eyes in range(SwarmItem.EyeSteps):
+                    painter.save()
+                    painter.translate(eyes * width - rect.left(),
+                            (2 * color + colliding) * height - rect.top())
+                    Mouse.drawMouse(painter, mouseColor,
+                            self.eyeDirection(eyes), colliding)
+                    painter.restore()
+        painter.end()
+
+        return QPixmap.fromImage(image)
+
+    @staticmethod
+    def eyeDirection(eyes):
+        return 4.0 * eyes / (SwarmItem.EyeSteps - 1) - 2.0
+
+    def boundingRect(self):
+        return self.rect
+
+    def paint(self, painter, option, widget):
+        # Place the piece of the atlas of each mouse. Its centre is in the
+        # middle of the sprite, rather than where the mouse's origin is.
+        swarm = self.swarm
+        rect = SwarmItem.SpriteRect
+        radians = np.radians(swarm.rotation)
+        offset = rect.center().y()
+        eyes = np.rint((swarm.eyeDirection + 2.0) *
+                ((SwarmItem.EyeSteps - 1) / 4.0))
+
+        data = self.fragmentData
+        data[:, 0] = swarm.x - offset * np.sin(radians)
+        data[:, 1] = swarm.y + offset * np.cos(radians)
+        data[:, 2] = eyes * rect.width()
+        data[:, 3] = (2 * self.colors + swarm.colliding) * rect.height()
+        data[:, 8] = swarm.rotation
+
+        painter.setRenderHint(QPainter.SmoothPixmapTransform)
+        painter.drawPixmapFragments(self.fragments, self.atlas)
+
+
+class SwarmView(QGraphicsView):
+    """Shows a swarm of mice, which is moved by a single timer, and how long
+    moving and drawing them takes.
+    """
+
+    def __init__(self, count):
+        super(SwarmView, self).__init__()
+
+        self.swarm = MouseSwarm(count)
+        self.swarmItem = SwarmItem(self.swarm)
+
+        scene = QGraphicsScene(self)
+        scene.setSceneRect(self.swarmItem.boundingRect())
+        scene.setItemIndexMethod(QGraphicsScene.NoIndex)
+        scene.addItem(self.swarmItem)
+        self.setScene(scene)
+
+        # The time of the ticks and frames of the last second.
+        self.tickTimes = []
+        self.frameTimes = []
+
+        self.startTimer(1000 // 60)
+
+    def timerEvent(self, event):
+        start = time.perf_counter()
+        self.swarm.tick()
+        self.tickTimes.append((start, time.perf_counter() - start))
+        self.swarmItem.update()
+
+    def drawForeground(self, painter, rect):
+        now = time.perf_counter()
+        self.frameTimes.append(now)
+        while self.frameTimes[0] < now - 1:
+            del self.frameTimes[0]
+        while self.tickTimes and self.tickTimes[0][0] < now - 1:
+            del self.tickTimes[0]
+
+        tickTime = 0.0
+        if self.tickTimes:
+            tickTime = 1000 * sum(duration for start, duration in
+                    self.tickTimes) / len(self.tickTimes)
+
+        message = "%d mice, %d fps, %.1f ms per tick" % (self.swarm.count,
+                len(self.frameTimes), tickTime)
+
+        painter.save()
+        painter.resetTransform()
+        painter.fillRect(0, 0, painter.fontMetrics().width(message) + 12, 24,
+                QColor(255, 255, 255, 192))
+        painter.setPen(Qt.black)
+        painter.drawText(6, 17, message)
+        painter.restore()
+
+
 if __name__ == '__main__':
 
     import sys
@@ -198,24 +353,36 @@ if __name__ == '__main__':
     app = QApplication(sys.argv)
     qsrand(QTime(0,0,0).secsTo(QTime.currentTime()))
 
-    scene = QGraphicsScene()
-    scene.setSceneRect(-300, -300, 600, 600)
-    scene.setItemIndexMethod(QGraphicsScene.NoIndex)
-
-    for i in range(MouseCount):
-        mouse = Mouse()
-        mouse.setPos(math.sin((i * 6.28) / MouseCount) * 200,
-                     math.cos((i * 6.28) / MouseCount) * 200)
-        scene.addItem(mouse)
+    # Run with a number of mice to move them all together with a
+    # MouseSwarm, rather than each with its own timer.
+    if len(sys.argv) > 1:
+        view = SwarmView(int(sys.argv[1]))
+
+        # Zoom out so that many mice can be seen at once, but not so far that
+        # they can't be told apart. Drag the view to see the rest of them.
+        scale = max(MouseSwarm.HomeRadius / view.swarm.homeRadius, 0.25)
+        view.scale(scale, scale)
+        view.resize(800, 600)
+    else:
+        scene = QGraphicsScene()
+        scene.setSceneRect(-300, -300, 600, 600)
+        scene.setItemIndexMethod(QGraphicsScene.NoIndex)
+
+        for i in range(MouseCount):
+            mouse = Mouse()
+            mouse.setPos(math.sin((i * 6.28) / MouseCount) * 200,
+                         math.cos((i * 6.28) / MouseCount) * 200)
+            scene.addItem(mouse)
+
+        view = QGraphicsView(scene)
+        view.resize(400, 300)
 
-    view = QGraphicsView(scene)
     view.setRenderHint(QPainter.Antialiasing)
     view.setBackgroundBrush(QBrush(QPixmap(':/images/cheese.jpg')))
     view.setCacheMode(QGraphicsView.CacheBackground)
     view.setViewportUpdateMode(QGraphicsView.BoundingRectViewportUpdate)
     view.setDragMode(QGraphicsView.ScrollHandDrag)
     view.setWindowTitle("Colliding Mice")
-    view.resize(400, 300)
     view.show()
 
     sys.exit(app.exec_())
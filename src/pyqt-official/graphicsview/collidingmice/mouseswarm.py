@@ -0,0 +1,288 @@
+#!/usr/bin/env python
+
+
+#############################################################################
+##
+## Copyright (C) 2013 Riverbank Computing Limited.
+## Copyright (C) 2010 Nokia Corporation and/or its subsidiary(-ies).
+## All rights reserved.
+##
+## This file is part of the examples of PyQt.
+##
+## $QT_BEGIN_LICENSE:BSD$
+## You may use this file under the terms of the BSD license as follows:
+##
+## "Redistribution and use in source and binary forms, with or without
+## modification, are permitted provided that the following conditions are
+## met:
+##   * Redistributions of source code must retain the above copyright
+##     notice, this list of conditions and the following disclaimer.
+##   * Redistributions in binary form must reproduce the above copyright
+##     notice, this list of conditions and the following disclaimer in
+##     the documentation and/or other materials provided with the
+##     distribution.
+##   * Neither the name of Nokia Corporation and its Subsidiary(-ies) nor
+##     the names of its contributors may be used to endorse or promote
+##     products derived from this software without specific prior written
+##     permission.
+##
+## THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+## "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+## LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+## A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+## OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+## SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+## LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+## DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+## THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+## (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+## OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE."
+## $QT_END_LICENSE$
+##
+#############################################################################
+
+
+
+"""The behaviour of the mice of the collidingmice example, for thousands of
+mice at once.
+
+The state of all mice is kept in NumPy arrays, and a tick moves all of them
+in one go, following the same rules as Mouse.timerEvent(). Rather than
+asking the scene for the items in front of each mouse, the mice are sorted
+into a grid of cells large enough to hold the triangle that a mouse looks
+ahead in and the body of a mouse in it, so that only the mice in the same and
+in neighbouring cells have to be checked. Those are then tested against the
+triangle, and against each other's bodies, with the separating axis test,
+which tells whether two convex shapes overlap.
+
+Mouse.timerEvent() moves the mice one after the other, so that each mouse
+sees where the mice before it have moved to. Here all mice see where the
+others were at the start of the tick.
+"""
+
+
+import math
+
+import numpy as np
+
+
+class MouseSwarm(object):
+    # The triangle in front of a mouse, in its own coordinates, that it
+    # doesn't want other mice in.
+    LookAhead = 50.0
+    LookAheadWidth = 30.0
+
+    # Half the width and height of the body of a mouse, as in Mouse.shape().
+    BodyWidth = 10.0
+    BodyHeight = 20.0
+
+    # The distance from the centre of the scene that 7 mice stay within. It
+    # grows with the square root of the number of mice, so that they have
+    # as much room each.
+    HomeRadius = 150.0
+    HomeCount = 7
+
+    def __init__(self, count, seed=None):
+        self.count = count
+        self.random = np.random.RandomState(seed)
+        self.homeRadius = self.HomeRadius * math.sqrt(
+                max(count, self.HomeCount) / float(self.HomeCount))
+
+        # Start spread over the disc that the mice stay in.
+        distance = self.homeRadius * np.sqrt(self.random.uniform(0, 1, count))
+        direction = self.random.uniform(0, 2 * math.pi, count)
+        self.x = distance * np.cos(direction)
+        self.y = distance * np.sin(direction)
+
+        # The rotation of each mouse in degrees, clockwise, as for
+        # QGraphicsItem.setRotation().
+        self.rotation = self.random.randint(0, 360 * 16, count).astype(float)
+        self.angle = np.zeros(count)
+        self.speed = np.zeros(count)
+        self.eyeDirection = np.zeros(count)
+        self.colliding = np.zeros(count, dtype=bool)
+
+    def tick(self):
+        if self.count == 0:
+            return
+
+        radians = np.radians(self.rotation)
+        cos = np.cos(radians)
+        sin = np.sin(radians)
+        angle = self.angle
+        pi = math.pi
+
+        # Don't move too far away. The centre of the scene is at (centreX,
+        # centreY) in the coordinates of each mouse.
+        centreX = -self.x * cos - self.y * sin
+        centreY = self.x * sin - self.y * cos
+        far = np.hypot(centreX, centreY) > self.homeRadius
+        angleToCenter = np.mod(1.5 * pi - np.arctan2(centreY, centreX),
+                2 * pi)
+
+        rotateLeft = far & (angleToCenter > pi / 4) & (angleToCenter < pi)
+        rotateRight = far & (angleToCenter >= pi) & (
+                angleToCenter < 1.75 * pi)
+        sine = np.sin(angle)
+        turn = np.zeros(self.count)
+        turn[rotateLeft] = np.where(angle[rotateLeft] < -pi / 2, 0.25, -0.25)
+        turn[rotateRight] = np.where(angle[rotateRight] < pi / 2, 0.25, -0.25)
+        turn[~far & (sine < 0)] = 0.25
+        turn[~far & (sine > 0)] = -0.25
+
+        # Try not to crash with any other mice.
+        dangers = self.neighbours(cos, sin)
+        angle += turn + dangers
+
+        # Add some random movement.
+        wander = (self.dangerCount > 0) & (
+                self.random.randint(0, 10, self.count) == 0)
+        angle[wander] -= self.random.randint(0, 100, wander.sum()) / 500.0
+
+        self.speed += (-50 + self.random.randint(0, 100, self.count)) / 100.0
+
+        dx = np.sin(angle) * 10
+        self.eyeDirection = np.where(np.abs(dx / 5) < 1, 0.0, dx / 5)
+
+        self.rotation += dx
+        radians = np.radians(self.rotation)
+        step = 3 + np.sin(self.speed) * 3
+        self.x += step * np.sin(radians)
+        self.y -= step * np.cos(radians)
+
+    def neighbours(self, cos, sin):
+        """Returns how much each mouse turns to avoid the mice in front of it,
+        and sets dangerCount and colliding.
+        """
+
+        count = self.count
+        pi = math.pi
+        cellSize = (math.hypot(self.LookAhead, self.LookAheadWidth) +
+                math.hypot(self.BodyWidth, self.BodyHeight))
+
+        cellX = np.floor(self.x / cellSize).astype(np.intp)
+        cellY = np.floor(self.y / cellSize).astype(np.intp)
+        cellX -= cellX.min()
+        cellY -= cellY.min()
+        rows = cellY.max() + 1
+        columns = cellX.max() + 1
+        cellIds = cellX * rows + cellY
+
+        # Sort the mice by cell, so that the mice of a cell are next to each
+        # other, and find where each cell's mice start.
+        order = np.argsort(cellIds, kind='stable')
+        x = self.x[order]
+        y = self.y[order]
+        cos = cos[order]
+        sin = sin[order]
+        cellX = cellX[order]
+        cellY = cellY[order]
+        micePerCell = np.bincount(cellIds, minlength=columns * rows)
+        firstMouse = np.cumsum(micePerCell) - micePerCell
+
+        # The relation isn't symmetric, so each cell is paired with all of
+        # its neighbours.
+        pairs = []
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                neighbourX = cellX + dx
+                neighbourY = cellY + dy
+                inside = np.flatnonzero((neighbourX >= 0) &
+                        (neighbourX < columns) & (neighbourY >= 0) &
+                        (neighbourY < rows))
+                neighbourIds = neighbourX[inside] * rows + neighbourY[inside]
+
+                # Pair each mouse with every mouse in the neighbouring cell.
+                pairsPerMouse = micePerCell[neighbourIds]
+                total = pairsPerMouse.sum()
+                pairStarts = np.cumsum(pairsPerMouse) - pairsPerMouse
+                mice = np.repeat(inside, pairsPerMouse)
+                others = np.repeat(firstMouse[neighbourIds] - pairStarts,
+                        pairsPerMouse) + np.arange(total)
+
+                # Mice further apart than a cell can't be in each other's way.
+                deltaX = x[others] - x[mice]
+                deltaY = y[others] - y[mice]
+                squared = deltaX * deltaX + deltaY * deltaY
+                near = (squared > 0) & (squared < cellSize * cellSize)
+                pairs.append((mice[near], others[near]))
+
+        mice = np.concatenate([pair[0] for pair in pairs])
+        others = np.concatenate([pair[1] for pair in pairs])
+
+        # The other mouse in the coordinates of the mouse: its centre, and the
+        # directions of its sides.
+        mouseCos = cos[mice]
+        mouseSin = sin[mice]
+        deltaX = x[others] - x[mice]
+        deltaY = y[others] - y[mice]
+        localX = deltaX * mouseCos + deltaY * mouseSin
+        localY = -deltaX * mouseSin + deltaY * mouseCos
+        sideCos = cos[others] * mouseCos + sin[others] * mouseSin
+        sideSin = sin[others] * mouseCos - cos[others] * mouseSin
+        body = (localX, localY, sideCos, sideSin)
+
+        # Back from cell order to the order of the mice.
+        mice = order[mice]
+
+        self.colliding = np.zeros(count, dtype=bool)
+        self.colliding[mice[self.bodiesOverlap(*body)]] = True
+
+        ahead = np.flatnonzero(self.inLookAhead(*body))
+        self.dangerCount = np.bincount(mice[ahead], minlength=count)
+
+        # Turn right, away from mice on the left, and left away from mice on
+        # the right.
+        angleToMouse = np.mod(1.5 * pi - np.arctan2(localY[ahead],
+                localX[ahead]), 2 * pi)
+        away = np.where(angleToMouse < pi / 2, 0.5,
+                np.where(angleToMouse > 1.5 * pi, -0.5, 0.0))
+
+        return np.bincount(mice[ahead], away, count)
+
+    def bodyExtent(self, centreX, centreY, sideCos, sideSin, axisX, axisY):
+        # The lowest and highest points of bodies along an axis.
+        middle = centreX * axisX + centreY * axisY
+        radius = (self.BodyWidth * np.abs(sideCos * axisX + sideSin * axisY) +
+                self.BodyHeight * np.abs(sideCos * axisY - sideSin * axisX))
+
+        return middle - radius, middle + radius
+
+    def inLookAhead(self, centreX, centreY, sideCos, sideSin):
+        """Returns whether bodies with the given centre and orientation, in
+        the coordinates of a mouse, overlap the triangle in front of it.
+        """
+
+        width = self.LookAheadWidth
+        ahead = self.LookAhead
+        overlap = np.ones(len(centreX), dtype=bool)
+
+        # The axes are the normals of the sides of both shapes.
+        axes = ((ahead, -width), (ahead, width), (0.0, 1.0), (sideCos, sideSin),
+                (-sideSin, sideCos))
+        for axisX, axisY in axes:
+            corners = (0.0, -width * axisX - ahead * axisY,
+                    width * axisX - ahead * axisY)
+            low, high = self.bodyExtent(centreX, centreY, sideCos, sideSin,
+                    axisX, axisY)
+            overlap &= ((high >= np.minimum(np.minimum(*corners[:2]),
+                            corners[2])) &
+                    (low <= np.maximum(np.maximum(*corners[:2]), corners[2])))
+
+        return overlap
+
+    def bodiesOverlap(self, centreX, centreY, sideCos, sideSin):
+        """Returns whether bodies with the given centre and orientation, in
+        the coordinates of a mouse, overlap its body.
+        """
+
+        overlap = np.ones(len(centreX), dtype=bool)
+
+        for axisX, axisY in ((1.0, 0.0), (0.0, 1.0), (sideCos, sideSin),
+                (-sideSin, sideCos)):
+            low, high = self.bodyExtent(centreX, centreY, sideCos, sideSin,
+                    axisX, axisY)
+            extent = self.bodyExtent(0.0, 0.0, 1.0, 0.0, axisX, axisY)
+            overlap &= (high >= extent[0]) & (low <= extent[1])
+
+        return overlap
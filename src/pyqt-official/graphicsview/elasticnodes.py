@@ -44,13 +44,17 @@
 
 import math
 
-from PyQt5.QtCore import (qAbs, QLineF, QPointF, qrand, QRectF, QSizeF, qsrand,
-        Qt, QTime)
+import numpy as np
+
+from PyQt5 import sip
+from PyQt5.QtCore import QLineF, QPointF, qrand, QRectF, QSizeF, qsrand, Qt, QTime
 from PyQt5.QtGui import (QBrush, QColor, QLinearGradient, QPainter,
         QPainterPath, QPen, QPolygonF, QRadialGradient)
 from PyQt5.QtWidgets import (QApplication, QGraphicsItem, QGraphicsScene,
         QGraphicsView, QStyle)
 
+from forcelayout import ForceLayout, gridGraph, loadLayout
+
 
 class Edge(QGraphicsItem):
     Pi = math.pi
@@ -161,7 +165,8 @@ class Node(QGraphicsItem):
 
         self.graph = graphWidget
         self.edgeList = []
-        self.newPos = QPointF()
+        # The node's index in the graph's ForceLayout.
+        self.index = 0
 
         self.setFlag(QGraphicsItem.ItemIsMovable)
         self.setFlag(QGraphicsItem.ItemSendsGeometryChanges)
@@ -178,51 +183,6 @@ class Node(QGraphicsItem):
     def edges(self):
         return self.edgeList
 
-    def calculateForces(self):
-        if not self.scene() or self.scene().mouseGrabberItem() is self:
-            self.newPos = self.pos()
-            return
-    
-        # Sum up all forces pushing this item away.
-        xvel = 0.0
-        yvel = 0.0
-        for item in self.scene().items():
-            if not isinstance(item, Node):
-                continue
-
-            line = QLineF(self.mapFromItem(item, 0, 0), QPointF(0, 0))
-            dx = line.dx()
-            dy = line.dy()
-            l = 2.0 * (dx * dx + dy * dy)
-            if l > 0:
-                xvel += (dx * 150.0) / l
-                yvel += (dy * 150.0) / l
-
-        # Now subtract all forces pulling items together.
-        weight = (len(self.edgeList) + 1) * 10.0
-        for edge in self.edgeList:
-            if edge.sourceNode() is self:
-                pos = self.mapFromItem(edge.destNode(), 0, 0)
-            else:
-                pos = self.mapFromItem(edge.sourceNode(), 0, 0)
-            xvel += pos.x() / weight
-            yvel += pos.y() / weight
-    
-        if qAbs(xvel) < 0.1 and qAbs(yvel) < 0.1:
-            xvel = yvel = 0.0
-
-        sceneRect = self.scene().sceneRect()
-        self.newPos = self.pos() + QPointF(xvel, yvel)
-        self.newPos.setX(min(max(self.newPos.x(), sceneRect.left() + 10), sceneRect.right() - 10))
-        self.newPos.setY(min(max(self.newPos.y(), sceneRect.top() + 10), sceneRect.bottom() - 10))
-
-    def advance(self):
-        if self.newPos == self.pos():
-            return False
-
-        self.setPos(self.newPos)
-        return True
-
     def boundingRect(self):
         adjust = 2.0
         return QRectF(-10 - adjust, -10 - adjust, 23 + adjust, 23 + adjust)
@@ -255,28 +215,97 @@ class Node(QGraphicsItem):
         if change == QGraphicsItem.ItemPositionHasChanged:
             for edge in self.edgeList:
                 edge.adjust()
-            self.graph.itemMoved()
+            self.graph.nodeMoved(self)
 
         return super(Node, self).itemChange(change, value)
 
     def mousePressEvent(self, event):
+        # Keep the forces from moving the node while it's being dragged.
+        self.graph.forceLayout.pinned[self.index] = True
         self.update()
         super(Node, self).mousePressEvent(event)
 
     def mouseReleaseEvent(self, event):
+        self.graph.forceLayout.pinned[self.index] = False
         self.update()
         super(Node, self).mouseReleaseEvent(event)
 
 
+class GraphItem(QGraphicsItem):
+    """Draws all the nodes and edges of a large graph at once, straight from
+    the positions of its ForceLayout, rather than as an item per node and
+    per edge.
+    """
+
+    def __init__(self, graphWidget):
+        super(GraphItem, self).__init__()
+
+        self.graph = graphWidget
+        self.draggedNode = None
+
+        # The edges, and the centres of the nodes. A sip.array is passed to
+        # QPainter without converting each of its elements.
+        layout = graphWidget.forceLayout
+        self.lines = sip.array(QLineF, len(layout.edges))
+        self.points = QPolygonF(len(layout.positions))
+
+    def boundingRect(self):
+        return self.graph.sceneRect()
+
+    def paint(self, painter, option, widget):
+        layout = self.graph.forceLayout
+        lines = np.frombuffer(memoryview(self.lines), dtype=np.float64)
+        lines.reshape(-1, 2)[:] = layout.positions[layout.edges.ravel()]
+
+        address = self.points.data()
+        address.setsize(len(self.points) * 16)
+        points = np.frombuffer(address, dtype=np.float64)
+        points.reshape(-1, 2)[:] = layout.positions
+
+        painter.setRenderHint(QPainter.Antialiasing, False)
+        painter.setPen(QPen(Qt.black, 0))
+        painter.drawLines(self.lines)
+
+        painter.setPen(QPen(Qt.darkYellow, 20, Qt.SolidLine, Qt.RoundCap))
+        painter.drawPoints(self.points)
+        painter.setPen(QPen(Qt.yellow, 16, Qt.SolidLine, Qt.RoundCap))
+        painter.drawPoints(self.points)
+
+    def mousePressEvent(self, event):
+        positions = self.graph.forceLayout.positions
+        distances = np.hypot(positions[:, 0] - event.pos().x(),
+                positions[:, 1] - event.pos().y())
+        index = int(distances.argmin())
+
+        if distances[index] > 10:
+            event.ignore()
+            return
+
+        self.draggedNode = index
+        self.graph.forceLayout.pinned[index] = True
+
+    def mouseMoveEvent(self, event):
+        if self.draggedNode is not None:
+            self.graph.moveNode(self.draggedNode, event.pos())
+
+    def mouseReleaseEvent(self, event):
+        if self.draggedNode is not None:
+            self.graph.forceLayout.pinned[self.draggedNode] = False
+            self.draggedNode = None
+
+
 class GraphWidget(QGraphicsView):
-    def __init__(self):
+    def __init__(self, graph=None):
         super(GraphWidget, self).__init__()
 
         self.timerId = 0
+        self.nodes = []
+        self.centerNode = None
+        self.graphItem = None
+        self.minimumScale = 0.07
 
         scene = QGraphicsScene(self)
         scene.setItemIndexMethod(QGraphicsScene.NoIndex)
-        scene.setSceneRect(-200, -200, 400, 400)
         self.setScene(scene)
         self.setCacheMode(QGraphicsView.CacheBackground)
         self.setViewportUpdateMode(QGraphicsView.BoundingRectViewportUpdate)
@@ -284,6 +313,18 @@ class GraphWidget(QGraphicsView):
         self.setTransformationAnchor(QGraphicsView.AnchorUnderMouse)
         self.setResizeAnchor(QGraphicsView.AnchorViewCenter)
 
+        if graph is not None:
+            self.createLargeGraph(*graph)
+        else:
+            self.createExampleGraph()
+
+        self.setMinimumSize(400, 400)
+        self.setWindowTitle("Elastic Nodes")
+
+    def createExampleGraph(self):
+        scene = self.scene()
+        scene.setSceneRect(-200, -200, 400, 400)
+
         node1 = Node(self)
         node2 = Node(self)
         node3 = Node(self)
@@ -315,6 +356,16 @@ class GraphWidget(QGraphicsView):
         scene.addItem(Edge(node8, node7))
         scene.addItem(Edge(node9, node8))
 
+        self.nodes = [node1, node2, node3, node4, self.centerNode, node6,
+                node7, node8, node9]
+        for index, node in enumerate(self.nodes):
+            node.index = index
+        edges = [(edge.sourceNode().index, edge.destNode().index)
+                for node in self.nodes for edge in node.edges()
+                if edge.sourceNode() is node]
+        self.forceLayout = ForceLayout(np.zeros((len(self.nodes), 2)), edges,
+                self.sceneBounds())
+
         node1.setPos(-50, -50)
         node2.setPos(0, -50)
         node3.setPos(50, -50)
@@ -326,49 +377,96 @@ class GraphWidget(QGraphicsView):
         node9.setPos(50, 50)
 
         self.scale(0.8, 0.8)
-        self.setMinimumSize(400, 400)
-        self.setWindowTitle("Elastic Nodes")
+
+    def createLargeGraph(self, positions, edges, bounds):
+        # Shows a graph such as the ones from forcelayout's gridGraph() and
+        # loadLayout(). If it has already been laid out then it doesn't move.
+        left, top, right, bottom = bounds
+        self.scene().setSceneRect(left, top, right - left, bottom - top)
+        size = max(right - left, bottom - top)
+
+        self.forceLayout = ForceLayout(positions, edges, self.sceneBounds())
+
+        self.graphItem = GraphItem(self)
+        self.scene().addItem(self.graphItem)
+
+        scale = 800 / size
+        self.minimumScale = min(self.minimumScale, scale / 2)
+        self.scale(scale, scale)
+        self.itemMoved()
+
+    def sceneBounds(self):
+        rect = self.sceneRect()
+        return (rect.left(), rect.top(), rect.right(), rect.bottom())
 
     def itemMoved(self):
         if not self.timerId:
-            self.timerId = self.startTimer(1000 / 25)
+            self.timerId = self.startTimer(1000 // 25)
+
+    def nodeMoved(self, node):
+        self.forceLayout.positions[node.index] = (node.x(), node.y())
+        self.itemMoved()
+
+    def moveNode(self, index, pos):
+        # Moves a node of a large graph.
+        self.forceLayout.positions[index] = (pos.x(), pos.y())
+        self.graphItem.update()
+        self.itemMoved()
+
+    def moveCenterNode(self, dx, dy):
+        if self.graphItem is None:
+            self.centerNode.moveBy(dx, dy)
+        else:
+            x, y = self.forceLayout.positions[0]
+            self.moveNode(0, QPointF(x + dx, y + dy))
 
     def keyPressEvent(self, event):
         key = event.key()
 
         if key == Qt.Key_Up:
-            self.centerNode.moveBy(0, -20)
+            self.moveCenterNode(0, -20)
         elif key == Qt.Key_Down:
-            self.centerNode.moveBy(0, 20)
+            self.moveCenterNode(0, 20)
         elif key == Qt.Key_Left:
-            self.centerNode.moveBy(-20, 0)
+            self.moveCenterNode(-20, 0)
         elif key == Qt.Key_Right:
-            self.centerNode.moveBy(20, 0)
+            self.moveCenterNode(20, 0)
         elif key == Qt.Key_Plus:
             self.scaleView(1.2)
         elif key == Qt.Key_Minus:
             self.scaleView(1 / 1.2)
         elif key == Qt.Key_Space or key == Qt.Key_Enter:
-            for item in self.scene().items():
-                if isinstance(item, Node):
-                    item.setPos(-150 + qrand() % 300, -150 + qrand() % 300)
+            self.shuffle()
         else:
             super(GraphWidget, self).keyPressEvent(event)
 
-    def timerEvent(self, event):
-        nodes = [item for item in self.scene().items() if isinstance(item, Node)]
-
-        for node in nodes:
-            node.calculateForces()
+    def shuffle(self):
+        if self.graphItem is None:
+            for node in self.nodes:
+                node.setPos(-150 + qrand() % 300, -150 + qrand() % 300)
+        else:
+            size = self.sceneRect().width()
+            positions = self.forceLayout.positions
+            positions[:] = np.random.uniform(-0.375 * size, 0.375 * size,
+                    positions.shape)
+            self.graphItem.update()
+            self.itemMoved()
 
-        itemsMoved = False
-        for node in nodes:
-            if node.advance():
-                itemsMoved = True
+    def timerEvent(self, event):
+        moved = self.forceLayout.step()
 
-        if not itemsMoved:
+        if len(moved) == 0:
             self.killTimer(self.timerId)
             self.timerId = 0
+            return
+
+        # Copy the new positions to the items in one go.
+        if self.graphItem is not None:
+            self.graphItem.update()
+        else:
+            positions = self.forceLayout.positions
+            for index in moved.tolist():
+                self.nodes[index].setPos(*positions[index])
 
     def wheelEvent(self, event):
         self.scaleView(math.pow(2.0, -event.angleDelta().y() / 240.0))
@@ -411,7 +509,7 @@ class GraphWidget(QGraphicsView):
     def scaleView(self, scaleFactor):
         factor = self.transform().scale(scaleFactor, scaleFactor).mapRect(QRectF(0, 0, 1, 1)).width()
 
-        if factor < 0.07 or factor > 100:
+        if factor < self.minimumScale or factor > 100:
             return
 
         self.scale(scaleFactor, scaleFactor)
@@ -424,7 +522,22 @@ if __name__ == '__main__':
     app = QApplication(sys.argv)
     qsrand(QTime(0,0,0).secsTo(QTime.currentTime()))
 
-    widget = GraphWidget()
+    # Run with a number of nodes, and optionally of edges, to lay out a
+    # large graph of that size instead of the example one, or with a graph
+    # laid out by forcelayout.py.
+    graph = None
+    if len(sys.argv) > 1:
+        if sys.argv[1].endswith('.npz'):
+            graph = loadLayout(sys.argv[1])
+        else:
+            nodeCount = int(sys.argv[1])
+            if len(sys.argv) > 2:
+                edgeCount = int(sys.argv[2])
+            else:
+                edgeCount = nodeCount * 5 // 2
+            graph = gridGraph(nodeCount, edgeCount)
+
+    widget = GraphWidget(graph)
     widget.show()
 
     sys.exit(app.exec_())
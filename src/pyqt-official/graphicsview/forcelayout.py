@@ -0,0 +1,412 @@
+#!/usr/bin/env python
+
+
+#############################################################################
+##
+## Copyright (C) 2013 Riverbank Computing Limited.
+## Copyright (C) 2010 Nokia Corporation and/or its subsidiary(-ies).
+## All rights reserved.
+##
+## This file is part of the examples of PyQt.
+##
+## $QT_BEGIN_LICENSE:BSD$
+## You may use this file under the terms of the BSD license as follows:
+##
+## "Redistribution and use in source and binary forms, with or without
+## modification, are permitted provided that the following conditions are
+## met:
+##   * Redistributions of source code must retain the above copyright
+##     notice, this list of conditions and the following disclaimer.
+##   * Redistributions in binary form must reproduce the above copyright
+##     notice, this list of conditions and the following disclaimer in
+##     the documentation and/or other materials provided with the
+##     distribution.
+##   * Neither the name of Nokia Corporation and its Subsidiary(-ies) nor
+##     the names of its contributors may be used to endorse or promote
+##     products derived from this software without specific prior written
+##     permission.
+##
+## THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+## "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+## LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+## A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+## OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+## SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+## LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+## DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+## THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+## (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+## OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE."
+## $QT_END_LICENSE$
+##
+#############################################################################
+
+
+"""The force model of the elasticnodes example, on NumPy arrays.
+
+Every node pushes every other node away with a force of 75 / distance, and
+every edge pulls its two nodes together with a force proportional to their
+distance, divided by the number of edges of the node plus one. A step moves
+all nodes at once by the sum of their forces.
+
+Small graphs are simulated exactly. In larger graphs nodes only push the
+nodes that are closer than a cutoff distance, and the force is lowered by its
+value at the cutoff so that it fades out there rather than stopping suddenly.
+Without the cutoff the pushes of thousands of distant nodes add up to more
+than the edges can hold, and the graph never settles. The nodes are sorted
+into a grid of cells as large as the cutoff, so that only the nodes in the
+same and in neighbouring cells have to be compared, and a step takes O(n)
+time instead of O(n^2).
+
+The module can also be run as a script, to lay out graphs without showing
+them. Run it with -h for its options.
+"""
+
+
+import math
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+
+class ForceLayout(object):
+    # The number of nodes up to which every pair of nodes is computed.
+    ExactLimit = 64
+
+    # The number of rows of node pairs that are computed at once in the exact
+    # repulsion, which bounds its memory use.
+    ExactChunk = 256
+
+    # The distance beyond which nodes of larger graphs don't push each other.
+    Cutoff = 150.0
+
+    Repulsion = 75.0
+
+    # Nodes whose speed in both directions is lower than this don't move.
+    MinSpeed = 0.1
+
+    def __init__(self, positions, edges, bounds, cutoff=None):
+        """positions is a sequence of (x, y), edges one of (source, dest)
+        indexes into positions and bounds the (left, top, right, bottom)
+        rectangle that the nodes must stay 10 units inside of. If cutoff is
+        None then graphs of up to ExactLimit nodes are simulated exactly, and
+        larger ones with the Cutoff distance.
+        """
+
+        self.positions = np.array(positions, dtype=float).reshape(-1, 2)
+        self.edges = np.array(edges, dtype=np.intp).reshape(-1, 2)
+        self.bounds = bounds
+
+        count = len(self.positions)
+        if cutoff is None and count > self.ExactLimit:
+            cutoff = self.Cutoff
+        self.cutoff = cutoff
+
+        self.pinned = np.zeros(count, dtype=bool)
+        degrees = np.bincount(self.edges.ravel(), minlength=count)
+        self.weights = (degrees + 1) * 10.0
+
+    def step(self):
+        """Moves the nodes that aren't pinned by one step, and returns the
+        indexes of the ones that moved.
+        """
+
+        positions = self.positions
+        velocity = self.repulsion(positions) + self.attraction(positions)
+        velocity[(np.abs(velocity) < self.MinSpeed).all(axis=1)] = 0.0
+
+        left, top, right, bottom = self.bounds
+        newPositions = positions + velocity
+        np.clip(newPositions[:, 0], left + 10, right - 10,
+                out=newPositions[:, 0])
+        np.clip(newPositions[:, 1], top + 10, bottom - 10,
+                out=newPositions[:, 1])
+        newPositions[self.pinned] = positions[self.pinned]
+
+        moved = np.flatnonzero((newPositions != positions).any(axis=1))
+
+        # Update in place, as views of the positions may be shared.
+        positions[moved] = newPositions[moved]
+
+        return moved
+
+    def run(self, maxSteps):
+        """Steps until no node moves any more, or for at most maxSteps steps,
+        and returns the number of steps taken.
+        """
+
+        for steps in range(1, maxSteps + 1):
+            if len(self.step()) == 0:
+                break
+        else:
+            steps = maxSteps
+
+        return steps
+
+    def attraction(self, positions):
+        count = len(positions)
+        sources = self.edges[:, 0]
+        dests = self.edges[:, 1]
+        delta = positions[dests] - positions[sources]
+
+        pull = np.empty_like(positions)
+        for axis in (0, 1):
+            pull[:, axis] = (np.bincount(sources, delta[:, axis], count) -
+                    np.bincount(dests, delta[:, axis], count))
+
+        return pull / self.weights[:, np.newaxis]
+
+    def repulsion(self, positions):
+        if self.cutoff is None:
+            return self.exactRepulsion(positions)
+
+        return self.gridRepulsion(positions)
+
+    def exactRepulsion(self, positions):
+        x = positions[:, 0]
+        y = positions[:, 1]
+        push = np.empty_like(positions)
+
+        for start in range(0, len(positions), self.ExactChunk):
+            stop = start + self.ExactChunk
+            deltaX = x[start:stop, np.newaxis] - x
+            deltaY = y[start:stop, np.newaxis] - y
+            strength = self.strength(deltaX * deltaX + deltaY * deltaY)
+            push[start:stop, 0] = (deltaX * strength).sum(axis=1)
+            push[start:stop, 1] = (deltaY * strength).sum(axis=1)
+
+        return push
+
+    def strength(self, squaredDistance):
+        # Nodes at the same position, such as a node and itself, don't push
+        # each other.
+        squaredDistance[squaredDistance == 0] = np.inf
+
+        return self.Repulsion / squaredDistance
+
+    def gridRepulsion(self, positions):
+        count = len(positions)
+        cutoff = self.cutoff
+        left, top, right, bottom = self.bounds
+        columns = max(int(math.ceil((right - left) / cutoff)), 1)
+        rows = max(int(math.ceil((bottom - top) / cutoff)), 1)
+
+        cells = ((positions - (left, top)) // cutoff).astype(np.intp)
+        np.clip(cells, 0, (columns - 1, rows - 1), out=cells)
+        cellIds = cells[:, 0] * rows + cells[:, 1]
+
+        # Sort the nodes by cell, so that the nodes of a cell are next to each
+        # other, and find where each cell's nodes start.
+        order = np.argsort(cellIds, kind='stable')
+        x = positions[order, 0]
+        y = positions[order, 1]
+        cellX = cells[order, 0]
+        cellY = cells[order, 1]
+        nodesPerCell = np.bincount(cellIds, minlength=columns * rows)
+        firstNode = np.cumsum(nodesPerCell) - nodesPerCell
+
+        pushX = np.zeros(count)
+        pushY = np.zeros(count)
+
+        # Each cell with itself, and with the neighbours on one side of it.
+        # The forces between the cells on the other side are the same, the
+        # other way round.
+        for dx, dy in ((0, 0), (1, -1), (1, 0), (1, 1), (0, 1)):
+            neighbourX = cellX + dx
+            neighbourY = cellY + dy
+            inside = np.flatnonzero((neighbourX < columns) &
+                    (neighbourY >= 0) & (neighbourY < rows))
+            neighbourIds = neighbourX[inside] * rows + neighbourY[inside]
+
+            # Pair each node with every node in the neighbouring cell.
+            pairsPerNode = nodesPerCell[neighbourIds]
+            total = pairsPerNode.sum()
+            if total == 0:
+                continue
+
+            pairStarts = np.cumsum(pairsPerNode) - pairsPerNode
+            nodes = np.repeat(inside, pairsPerNode)
+            others = np.repeat(firstNode[neighbourIds] - pairStarts,
+                    pairsPerNode) + np.arange(total)
+
+            deltaX = x[nodes] - x[others]
+            deltaY = y[nodes] - y[others]
+            squared = deltaX * deltaX + deltaY * deltaY
+
+            # Only the pairs closer than the cutoff push each other, and the
+            # force is lowered so that it goes down to 0 at the cutoff,
+            # rather than jumping there.
+            near = np.flatnonzero((squared < cutoff * cutoff) & (squared > 0))
+            nodes = nodes[near]
+            others = others[near]
+            strength = self.Repulsion * (1.0 / squared[near] -
+                    1.0 / (cutoff * cutoff))
+            forceX = deltaX[near] * strength
+            forceY = deltaY[near] * strength
+
+            pushX += np.bincount(nodes, forceX, count)
+            pushY += np.bincount(nodes, forceY, count)
+            if dx or dy:
+                pushX -= np.bincount(others, forceX, count)
+                pushY -= np.bincount(others, forceY, count)
+
+        push = np.empty_like(positions)
+        push[order, 0] = pushX
+        push[order, 1] = pushY
+
+        return push
+
+
+def graphBounds(nodeCount):
+    """Returns bounds that give nodeCount nodes as much room as the nine nodes
+    of the example graph have.
+    """
+
+    size = 400 * math.sqrt(max(nodeCount, 9) / 9.0)
+
+    return (-size / 2, -size / 2, size / 2, size / 2)
+
+
+def gridGraph(nodeCount, edgeCount):
+    """Returns the positions, edges and bounds of a grid of nodes, like the
+    example graph, with extra edges across random cells of the grid. The
+    nodes start roughly where they are in the grid.
+    """
+
+    columns = int(math.ceil(math.sqrt(nodeCount)))
+    index = np.arange(nodeCount)
+    across = index[(index % columns < columns - 1) & (index + 1 < nodeCount)]
+    down = index[index + columns < nodeCount]
+    diagonal = down[down % columns < columns - 1]
+    diagonal = diagonal[diagonal + columns + 1 < nodeCount]
+
+    edges = np.concatenate((np.column_stack((across, across + 1)),
+            np.column_stack((down, down + columns)),
+            np.column_stack((diagonal, diagonal + columns + 1))))
+    extra = max(edgeCount - len(across) - len(down), 0)
+    np.random.shuffle(edges[len(across) + len(down):])
+    edges = edges[:len(across) + len(down) + min(extra, len(diagonal))]
+
+    bounds = graphBounds(nodeCount)
+    spacing = 0.75 * (bounds[2] - bounds[0]) / columns
+    positions = np.column_stack((index % columns, index // columns))
+    positions = (positions - (columns - 1) / 2.0) * spacing
+    positions += np.random.uniform(-spacing / 2, spacing / 2, positions.shape)
+
+    return positions, edges, bounds
+
+
+def layoutGraph(edges, positions=None, bounds=None, cutoff=None,
+        maxSteps=10000):
+    """Lays out the graph with the given edges until it settles, and returns
+    the positions of its nodes and the number of steps taken. The nodes start
+    at random positions, unless they are given.
+    """
+
+    edges = np.array(edges, dtype=np.intp).reshape(-1, 2)
+
+    if positions is None:
+        nodeCount = edges.max() + 1 if len(edges) else 0
+    else:
+        nodeCount = len(positions)
+
+    if bounds is None:
+        bounds = graphBounds(nodeCount)
+
+    if positions is None:
+        left, top, right, bottom = bounds
+        positions = np.column_stack((
+                np.random.uniform(0.875 * left + 0.125 * right,
+                        0.125 * left + 0.875 * right, nodeCount),
+                np.random.uniform(0.875 * top + 0.125 * bottom,
+                        0.125 * top + 0.875 * bottom, nodeCount)))
+
+    layout = ForceLayout(positions, edges, bounds, cutoff)
+    steps = layout.run(maxSteps)
+
+    return layout.positions, steps
+
+
+def layoutGraphs(graphs, jobs=None, **options):
+    """Lays out each graph of a sequence of (edges, positions, bounds) tuples
+    in a pool of jobs processes, and returns the result of layoutGraph() for
+    each. The options are passed on to layoutGraph().
+    """
+
+    graphs = list(graphs)
+
+    with ProcessPoolExecutor(jobs) as executor:
+        futures = [executor.submit(layoutGraph, edges, positions, bounds,
+                **options) for edges, positions, bounds in graphs]
+
+        return [future.result() for future in futures]
+
+
+def saveLayout(fileName, positions, edges, bounds):
+    """Saves a laid out graph, in the form that the elasticnodes example
+    loads.
+    """
+
+    with open(fileName, 'wb') as layoutFile:
+        np.savez(layoutFile, positions=positions, edges=edges,
+                bounds=np.array(bounds, dtype=float))
+
+
+def loadLayout(fileName):
+    """Returns the positions, edges and bounds of a graph saved with
+    saveLayout().
+    """
+
+    with np.load(fileName) as layout:
+        return (layout['positions'], layout['edges'],
+                tuple(layout['bounds'].tolist()))
+
+
+def readEdges(fileName):
+    """Reads an edge list with a line of two node numbers per edge. Blank
+    lines and lines starting with # are skipped.
+    """
+
+    return np.loadtxt(fileName, dtype=np.intp, comments='#',
+            ndmin=2).reshape(-1, 2)
+
+
+if __name__ == '__main__':
+
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(
+            description="Lay out graphs with the force model of the "
+                    "elasticnodes example. Each edge list file is laid out "
+                    "into a file of the same name with a .npz extension, "
+                    "which elasticnodes.py can show.")
+    parser.add_argument('files', nargs='+', metavar='EDGES',
+            help="a file with a line of two node numbers per edge")
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+            help="the number of processes to use (default: one per CPU)")
+    parser.add_argument('--cutoff', type=float, default=None,
+            help="the distance beyond which nodes don't push each other")
+    parser.add_argument('--max-steps', type=int, default=10000,
+            help="stop after this many steps (default: %(default)s)")
+    args = parser.parse_args()
+
+    graphs = [(readEdges(fileName), None, None) for fileName in args.files]
+
+    start = time.perf_counter()
+    results = layoutGraphs(graphs, args.jobs, cutoff=args.cutoff,
+            maxSteps=args.max_steps)
+    elapsed = time.perf_counter() - start
+
+    for fileName, (edges, _, _), (positions, steps) in zip(args.files,
+            graphs, results):
+        outputName = os.path.splitext(fileName)[0] + '.npz'
+        saveLayout(outputName, positions, edges, graphBounds(len(positions)))
+
+        settled = "settled" if steps < args.max_steps else "not settled"
+        print("%s: %d nodes, %d edges, %d steps (%s)" % (outputName,
+                len(positions), len(edges), steps, settled))
+
+    print("%d graphs in %.2f s" % (len(graphs), elapsed))
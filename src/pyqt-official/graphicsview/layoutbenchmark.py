@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+
+
+#############################################################################
+##
+## Copyright (C) 2013 Riverbank Computing Limited.
+## Copyright (C) 2010 Nokia Corporation and/or its subsidiary(-ies).
+## All rights reserved.
+##
+## This file is part of the examples of PyQt.
+##
+## $QT_BEGIN_LICENSE:BSD$
+## You may use this file under the terms of the BSD license as follows:
+##
+## "Redistribution and use in source and binary forms, with or without
+## modification, are permitted provided that the following conditions are
+## met:
+##   * Redistributions of source code must retain the above copyright
+##     notice, this list of conditions and the following disclaimer.
+##   * Redistributions in binary form must reproduce the above copyright
+##     notice, this list of conditions and the following disclaimer in
+##     the documentation and/or other materials provided with the
+##     distribution.
+##   * Neither the name of Nokia Corporation and its Subsidiary(-ies) nor
+##     the names of its contributors may be used to endorse or promote
+##     products derived from this software without specific prior written
+##     permission.
+##
+## THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+## "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+## LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+## A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+## OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+## SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+## LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+## DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+## THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+## (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+## OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE."
+## $QT_END_LICENSE$
+##
+#############################################################################
+
+
+
+"""Measures how fast the force model of the elasticnodes example lays out
+grid graphs of different sizes.
+
+For each size it reports the number of steps per second, and how many steps
+and how long it takes for the graph to settle. The sizes are laid out one
+after the other in a separate process, so that their timings don't
+get in each other's way. Run it with -h for its options.
+"""
+
+
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from forcelayout import ForceLayout, gridGraph
+
+
+def benchmark(nodeCount, edgeCount, cutoff, maxSteps):
+    np.random.seed(nodeCount)
+    positions, edges, bounds = gridGraph(nodeCount, edgeCount)
+    layout = ForceLayout(positions, edges, bounds, cutoff)
+
+    start = time.perf_counter()
+    steps = layout.run(maxSteps)
+    elapsed = time.perf_counter() - start
+
+    return len(edges), layout.cutoff, steps, elapsed
+
+
+if __name__ == '__main__':
+
+    import argparse
+
+    parser = argparse.ArgumentParser(
+            description="Benchmark the force layout of elasticnodes.py.")
+    parser.add_argument('sizes', nargs='*', type=int, metavar='NODES',
+            default=[100, 1000, 5000, 20000],
+            help="the numbers of nodes (default: 100 1000 5000 20000)")
+    parser.add_argument('--cutoff', type=float, default=None,
+            help="the distance beyond which nodes don't push each other "
+                    "(default: exact up to %d nodes, %g above)" % (
+                            ForceLayout.ExactLimit, ForceLayout.Cutoff))
+    parser.add_argument('--max-steps', type=int, default=5000,
+            help="give up after this many steps (default: %(default)s)")
+    args = parser.parse_args()
+
+    print("%8s %8s %8s %10s %8s %14s" % ("nodes", "edges", "cutoff",
+            "steps/s", "steps", "settled in (s)"))
+
+    with ProcessPoolExecutor(1) as executor:
+        for nodeCount in args.sizes:
+            edges, cutoff, steps, elapsed = executor.submit(benchmark,
+                    nodeCount, nodeCount * 5 // 2, args.cutoff,
+                    args.max_steps).result()
+
+            if steps < args.max_steps:
+                settled = "%.2f" % elapsed
+            else:
+                settled = "-"
+
+            print("%8d %8d %8s %10.1f %8d %14s" % (nodeCount, edges,
+                    "exact" if cutoff is None else "%g" % cutoff,
+                    steps / elapsed, steps, settled))
@@ -42,20 +42,235 @@
 #############################################################################
 
 
+import gc
 import math
 
-from PyQt5.QtCore import (QByteArray, QFile, QItemSelection,
-        QItemSelectionModel, QModelIndex, QPoint, QRect, QSize, Qt,
-        QTextStream)
+import numpy as np
+
+from PyQt5.QtCore import (pyqtSignal, QAbstractTableModel, QByteArray, QFile,
+        QItemSelection, QItemSelectionModel, QModelIndex, QPoint, QRect,
+        QSize, Qt, QThread)
 from PyQt5.QtGui import (QBrush, QColor, QFontMetrics, QPainter, QPainterPath,
-        QPalette, QPen, QRegion, QStandardItemModel)
+        QPalette, QPen, QRegion)
 from PyQt5.QtWidgets import (QAbstractItemView, QApplication, QFileDialog,
         QMainWindow, QMenu, QRubberBand, QSplitter, QStyle, QTableView)
 
 import chart_rc
 
 
+def readChart(data, isInterrupted=None):
+    """Parse the contents of a .cht file, a line of label,value,color per
+    slice up to the first empty line, into a list of labels, an array of
+    values and an array of colors as QRgb values. Returns None if
+    isInterrupted() becomes true while parsing.
+    """
+
+    BlockSize = 100000
+
+    lines = data.decode('utf-8').splitlines()
+    if '' in lines:
+        del lines[lines.index(''):]
+
+    if not lines:
+        return [], np.zeros(0), np.zeros(0, dtype=np.uint32)
+
+    # The garbage collector would go through the millions of lists that are
+    # made here again and again, and that takes longer than parsing them.
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        fields = []
+        for start in range(0, len(lines), BlockSize):
+            if isInterrupted is not None and isInterrupted():
+                return None
+
+            fields.extend([line.rsplit(',', 2)
+                    for line in lines[start:start + BlockSize]])
+
+        labels, values, colorNames = zip(*fields)
+    finally:
+        if collecting:
+            gc.enable()
+
+    if isInterrupted is not None and isInterrupted():
+        return None
+
+    return (list(labels), np.array(values, dtype=float),
+            np.array([colorValue(name) for name in colorNames],
+                    dtype=np.uint32))
+
+
+def colorValue(name):
+    # Colors are saved as #rrggbb, which is quicker to read directly than
+    # with QColor.
+    if len(name) == 7 and name[0] == '#':
+        try:
+            return 0xff000000 | int(name[1:], 16)
+        except ValueError:
+            pass
+
+    return QColor(name).rgba()
+
+
+def writeChart(fileName, labels, values, colors):
+    """Write a chart to a .cht file, a block of lines at a time."""
+
+    BlockSize = 10000
+
+    with open(fileName, 'w', encoding='utf-8', newline='\n') as f:
+        for start in range(0, len(labels), BlockSize):
+            stop = start + BlockSize
+            f.write(''.join('%s,%g,#%06x\n' % (label, value, color & 0xffffff)
+                    for label, value, color in zip(labels[start:stop],
+                            values[start:stop].tolist(),
+                            colors[start:stop].tolist())))
+
+
+class ChartLoader(QThread):
+    """Reads and parses a .cht file away from the GUI thread."""
+
+    loaded = pyqtSignal(str, object)
+    failed = pyqtSignal(str)
+
+    def __init__(self, path, parent=None):
+        super(ChartLoader, self).__init__(parent)
+
+        self.path = path
+
+    def run(self):
+        f = QFile(self.path)
+
+        if not f.open(QFile.ReadOnly):
+            self.failed.emit(self.path)
+            return
+
+        data = bytes(f.readAll())
+        f.close()
+
+        if self.isInterruptionRequested():
+            return
+
+        try:
+            chart = readChart(data, self.isInterruptionRequested)
+        except ValueError:
+            self.failed.emit(self.path)
+            return
+
+        if chart is not None:
+            self.loaded.emit(self.path, chart)
+
+
+class ChartModel(QAbstractTableModel):
+    """A table of the label, value and color of each slice of a chart, kept
+    in a list and two arrays rather than an item per cell.
+    """
+
+    def __init__(self, parent=None):
+        super(ChartModel, self).__init__(parent)
+
+        self.labels = []
+        self.values = np.zeros(0)
+        self.colors = np.zeros(0, dtype=np.uint32)
+
+    def setChart(self, labels, values, colors):
+        self.beginResetModel()
+        self.labels = labels
+        self.values = values
+        self.colors = colors
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+
+        return len(self.labels)
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+
+        return 2
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        row = index.row()
+
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            if index.column() == 0:
+                return self.labels[row]
+
+            return float(self.values[row])
+
+        if role == Qt.DecorationRole and index.column() == 0:
+            return QColor.fromRgba(int(self.colors[row]))
+
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid():
+            return False
+
+        row = index.row()
+
+        if role == Qt.EditRole:
+            if index.column() == 0:
+                self.labels[row] = value
+            else:
+                self.values[row] = float(value)
+        elif role == Qt.DecorationRole and index.column() == 0:
+            self.colors[row] = QColor(value).rgba()
+        else:
+            return False
+
+        self.dataChanged.emit(index, index, [role])
+
+        return True
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsEditable
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return ("Label", "Quantity")[section]
+
+        return super(ChartModel, self).headerData(section, orientation, role)
+
+    def insertRows(self, position, rows, parent=QModelIndex()):
+        if parent.isValid() or position < 0 or position > len(self.labels):
+            return False
+
+        self.beginInsertRows(parent, position, position + rows - 1)
+        self.labels[position:position] = [''] * rows
+        self.values = np.insert(self.values, position, np.zeros(rows))
+        self.colors = np.insert(self.colors, position,
+                np.full(rows, QColor(Qt.black).rgba(), dtype=np.uint32))
+        self.endInsertRows()
+
+        return True
+
+    def removeRows(self, position, rows, parent=QModelIndex()):
+        if parent.isValid() or position < 0 or \
+                position + rows > len(self.labels):
+            return False
+
+        self.beginRemoveRows(parent, position, position + rows - 1)
+        del self.labels[position:position + rows]
+        self.values = np.delete(self.values, np.s_[position:position + rows])
+        self.colors = np.delete(self.colors, np.s_[position:position + rows])
+        self.endRemoveRows()
+
+        return True
+
+
 class PieView(QAbstractItemView):
+    # Angles are drawn in 1/16ths of a degree.
+    AngleSteps = 360 * 16
+
     def __init__(self, parent=None):
         super(PieView, self).__init__(parent)
 
@@ -70,20 +285,120 @@ class PieView(QAbstractItemView):
         self.origin = QPoint()
         self.rubberBand = None
 
-    def dataChanged(self, topLeft, bottomRight, roles):
-        super(PieView, self).dataChanged(topLeft, bottomRight, roles)
+        # The value of each row, or 0 if it has no slice. cumulativeValues
+        # holds the total of the values up to and including each row, and
+        # listPositions the number of slices up to and including each row.
+        # A slice starts at an angle in proportion to the values before it,
+        # and its label is at the position in the list of slices before it.
+        self.values = np.zeros(0)
+        self.cumulativeValues = np.zeros(0)
+        self.listPositions = np.zeros(0, dtype=np.intp)
 
-        self.validItems = 0
-        self.totalValue = 0.0
+        # The (row, start angle, span angle, color) of the slices that are
+        # drawn, worked out when first needed.
+        self.slices = None
+
+    def setModel(self, model):
+        if self.model() is not None:
+            self.model().layoutChanged.disconnect(self.readValues)
+
+        super(PieView, self).setModel(model)
+
+        if model is not None:
+            model.layoutChanged.connect(self.readValues)
+
+        self.readValues()
+
+    def reset(self):
+        super(PieView, self).reset()
+
+        self.readValues()
+
+    def readValue(self, row):
+        index = self.model().index(row, 1, self.rootIndex())
+        value = self.model().data(index)
+
+        if value is not None and value > 0.0:
+            return value
 
-        for row in range(self.model().rowCount(self.rootIndex())):
+        return 0.0
 
-            index = self.model().index(row, 1, self.rootIndex())
-            value = self.model().data(index)
+    def readValues(self):
+        model = self.model()
 
-            if value is not None and value > 0.0:
-                self.totalValue += value
-                self.validItems += 1
+        if isinstance(model, ChartModel):
+            # Take all the values at once.
+            self.values = np.where(model.values > 0.0, model.values, 0.0)
+        else:
+            rows = 0
+            if model is not None:
+                rows = model.rowCount(self.rootIndex())
+
+            self.values = np.array([self.readValue(row)
+                    for row in range(rows)], dtype=float)
+
+        self.updateSums(0)
+
+    def updateSums(self, start):
+        # Only the sums from the first changed row onwards change.
+        values = self.values
+        if len(self.cumulativeValues) != len(values):
+            cumulativeValues = np.empty(len(values))
+            cumulativeValues[:start] = self.cumulativeValues[:start]
+            self.cumulativeValues = cumulativeValues
+            listPositions = np.empty(len(values), dtype=np.intp)
+            listPositions[:start] = self.listPositions[:start]
+            self.listPositions = listPositions
+
+        valueBefore = self.cumulativeValues[start-1] if start > 0 else 0.0
+        positionBefore = self.listPositions[start-1] if start > 0 else 0
+        np.cumsum(values[start:], out=self.cumulativeValues[start:])
+        self.cumulativeValues[start:] += valueBefore
+        np.cumsum(values[start:] > 0.0, out=self.listPositions[start:])
+        self.listPositions[start:] += positionBefore
+
+        if len(values):
+            self.totalValue = float(self.cumulativeValues[-1])
+            self.validItems = int(self.listPositions[-1])
+        else:
+            self.totalValue = 0.0
+            self.validItems = 0
+
+        self.slices = None
+
+    def sliceAngles(self, row):
+        # The start and span angles of a row's slice, in degrees.
+        value = self.values[row]
+        startAngle = 360*(self.cumulativeValues[row] - value)/self.totalValue
+
+        return startAngle, 360*value/self.totalValue
+
+    def rowAtValue(self, value):
+        # The row of the slice that the total of the values before it reaches
+        # value in.
+        row = int(np.searchsorted(self.cumulativeValues, value, 'right'))
+        if row == len(self.values):
+            return self.rowAtListPosition(self.validItems - 1)
+
+        return row
+
+    def rowAtListPosition(self, listItem):
+        return int(np.searchsorted(self.listPositions, listItem + 1, 'left'))
+
+    def dataChanged(self, topLeft, bottomRight, roles):
+        super(PieView, self).dataChanged(topLeft, bottomRight, roles)
+
+        if topLeft.parent() == self.rootIndex():
+            start = topLeft.row()
+            end = bottomRight.row()
+
+            if topLeft.column() <= 1 <= bottomRight.column():
+                self.values[start:end + 1] = [self.readValue(row)
+                        for row in range(start, end + 1)]
+                self.updateSums(start)
+            else:
+                # The colors of the slices may have changed.
+                self.slices = None
 
         self.viewport().update()
 
@@ -117,37 +432,16 @@ class PieView(QAbstractItemView):
                 angle = 360 - angle
 
             # Find the relevant slice of the pie.
-            startAngle = 0.0
-
-            for row in range(self.model().rowCount(self.rootIndex())):
-
-                index = self.model().index(row, 1, self.rootIndex())
-                value = self.model().data(index)
-
-                if value > 0.0:
-                    sliceAngle = 360*value/self.totalValue
-
-                    if angle >= startAngle and angle < (startAngle + sliceAngle):
-                        return self.model().index(row, 1, self.rootIndex())
-
-                    startAngle += sliceAngle
+            row = self.rowAtValue(angle/360*self.totalValue)
+            return self.model().index(row, 1, self.rootIndex())
 
         else:
             itemHeight = QFontMetrics(self.viewOptions().font).height()
             listItem = int((wy - self.margin) / itemHeight)
-            validRow = 0
 
-            for row in range(self.model().rowCount(self.rootIndex())):
-
-                index = self.model().index(row, 1, self.rootIndex())
-                if self.model().data(index) > 0.0:
-
-                    if listItem == validRow:
-                        return self.model().index(row, 0, self.rootIndex())
-
-                    # Update the list index that corresponds to the next valid
-                    # row.
-                    validRow += 1
+            if 0 <= listItem < self.validItems:
+                row = self.rowAtListPosition(listItem)
+                return self.model().index(row, 0, self.rootIndex())
 
         return QModelIndex()
 
@@ -166,13 +460,8 @@ class PieView(QAbstractItemView):
         else:
             valueIndex = index
 
-        value = self.model().data(valueIndex)
-        if value is not None and value > 0.0:
-
-            listItem = 0
-            for row in range(index.row()-1, -1, -1):
-                if self.model().data(self.model().index(row, 1, self.rootIndex())) > 0.0:
-                    listItem += 1
+        if self.values[valueIndex.row()] > 0.0:
+            listItem = int(self.listPositions[valueIndex.row()]) - 1
 
             if index.column() == 0:
             
@@ -192,31 +481,19 @@ class PieView(QAbstractItemView):
         if index.column() != 1:
             return QRegion(self.itemRect(index))
 
-        if self.model().data(index) <= 0.0:
+        if self.values[index.row()] <= 0.0:
             return QRegion()
 
-        startAngle = 0.0
-        for row in range(self.model().rowCount(self.rootIndex())):
+        startAngle, angle = self.sliceAngles(index.row())
 
-            sliceIndex = self.model().index(row, 1, self.rootIndex())
-            value = self.model().data(sliceIndex)
+        slicePath = QPainterPath()
+        slicePath.moveTo(self.totalSize/2, self.totalSize/2)
+        slicePath.arcTo(self.margin, self.margin,
+                self.margin+self.pieSize, self.margin+self.pieSize,
+                startAngle, angle)
+        slicePath.closeSubpath()
 
-            if value > 0.0:
-                angle = 360*value/self.totalValue
-
-                if sliceIndex == index:
-                    slicePath = QPainterPath()
-                    slicePath.moveTo(self.totalSize/2, self.totalSize/2)
-                    slicePath.arcTo(self.margin, self.margin,
-                            self.margin+self.pieSize, self.margin+self.pieSize,
-                            startAngle, angle)
-                    slicePath.closeSubpath()
-
-                    return QRegion(slicePath.toFillPolygon().toPolygon())
-
-                startAngle += angle
-
-        return QRegion()
+        return QRegion(slicePath.toFillPolygon().toPolygon())
 
     def horizontalOffset(self):
         return self.horizontalScrollBar().value()
@@ -295,51 +572,64 @@ class PieView(QAbstractItemView):
             painter.translate(pieRect.x() - self.horizontalScrollBar().value(),
                     pieRect.y() - self.verticalScrollBar().value())
             painter.drawEllipse(0, 0, self.pieSize, self.pieSize)
-            startAngle = 0.0
-
-            for row in range(self.model().rowCount(self.rootIndex())):
 
+            for row, startAngle, angle, color in self.sliceGeometry():
                 index = self.model().index(row, 1, self.rootIndex())
-                value = self.model().data(index)
-
-                if value > 0.0:
-                    angle = 360*value/self.totalValue
-
-                    colorIndex = self.model().index(row, 0, self.rootIndex())
-                    color = self.model().data(colorIndex, Qt.DecorationRole)
-
-                    if self.currentIndex() == index:
-                        painter.setBrush(QBrush(color, Qt.Dense4Pattern))
-                    elif selections.isSelected(index):
-                        painter.setBrush(QBrush(color, Qt.Dense3Pattern))
-                    else:
-                        painter.setBrush(QBrush(color))
 
-                    painter.drawPie(0, 0, self.pieSize, self.pieSize,
-                            int(startAngle*16), int(angle*16))
+                if self.currentIndex() == index:
+                    painter.setBrush(QBrush(color, Qt.Dense4Pattern))
+                elif selections.isSelected(index):
+                    painter.setBrush(QBrush(color, Qt.Dense3Pattern))
+                else:
+                    painter.setBrush(QBrush(color))
 
-                    startAngle += angle
+                painter.drawPie(0, 0, self.pieSize, self.pieSize, startAngle,
+                        angle)
 
             painter.restore()
 
-            keyNumber = 0
-
-            for row in range(self.model().rowCount(self.rootIndex())):
-                index = self.model().index(row, 1, self.rootIndex())
-                value = self.model().data(index)
-
-                if value > 0.0:
-                    labelIndex = self.model().index(row, 0, self.rootIndex())
-
-                    option = self.viewOptions()
-                    option.rect = self.visualRect(labelIndex)
-                    if selections.isSelected(labelIndex):
-                        option.state |= QStyle.State_Selected
-                    if self.currentIndex() == labelIndex:
-                        option.state |= QStyle.State_HasFocus
-                    self.itemDelegate().paint(painter, option, labelIndex)
-
-                    keyNumber += 1
+            # Only draw the labels that are in the area being painted.
+            itemHeight = QFontMetrics(self.viewOptions().font).height()
+            top = event.rect().top() + self.verticalScrollBar().value()
+            bottom = event.rect().bottom() + self.verticalScrollBar().value()
+            firstItem = max((top - self.margin) // itemHeight, 0)
+            lastItem = min((bottom - self.margin) // itemHeight,
+                    self.validItems - 1)
+
+            for listItem in range(firstItem, lastItem + 1):
+                row = self.rowAtListPosition(listItem)
+                labelIndex = self.model().index(row, 0, self.rootIndex())
+
+                option = self.viewOptions()
+                option.rect = self.visualRect(labelIndex)
+                if selections.isSelected(labelIndex):
+                    option.state |= QStyle.State_Selected
+                if self.currentIndex() == labelIndex:
+                    option.state |= QStyle.State_HasFocus
+                self.itemDelegate().paint(painter, option, labelIndex)
+
+    def sliceGeometry(self):
+        if self.slices is None:
+            # The angles of the slices in 1/16ths of a degree. Slices that
+            # start within the same pixel along the edge of the pie can't be
+            # told apart, so only the first of them is drawn, up to where the
+            # next one starts.
+            rows = np.flatnonzero(self.values > 0.0)
+            before = self.cumulativeValues[rows] - self.values[rows]
+            startAngles = (before/self.totalValue*self.AngleSteps).astype(int)
+            step = max(self.AngleSteps // int(math.pi*self.pieSize), 1)
+            _, first = np.unique(startAngles // step, return_index=True)
+            startAngles = startAngles[first]
+            spans = np.diff(np.append(startAngles, self.AngleSteps))
+
+            self.slices = []
+            for row, startAngle, angle in zip(rows[first].tolist(),
+                    startAngles.tolist(), spans.tolist()):
+                colorIndex = self.model().index(row, 0, self.rootIndex())
+                color = self.model().data(colorIndex, Qt.DecorationRole)
+                self.slices.append((row, startAngle, angle, color))
+
+        return self.slices
 
     def resizeEvent(self, event):
         self.updateGeometries()
@@ -348,24 +638,17 @@ class PieView(QAbstractItemView):
         return self.model().rowCount(self.model().parent(index))
 
     def rowsInserted(self, parent, start, end):
-        for row in range(start, end + 1):
-            index = self.model().index(row, 1, self.rootIndex())
-            value = self.model().data(index)
-
-            if value is not None and value > 0.0:
-                self.totalValue += value
-                self.validItems += 1
+        if parent == self.rootIndex():
+            values = [self.readValue(row) for row in range(start, end + 1)]
+            self.values = np.insert(self.values, start, values)
+            self.updateSums(start)
 
         super(PieView, self).rowsInserted(parent, start, end)
 
     def rowsAboutToBeRemoved(self, parent, start, end):
-        for row in range(start, end + 1):
-            index = self.model().index(row, 1, self.rootIndex())
-            value = self.model().data(index)
-
-            if value is not None and value > 0.0:
-                self.totalValue -= value
-                self.validItems -= 1
+        if parent == self.rootIndex():
+            self.values = np.delete(self.values, np.s_[start:end + 1])
+            self.updateSums(start)
 
         super(PieView, self).rowsAboutToBeRemoved(parent, start, end)
 
@@ -399,16 +682,23 @@ class PieView(QAbstractItemView):
         contentsRect = rect.translated(self.horizontalScrollBar().value(),
                 self.verticalScrollBar().value()).normalized()
 
-        rows = self.model().rowCount(self.rootIndex())
-        columns = self.model().columnCount(self.rootIndex())
+        # The first and last rows of the slices and of the labels that the
+        # rectangle touches.
         indexes = []
 
-        for row in range(rows):
-            for column in range(columns):
-                index = self.model().index(row, column, self.rootIndex())
-                region = self.itemRegion(index)
-                if region.intersects(QRegion(contentsRect)):
-                    indexes.append(index)
+        sliceRows = self.slicesInRect(contentsRect)
+        if sliceRows is not None:
+            indexes.append(self.model().index(sliceRows[0], 1,
+                    self.rootIndex()))
+            indexes.append(self.model().index(sliceRows[1], 1,
+                    self.rootIndex()))
+
+        labelRows = self.labelsInRect(contentsRect)
+        if labelRows is not None:
+            indexes.append(self.model().index(labelRows[0], 0,
+                    self.rootIndex()))
+            indexes.append(self.model().index(labelRows[1], 0,
+                    self.rootIndex()))
 
         if len(indexes) > 0:
             firstRow = indexes[0].row()
@@ -433,6 +723,78 @@ class PieView(QAbstractItemView):
 
         self.update()
 
+    def slicesInRect(self, rect):
+        # Returns the first and last rows of the slices that a rectangle, in
+        # contents widget coordinates, touches, or None.
+        if self.validItems == 0:
+            return None
+
+        center = self.totalSize/2
+        radius = self.pieSize/2
+        left = rect.left() - center
+        right = rect.right() - center
+        top = center - rect.top()
+        bottom = center - rect.bottom()
+
+        # The point of the rectangle that is closest to the center.
+        nearestX = min(max(0, left), right)
+        nearestY = min(max(0, bottom), top)
+        if nearestX**2 + nearestY**2 > radius**2:
+            return None
+
+        if nearestX == 0 and nearestY == 0:
+            return (self.rowAtListPosition(0),
+                    self.rowAtListPosition(self.validItems - 1))
+
+        # The part of the pie in the rectangle spans less than half a turn,
+        # from the angles of its corners, and of the points where its edges
+        # cross the edge of the pie.
+        points = [(x, y) for x in (left, right) for y in (bottom, top)
+                if x**2 + y**2 <= radius**2]
+        for x in (left, right):
+            if abs(x) <= radius:
+                y = (radius**2 - x**2)**0.5
+                points.extend((x, edgeY) for edgeY in (y, -y)
+                        if bottom <= edgeY <= top)
+        for y in (bottom, top):
+            if abs(y) <= radius:
+                x = (radius**2 - y**2)**0.5
+                points.extend((edgeX, y) for edgeX in (x, -x)
+                        if left <= edgeX <= right)
+
+        angles = [math.degrees(math.atan2(y, x)) for x, y in points]
+        firstAngle = min(angles, key=lambda angle: (angle - angles[0] +
+                180) % 360)
+        lastAngle = max(angles, key=lambda angle: (angle - angles[0] +
+                180) % 360)
+        firstRow = self.rowAtValue((firstAngle % 360)/360*self.totalValue)
+        lastRow = self.rowAtValue((lastAngle % 360)/360*self.totalValue)
+
+        if firstRow > lastRow:
+            # The rectangle is across angle 0.
+            return (self.rowAtListPosition(0),
+                    self.rowAtListPosition(self.validItems - 1))
+
+        return firstRow, lastRow
+
+    def labelsInRect(self, rect):
+        # Returns the first and last rows of the labels that a rectangle, in
+        # contents widget coordinates, touches, or None.
+        if rect.right() < self.totalSize or \
+                rect.left() >= 2*self.totalSize - self.margin:
+            return None
+
+        itemHeight = QFontMetrics(self.viewOptions().font).height()
+        firstItem = max(-((self.margin + itemHeight - 1 - rect.top()) //
+                itemHeight), 0)
+        lastItem = min((rect.bottom() - self.margin) // itemHeight,
+                self.validItems - 1)
+        if firstItem > lastItem:
+            return None
+
+        return (self.rowAtListPosition(firstItem),
+                self.rowAtListPosition(lastItem))
+
     def updateGeometries(self):
         self.horizontalScrollBar().setPageStep(self.viewport().width())
         self.horizontalScrollBar().setRange(0, max(0, 2*self.totalSize - self.viewport().width()))
@@ -454,11 +816,29 @@ class PieView(QAbstractItemView):
     def visualRegionForSelection(self, selection):
         region = QRegion()
 
+        # The labels of the slices of a range of rows are next to each other,
+        # and all slices are in the viewport.
         for span in selection:
-            for row in range(span.top(), span.bottom() + 1):
-                for col in range(span.left(), span.right() + 1):
-                    index = self.model().index(row, col, self.rootIndex())
-                    region += self.visualRect(index)
+            if span.left() <= 0 <= span.right():
+                first = self.listPositions[span.top()] - 1
+                if self.values[span.top()] <= 0.0:
+                    first += 1
+                last = self.listPositions[span.bottom()] - 1
+
+                if first <= last:
+                    topRect = self.visualRect(self.model().index(
+                            self.rowAtListPosition(first), 0,
+                            self.rootIndex()))
+                    bottomRect = self.visualRect(self.model().index(
+                            self.rowAtListPosition(last), 0,
+                            self.rootIndex()))
+                    region += topRect.united(bottomRect)
+
+            if span.left() <= 1 <= span.right():
+                if self.listPositions[span.bottom()] > \
+                        self.listPositions[span.top()] or \
+                        self.values[span.top()] > 0.0:
+                    region += self.viewport().rect()
 
         return region
 
@@ -491,9 +871,8 @@ class MainWindow(QMainWindow):
         self.resize(870, 550)
 
     def setupModel(self):
-        self.model = QStandardItemModel(8, 2, self)
-        self.model.setHeaderData(0, Qt.Horizontal, "Label")
-        self.model.setHeaderData(1, Qt.Horizontal, "Quantity")
+        self.model = ChartModel(self)
+        self.loader = None
 
     def setupViews(self):
         splitter = QSplitter()
@@ -515,67 +894,57 @@ class MainWindow(QMainWindow):
 
         self.setCentralWidget(splitter)
 
+    def closeEvent(self, event):
+        # A thread must not be destroyed along with the window while it is
+        # still running. This includes loaders that openFile() replaced.
+        for loader in self.findChildren(ChartLoader):
+            loader.requestInterruption()
+            loader.wait()
+
+        super(MainWindow, self).closeEvent(event)
+
     def openFile(self, path=None):
         if not path:
             path, _ = QFileDialog.getOpenFileName(self, "Choose a data file",
                     '', '*.cht')
 
         if path:
-            f = QFile(path)
-
-            if f.open(QFile.ReadOnly | QFile.Text):
-                stream = QTextStream(f)
+            # Any file that is still being read is no longer wanted.
+            if self.loader is not None:
+                self.loader.loaded.disconnect()
+                self.loader.failed.disconnect()
+                self.loader.requestInterruption()
 
-                self.model.removeRows(0, self.model.rowCount(QModelIndex()),
-                        QModelIndex())
+            self.loader = ChartLoader(path, self)
+            self.loader.loaded.connect(self.fileLoaded)
+            self.loader.failed.connect(self.fileFailed)
+            self.loader.finished.connect(self.loader.deleteLater)
+            self.loader.start()
 
-                row = 0
-                line = stream.readLine()
-                while line:
-                    self.model.insertRows(row, 1, QModelIndex())
+            self.statusBar().showMessage("Loading %s..." % path)
 
-                    pieces = line.split(',')
-                    self.model.setData(self.model.index(row, 0, QModelIndex()),
-                                pieces[0])
-                    self.model.setData(self.model.index(row, 1, QModelIndex()),
-                                float(pieces[1]))
-                    self.model.setData(self.model.index(row, 0, QModelIndex()),
-                                QColor(pieces[2]), Qt.DecorationRole)
+    def fileLoaded(self, path, chart):
+        self.loader = None
+        self.model.setChart(*chart)
+        self.statusBar().showMessage("Loaded %s" % path, 2000)
 
-                    row += 1
-                    line = stream.readLine()
-
-                f.close()
-                self.statusBar().showMessage("Loaded %s" % path, 2000)
+    def fileFailed(self, path):
+        self.loader = None
+        self.statusBar().showMessage("Cannot read %s" % path, 2000)
 
     def saveFile(self):
         fileName, _ = QFileDialog.getSaveFileName(self, "Save file as", '',
                 '*.cht')
 
         if fileName:
-            f = QFile(fileName)
-
-            if f.open(QFile.WriteOnly | QFile.Text):
-                for row in range(self.model.rowCount(QModelIndex())):
-                    pieces = []
-
-                    pieces.append(
-                            self.model.data(
-                                    self.model.index(row, 0, QModelIndex()),
-                                    Qt.DisplayRole))
-                    pieces.append(
-                            '%g' % self.model.data(
-                                    self.model.index(row, 1, QModelIndex()),
-                                    Qt.DisplayRole))
-                    pieces.append(
-                            self.model.data(
-                                    self.model.index(row, 0, QModelIndex()),
-                                    Qt.DecorationRole).name())
-
-                    f.write(b','.join([p.encode('utf-8') for p in pieces]))
-                    f.write(b'\n')
-
-            f.close()
+            try:
+                writeChart(fileName, self.model.labels, self.model.values,
+                        self.model.colors)
+            except OSError:
+                self.statusBar().showMessage("Cannot write %s" % fileName,
+                        2000)
+                return
+
             self.statusBar().showMessage("Saved %s" % fileName, 2000)
 
 
@@ -42,100 +42,42 @@
 #############################################################################
 
 
+import sys
+import os.path
+
 from PyQt5.QtCore import (QAbstractItemModel, QFile, QIODevice,
         QItemSelectionModel, QModelIndex, Qt)
 from PyQt5.QtWidgets import QApplication, QMainWindow
 
+# Access the shared module.
+sys.path.insert(1,
+        os.path.join(
+                os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                'shared'))
+from outline import OutlineFile
+from treestorage import TreeItem
+
 import editabletreemodel_rc
 from ui_mainwindow import Ui_MainWindow
 
 
-class TreeItem(object):
-    def __init__(self, data, parent=None):
-        self.parentItem = parent
-        self.itemData = data
-        self.childItems = []
-
-    def child(self, row):
-        return self.childItems[row]
-
-    def childCount(self):
-        return len(self.childItems)
-
-    def childNumber(self):
-        if self.parentItem != None:
-            return self.parentItem.childItems.index(self)
-        return 0
-
-    def columnCount(self):
-        return len(self.itemData)
-
-    def data(self, column):
-        return self.itemData[column]
-
-    def insertChildren(self, position, count, columns):
-        if position < 0 or position > len(self.childItems):
-            return False
-
-        for row in range(count):
-            data = [None for v in range(columns)]
-            item = TreeItem(data, self)
-            self.childItems.insert(position, item)
-
-        return True
-
-    def insertColumns(self, position, columns):
-        if position < 0 or position > len(self.itemData):
-            return False
-
-        for column in range(columns):
-            self.itemData.insert(position, None)
-
-        for child in self.childItems:
-            child.insertColumns(position, columns)
-
-        return True
-
-    def parent(self):
-        return self.parentItem
-
-    def removeChildren(self, position, count):
-        if position < 0 or position + count > len(self.childItems):
-            return False
-
-        for row in range(count):
-            self.childItems.pop(position)
-
-        return True
-
-    def removeColumns(self, position, columns):
-        if position < 0 or position + columns > len(self.itemData):
-            return False
-
-        for column in range(columns):
-            self.itemData.pop(position)
-
-        for child in self.childItems:
-            child.removeColumns(position, columns)
-
-        return True
-
-    def setData(self, column, value):
-        if column < 0 or column >= len(self.itemData):
-            return False
-
-        self.itemData[column] = value
-
-        return True
-
-
 class TreeModel(QAbstractItemModel):
-    def __init__(self, headers, data, parent=None):
+    def __init__(self, headers, outline, parent=None):
         super(TreeModel, self).__init__(parent)
 
         rootData = [header for header in headers]
         self.rootItem = TreeItem(rootData)
-        self.setupModelData(data.split("\n"), self.rootItem)
+        self.outline = outline
+        # The items whose children have yet to be read, and the offsets of
+        # those children in the outline.
+        self.unfetched = {}
+        # The column that each column of the outline is shown in, or None
+        # if it has been removed.
+        self.outlineColumns = list(range(len(rootData)))
+        self.setupModelData(outline, self.rootItem)
+
+    def canFetchMore(self, parent):
+        return self.getItem(parent) in self.unfetched
 
     def columnCount(self, parent=QModelIndex()):
         return self.rootItem.columnCount()
@@ -150,6 +92,33 @@ class TreeModel(QAbstractItemModel):
         item = self.getItem(index)
         return item.data(index.column())
 
+    def fetchMore(self, parent):
+        parentItem = self.getItem(parent)
+        offset = self.unfetched.pop(parentItem, None)
+        if offset is None:
+            return
+
+        rows = self.outline.readChildren(offset)
+        if not rows:
+            return
+
+        columnCount = self.rootItem.columnCount()
+        placedRows = []
+        for columns, _ in rows:
+            data = [None] * columnCount
+            for column, value in zip(self.outlineColumns, columns):
+                if column is not None:
+                    data[column] = value
+            placedRows.append(data)
+
+        first = parentItem.childCount()
+        self.beginInsertRows(parent, first, first + len(rows) - 1)
+        children = parentItem.appendChildren(placedRows)
+        for child, (_, childOffset) in zip(children, rows):
+            if childOffset is not None:
+                self.unfetched[child] = childOffset
+        self.endInsertRows()
+
     def flags(self, index):
         if not index.isValid():
             return 0
@@ -164,6 +133,15 @@ class TreeModel(QAbstractItemModel):
 
         return self.rootItem
 
+    def hasChildren(self, parent=QModelIndex()):
+        if parent.isValid() and parent.column() != 0:
+            return False
+
+        parentItem = self.getItem(parent)
+
+        # Don't read an item's children just to find out that it has some.
+        return parentItem.childCount() > 0 or parentItem in self.unfetched
+
     def headerData(self, section, orientation, role=Qt.DisplayRole):
         if orientation == Qt.Horizontal and role == Qt.DisplayRole:
             return self.rootItem.data(section)
@@ -186,9 +164,18 @@ class TreeModel(QAbstractItemModel):
         success = self.rootItem.insertColumns(position, columns)
         self.endInsertColumns()
 
+        if success:
+            for i, column in enumerate(self.outlineColumns):
+                if column is not None and column >= position:
+                    self.outlineColumns[i] = column + columns
+
         return success
 
     def insertRows(self, position, rows, parent=QModelIndex()):
+        # Read the children from the outline first, so that they don't end
+        # up after the new rows.
+        self.fetchMore(parent)
+
         parentItem = self.getItem(parent)
         self.beginInsertRows(parent, position, position + rows - 1)
         success = parentItem.insertChildren(position, rows,
@@ -214,6 +201,15 @@ class TreeModel(QAbstractItemModel):
         success = self.rootItem.removeColumns(position, columns)
         self.endRemoveColumns()
 
+        if success:
+            for i, column in enumerate(self.outlineColumns):
+                if column is None or column < position:
+                    continue
+                if column < position + columns:
+                    self.outlineColumns[i] = None
+                else:
+                    self.outlineColumns[i] = column - columns
+
         if self.rootItem.columnCount() == 0:
             self.removeRows(0, self.rowCount())
 
@@ -222,6 +218,14 @@ class TreeModel(QAbstractItemModel):
     def removeRows(self, position, rows, parent=QModelIndex()):
         parentItem = self.getItem(parent)
 
+        # Forget about the unread children of the removed items.
+        items = [parentItem.child(row) for row in range(position, position + rows)]
+        while items:
+            item = items.pop()
+            if item is not None:
+                self.unfetched.pop(item, None)
+                items.extend(item.childItems or ())
+
         self.beginRemoveRows(parent, position, position + rows - 1)
         success = parentItem.removeChildren(position, rows)
         self.endRemoveRows()
@@ -255,46 +259,11 @@ class TreeModel(QAbstractItemModel):
 
         return result
 
-    def setupModelData(self, lines, parent):
-        parents = [parent]
-        indentations = [0]
-
-        number = 0
-
-        while number < len(lines):
-            position = 0
-            while position < len(lines[number]):
-                if lines[number][position] != " ":
-                    break
-                position += 1
-
-            lineData = lines[number][position:].trimmed()
-
-            if lineData:
-                # Read the column data from the rest of the line.
-                columnData = [s for s in lineData.split('\t') if s]
-
-                if position > indentations[-1]:
-                    # The last child of the current parent is now the new
-                    # parent unless the current parent has no children.
-
-                    if parents[-1].childCount() > 0:
-                        parents.append(parents[-1].child(parents[-1].childCount() - 1))
-                        indentations.append(position)
-
-                else:
-                    while position < indentations[-1] and len(parents) > 0:
-                        parents.pop()
-                        indentations.pop()
-
-                # Append a new item to the current parent's list of children.
-                parent = parents[-1]
-                parent.insertChildren(parent.childCount(), 1,
-                        self.rootItem.columnCount())
-                for column in range(len(columnData)):
-                    parent.child(parent.childCount() -1).setData(column, columnData[column])
-
-            number += 1
+    def setupModelData(self, outline, parent):
+        # Only the top level items are read here. The children of an item
+        # are read by fetchMore() when the view first shows them.
+        self.unfetched[parent] = 0
+        self.fetchMore(QModelIndex())
 
 
 class MainWindow(QMainWindow, Ui_MainWindow):
@@ -305,10 +274,15 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
         headers = ("Title", "Description")
 
-        file = QFile(':/default.txt')
-        file.open(QIODevice.ReadOnly)
-        model = TreeModel(headers, file.readAll())
-        file.close()
+        if len(sys.argv) > 1:
+            outline = OutlineFile.open(sys.argv[1])
+        else:
+            file = QFile(':/default.txt')
+            file.open(QIODevice.ReadOnly)
+            outline = OutlineFile(bytes(file.readAll()))
+            file.close()
+
+        model = TreeModel(headers, outline)
 
         self.view.setModel(model)
         for column in range(model.columnCount()):
@@ -43,20 +43,117 @@
 #############################################################################
 
 
-from PyQt5.QtCore import (pyqtSignal, QAbstractListModel, QDir, QLibraryInfo,
-        QModelIndex, Qt)
-from PyQt5.QtWidgets import (QApplication, QGridLayout, QLabel, QLineEdit,
-        QListView, QSizePolicy, QTextBrowser, QWidget)
+import os
+import queue
+import time
+
+from PyQt5.QtCore import (pyqtSignal, QAbstractListModel, QCoreApplication,
+        QLibraryInfo, QModelIndex, Qt, QThread)
+from PyQt5.QtWidgets import (QApplication, QCheckBox, QGridLayout, QLabel,
+        QLineEdit, QListView, QSizePolicy, QTextBrowser, QWidget)
+
+
+class DirectoryLister(QThread):
+    """Lists a directory with os.scandir() and hands the matching names to
+    the model in batches through a bounded queue. When the queue is full,
+    the thread waits until the model takes some, so a huge directory is
+    never held in memory all at once.
+
+    Sorting all the names, as QDir.entryList() did, would mean reading the
+    whole directory before showing any of them. So only each batch is
+    sorted by name, ignoring case, and the batches come in the order that
+    the file system lists them. A directory with no more than BatchSize
+    matching names is still listed in sorted order."""
+
+    entriesAvailable = pyqtSignal()
+
+    BatchSize = 100
+    MaxQueuedBatches = 100
+
+    def __init__(self, path, filterText='', prefixOnly=False, parent=None):
+        super(DirectoryLister, self).__init__(parent)
+
+        self.path = path
+        self.filterText = filterText.casefold()
+        self.prefixOnly = prefixOnly
+        self.batches = queue.Queue(self.MaxQueuedBatches)
+        self.aborted = False
+
+    def abort(self):
+        self.aborted = True
+
+    def matches(self, name):
+        if not self.filterText:
+            return True
+
+        if self.prefixOnly:
+            return name.casefold().startswith(self.filterText)
+
+        return self.filterText in name.casefold()
+
+    def run(self):
+        batch = []
+        try:
+            with os.scandir(self.path) as entries:
+                for entry in entries:
+                    if self.aborted:
+                        return
+
+                    if self.matches(entry.name):
+                        batch.append(entry.name)
+                        if len(batch) == self.BatchSize:
+                            self.put(batch)
+                            batch = []
+        except OSError:
+            pass
+
+        if batch:
+            self.put(batch)
+
+        # tells the model that there are no more entries
+        self.put(None)
+
+    def put(self, batch):
+        if batch is not None:
+            batch.sort(key=str.casefold)
+
+        while not self.aborted:
+            try:
+                self.batches.put(batch, timeout=0.01)
+            except queue.Full:
+                continue
+
+            self.entriesAvailable.emit()
+            return
 
 
 class FileListModel(QAbstractListModel):
     numberPopulated = pyqtSignal(int)
 
+    # the number of rows added by each fetchMore() grows while the view is
+    # scrolled quickly and shrinks again when scrolling slows down
+    MinBatchSize = 100
+    MaxBatchSize = 10000
+    FastScrolling = 0.1
+    SlowScrolling = 0.5
+
     def __init__(self, parent=None):
         super(FileListModel, self).__init__(parent)
 
         self.fileCount = 0    
         self.fileList = []
+        self.path = ''
+        self.filterText = ''
+        self.prefixOnly = False
+        self.lister = None
+        self.pending = []
+        self.listing = False
+        self.waiting = False
+        self.batchSize = self.MinBatchSize
+        self.lastFetch = 0.0
+
+        # The lister thread must be stopped before the application exits.
+        QCoreApplication.instance().aboutToQuit.connect(self.stopListing)
 
     def rowCount(self, parent=QModelIndex()):
         return self.fileCount
@@ -81,29 +178,88 @@ class FileListModel(QAbstractListModel):
         return None
 
     def canFetchMore(self, index):
-        return self.fileCount < len(self.fileList)
-
-    def fetchMore(self, index):
-        remainder = len(self.fileList) - self.fileCount
-        itemsToFetch = min(100, remainder)
+        return bool(self.pending) or self.listing
+
+    def fetchMore(self, index=QModelIndex()):
+        now = time.monotonic()
+        if now - self.lastFetch < self.FastScrolling:
+            self.batchSize = min(self.batchSize * 2, self.MaxBatchSize)
+        elif now - self.lastFetch > self.SlowScrolling:
+            self.batchSize = self.MinBatchSize
+        self.lastFetch = now
+
+        names = self.takePending(self.batchSize)
+        if not names:
+            # insert the next entries as soon as the lister finds them
+            self.waiting = self.listing
+            return
 
         self.beginInsertRows(QModelIndex(), self.fileCount,
-                self.fileCount + itemsToFetch)
+                self.fileCount + len(names) - 1)
 
-        self.fileCount += itemsToFetch
+        self.fileList.extend(names)
+        self.fileCount += len(names)
 
         self.endInsertRows()
 
-        self.numberPopulated.emit(itemsToFetch)
+        self.numberPopulated.emit(len(names))
+
+    def takePending(self, count):
+        while len(self.pending) < count and self.listing:
+            try:
+                batch = self.lister.batches.get_nowait()
+            except queue.Empty:
+                break
+
+            if batch is None:
+                self.listing = False
+            else:
+                self.pending.extend(batch)
+
+        names = self.pending[:count]
+        del self.pending[:count]
+        return names
+
+    def entriesAvailable(self):
+        if self.waiting:
+            self.waiting = False
+            self.fetchMore()
 
     def setDirPath(self, path):
-        dir = QDir(path)
+        self.path = path
+        self.restartListing()
+
+    def setFilter(self, text, prefixOnly=False):
+        self.filterText = text
+        self.prefixOnly = prefixOnly
+        self.restartListing()
+
+    def stopListing(self):
+        if self.lister is not None:
+            self.lister.entriesAvailable.disconnect(self.entriesAvailable)
+            self.lister.abort()
+            self.lister.wait()
+            self.lister = None
+
+        self.listing = False
+
+    def restartListing(self):
+        self.stopListing()
 
         self.beginResetModel()
-        self.fileList = dir.entryList()
+        self.fileList = []
         self.fileCount = 0
+        self.pending = []
         self.endResetModel()
 
+        self.lister = DirectoryLister(self.path, self.filterText,
+                self.prefixOnly)
+        self.lister.entriesAvailable.connect(self.entriesAvailable)
+        self.listing = True
+        self.waiting = True
+        self.batchSize = self.MinBatchSize
+        self.lister.start()
+
 
 class Window(QWidget):
     def __init__(self, parent=None):
@@ -116,7 +272,18 @@ class Window(QWidget):
         lineEdit = QLineEdit()
         label.setBuddy(lineEdit)
 
+        filterLabel = QLabel("Filter")
+        self.filterEdit = QLineEdit()
+        filterLabel.setBuddy(self.filterEdit)
+        self.prefixCheckBox = QCheckBox("Match start of name only")
+
         view = QListView()
+        # each time rows are added, the view lays out all rows again; with
+        # uniform item sizes and batched layout it does so without asking
+        # for every row's size, a thousand rows per event loop iteration
+        view.setUniformItemSizes(True)
+        view.setLayoutMode(QListView.Batched)
+        view.setBatchSize(1000)
         view.setModel(model)
 
         self.logViewer = QTextBrowser()
@@ -126,15 +293,27 @@ class Window(QWidget):
         lineEdit.textChanged.connect(self.logViewer.clear)
         model.numberPopulated.connect(self.updateLog)
 
+        self.model = model
+        self.filterEdit.textChanged.connect(self.filterChanged)
+        self.filterEdit.textChanged.connect(self.logViewer.clear)
+        self.prefixCheckBox.toggled.connect(self.filterChanged)
+
         layout = QGridLayout()
         layout.addWidget(label, 0, 0)
-        layout.addWidget(lineEdit, 0, 1)
-        layout.addWidget(view, 1, 0, 1, 2)
-        layout.addWidget(self.logViewer, 2, 0, 1, 2)
+        layout.addWidget(lineEdit, 0, 1, 1, 2)
+        layout.addWidget(filterLabel, 1, 0)
+        layout.addWidget(self.filterEdit, 1, 1)
+        layout.addWidget(self.prefixCheckBox, 1, 2)
+        layout.addWidget(view, 2, 0, 1, 3)
+        layout.addWidget(self.logViewer, 3, 0, 1, 3)
 
         self.setLayout(layout)
         self.setWindowTitle("Fetch More Example")
 
+    def filterChanged(self):
+        self.model.setFilter(self.filterEdit.text(),
+                self.prefixCheckBox.isChecked())
+
     def updateLog(self, number):
         self.logViewer.append("%d items added." % number)
 
@@ -42,14 +42,15 @@
 #############################################################################
 
 
-from PyQt5.QtCore import (QAbstractTableModel, QDir, QModelIndex, QRect,
-        QRectF, QSize, Qt)
-from PyQt5.QtGui import QBrush, qGray, QImage, QPainter
+import numpy as np
+
+from PyQt5.QtCore import (QAbstractTableModel, QDir, QModelIndex, QRectF,
+        QSize, Qt)
+from PyQt5.QtGui import QColor, QImage, QPainter, QPixmap
 from PyQt5.QtPrintSupport import QPrintDialog, QPrinter
 from PyQt5.QtWidgets import (QAbstractItemDelegate, QApplication, QDialog,
         QFileDialog, QHBoxLayout, QLabel, QMainWindow, QMessageBox, QMenu,
-        QProgressDialog, QSpinBox, QStyle, QStyleOptionViewItem, QTableView,
-        QVBoxLayout, QWidget)
+        QSpinBox, QStyle, QTableView, QVBoxLayout, QWidget)
 
 import pixelator_rc
 
@@ -57,37 +58,92 @@ import pixelator_rc
 ItemSize = 256
 
 
+def imageArray(image):
+    """Return a writable (height, width) uint8 view of an 8-bit image."""
+
+    ptr = image.bits()
+    ptr.setsize(image.sizeInBytes())
+    pixels = np.frombuffer(ptr, dtype=np.uint8)
+    pixels = pixels.reshape(image.height(), image.bytesPerLine())
+    return pixels[:, :image.width()]
+
+
+def dotAtlas(width, height, color, background=Qt.transparent):
+    """Return an image of the dots for all 256 brightnesses side by side,
+    each in a width x height cell, as PixelDelegate draws them.
+    """
+
+    atlas = QImage(256 * width, height, QImage.Format_ARGB32_Premultiplied)
+    atlas.fill(background)
+
+    painter = QPainter(atlas)
+    painter.setRenderHint(QPainter.Antialiasing)
+    painter.setPen(Qt.NoPen)
+    painter.setBrush(color)
+
+    size = min(width, height)
+    for brightness in range(256):
+        radius = (size/2.0) - (brightness/255.0 * size/2.0)
+        if radius == 0.0:
+            continue
+
+        painter.drawEllipse(QRectF(brightness*width + width/2.0 - radius,
+                                   height/2.0 - radius, 2*radius, 2*radius))
+
+    painter.end()
+
+    return atlas
+
+
+def pixelatedImage(gray, cellSize):
+    """Return a grayscale image of the dots for a whole (height, width) array
+    of brightnesses, each in a cellSize x cellSize cell, made in one go.
+    """
+
+    # The dots as a (brightness, y, x) array of grey levels.
+    atlas = dotAtlas(cellSize, cellSize, Qt.black, Qt.white)
+    atlas = atlas.convertToFormat(QImage.Format_Grayscale8)
+    dots = imageArray(atlas).reshape(cellSize, 256, cellSize)
+    dots = dots.transpose(1, 0, 2)
+
+    rows, columns = gray.shape
+    pixels = dots[gray].transpose(0, 2, 1, 3).reshape(rows * cellSize,
+            columns * cellSize)
+
+    image = QImage(columns * cellSize, rows * cellSize,
+            QImage.Format_Grayscale8)
+    imageArray(image)[:] = pixels
+
+    return image
+
+
 class PixelDelegate(QAbstractItemDelegate):
     def __init__(self, parent=None):
         super(PixelDelegate, self).__init__(parent)
 
         self.pixelSize = 12
 
+        # The dot atlases, by cell size and colour.
+        self.atlases = {}
+
     def paint(self, painter, option, index):
         if option.state & QStyle.State_Selected:
             painter.fillRect(option.rect, option.palette.highlight())
-
-        size = min(option.rect.width(), option.rect.height())
-        brightness = index.model().data(index, Qt.DisplayRole)
-        radius = (size/2.0) - (brightness/255.0 * size/2.0)
-        if radius == 0.0:
-            return
-
-        painter.save()
-        painter.setRenderHint(QPainter.Antialiasing)
-        painter.setPen(Qt.NoPen)
-
-        if option.state & QStyle.State_Selected:
-            painter.setBrush(option.palette.highlightedText())
+            color = option.palette.highlightedText().color()
         else:
-            painter.setBrush(QBrush(Qt.black))
+            color = QColor(Qt.black)
 
-        painter.drawEllipse(QRectF(
-                            option.rect.x() + option.rect.width()/2 - radius,
-                            option.rect.y() + option.rect.height()/2 - radius,
-                            2*radius, 2*radius))
+        width = option.rect.width()
+        height = option.rect.height()
+        key = (width, height, color.rgba())
+        atlas = self.atlases.get(key)
+        if atlas is None:
+            atlas = QPixmap.fromImage(dotAtlas(width, height, color))
+            self.atlases[key] = atlas
 
-        painter.restore()
+        brightness = index.model().data(index, Qt.DisplayRole)
+        painter.drawPixmap(option.rect.x(), option.rect.y(), atlas,
+                brightness*width, 0, width, height)
 
     def sizeHint(self, option, index):
         return QSize(self.pixelSize, self.pixelSize)
@@ -101,12 +157,37 @@ class ImageModel(QAbstractTableModel):
         super(ImageModel, self).__init__(parent)
 
         self.modelImage = QImage()
+        self.grayImage = QImage()
+        self.gray = np.zeros((0, 0), dtype=np.uint8)
 
     def setImage(self, image):
         self.beginResetModel()
         self.modelImage = QImage(image)
+
+        # Keep the qGray() of every pixel in an 8-bit image, and a NumPy view
+        # of it.
+        argb = self.modelImage.convertToFormat(QImage.Format_ARGB32)
+        ptr = argb.constBits()
+        ptr.setsize(argb.sizeInBytes())
+        pixels = np.frombuffer(ptr, dtype=np.uint32).reshape(argb.height(),
+                argb.bytesPerLine() // 4)[:, :argb.width()]
+        red = (pixels >> 16) & 0xff
+        green = (pixels >> 8) & 0xff
+        blue = pixels & 0xff
+
+        self.grayImage = QImage(argb.width(), argb.height(),
+                QImage.Format_Grayscale8)
+        self.gray = imageArray(self.grayImage)
+        self.gray[:] = (red*11 + green*16 + blue*5) // 32
         self.endResetModel()
 
+    def grayscale(self):
+        """Return the brightness of every pixel as a (height, width) array
+        that shares the memory of grayImage.
+        """
+
+        return self.gray
+
     def rowCount(self, parent):
         return self.modelImage.height()
 
@@ -117,7 +198,7 @@ class ImageModel(QAbstractTableModel):
         if not index.isValid() or role != Qt.DisplayRole:
             return None
 
-        return qGray(self.modelImage.pixel(index.column(), index.row()))
+        return int(self.gray[index.row(), index.column()])
 
     def headerData(self, section, orientation, role):
         if role == Qt.SizeHintRole:
@@ -160,6 +241,9 @@ class MainWindow(QMainWindow):
         self.printAction.setEnabled(False)
         self.printAction.setShortcut("Ctrl+P")
 
+        self.exportAction = fileMenu.addAction("&Export...")
+        self.exportAction.setEnabled(False)
+
         quitAction = fileMenu.addAction("E&xit")
         quitAction.setShortcut("Ctrl+Q")
 
@@ -172,6 +256,7 @@ class MainWindow(QMainWindow):
 
         openAction.triggered.connect(self.chooseImage)
         self.printAction.triggered.connect(self.printImage)
+        self.exportAction.triggered.connect(self.exportImage)
         quitAction.triggered.connect(QApplication.instance().quit)
         aboutAction.triggered.connect(self.showAboutBox)
         pixelSizeSpinBox.valueChanged.connect(delegate.setPixelSize)
@@ -210,6 +295,7 @@ class MainWindow(QMainWindow):
                 self.setWindowTitle("%s - Pixelator" % self.currentPath)
 
             self.printAction.setEnabled(True)
+            self.exportAction.setEnabled(True)
             self.updateView()
 
     def printImage(self):
@@ -237,8 +323,6 @@ class MainWindow(QMainWindow):
         sourceWidth = (columns+1) * ItemSize
         sourceHeight = (rows+1) * ItemSize
 
-        painter.save()
-
         xscale = printer.pageRect().width() / float(sourceWidth)
         yscale = printer.pageRect().height() / float(sourceHeight)
         scale = min(xscale, yscale)
@@ -248,37 +332,25 @@ class MainWindow(QMainWindow):
         painter.scale(scale, scale)
         painter.translate(-sourceWidth/2, -sourceHeight/2)
 
-        option = QStyleOptionViewItem()
-        parent = QModelIndex()
-
-        progress = QProgressDialog("Printing...", "Cancel", 0, rows, self)
-        progress.setWindowModality(Qt.ApplicationModal)
-        y = ItemSize / 2.0
-
-        for row in range(rows):
-            progress.setValue(row)
-            QApplication.processEvents()
-            if progress.wasCanceled():
-                break
-
-            x = ItemSize / 2.0
+        # Make the dots at the printer's resolution, all at once, rather than
+        # asking the delegate to draw each of them.
+        cellSize = max(int(round(ItemSize * scale)), 1)
+        image = pixelatedImage(self.model.grayscale(), cellSize)
+        painter.drawImage(QRectF(ItemSize / 2.0, ItemSize / 2.0,
+                columns * ItemSize, rows * ItemSize), image)
 
-            for column in range(columns):
-                option.rect = QRect(x, y, ItemSize, ItemSize)
-                self.view.itemDelegate().paint(painter, option,
-                        self.model.index(row, column, parent))
-                x += ItemSize
-
-            y += ItemSize
-
-        progress.setValue(rows)
-
-        painter.restore()
         painter.end()
 
-        if progress.wasCanceled():
-            QMessageBox.information(self, "Printing canceled",
-                    "The printing process was canceled.", QMessageBox.Cancel)
+    def exportImage(self):
+        fileName, _ = QFileDialog.getSaveFileName(self, "Export Image",
+                self.currentPath, "Images (*.png *.bmp *.jpg)")
+
+        if fileName:
+            delegate = self.view.itemDelegate()
+            image = pixelatedImage(self.model.grayscale(), delegate.pixelSize)
+            if not image.save(fileName):
+                QMessageBox.warning(self, "Export Image",
+                        "Cannot write file %s." % fileName)
 
     def showAboutBox(self):
         QMessageBox.about(self, "About the Pixelator example",
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+
+
+#############################################################################
+##
+## Copyright (C) 2013 Riverbank Computing Limited.
+## Copyright (C) 2010 Nokia Corporation and/or its subsidiary(-ies).
+## All rights reserved.
+##
+## This file is part of the examples of PyQt.
+##
+## $QT_BEGIN_LICENSE:BSD$
+## You may use this file under the terms of the BSD license as follows:
+##
+## "Redistribution and use in source and binary forms, with or without
+## modification, are permitted provided that the following conditions are
+## met:
+##   * Redistributions of source code must retain the above copyright
+##     notice, this list of conditions and the following disclaimer.
+##   * Redistributions in binary form must reproduce the above copyright
+##     notice, this list of conditions and the following disclaimer in
+##     the documentation and/or other materials provided with the
+##     distribution.
+##   * Neither the name of Nokia Corporation and its Subsidiary(-ies) nor
+##     the names of its contributors may be used to endorse or promote
+##     products derived from this software without specific prior written
+##     permission.
+##
+## THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+## "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+## LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+## A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+## OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+## SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+## LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+## DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+## THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+## (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+## OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE."
+## $QT_END_LICENSE$
+##
+#############################################################################
+
+
+"""Indented outlines, as used by the tree model examples.
+
+Each non-empty line of an outline is an item. The line's columns are
+separated by tabs. The items of a level are indented at least as much as
+the first of them, and a line that is indented less ends the level. A line
+that is indented more than the first item of its level starts the children
+of the item in front of it. The items of the top level count as indented by
+no spaces. This gives the same tree as the setupModelData() of the original
+examples, even when the indentation is uneven.
+
+An OutlineFile reads one level of the outline at a time: the children of an
+item are only read when readChildren() is given the offset of the first one.
+The file is memory mapped, so even for a file of several gigabytes only the
+parts that have been read are loaded from disk, and regular expressions, not
+Python loops, skip over the lines of the items' descendants.
+"""
+
+
+import mmap
+import re
+
+
+class OutlineFile(object):
+    def __init__(self, data, file=None):
+        self.data = data
+        self.file = file
+        self.patterns = {}
+
+    @classmethod
+    def open(cls, path):
+        file = open(path, 'rb')
+
+        try:
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # An empty file can't be mapped.
+            data = b''
+
+        return cls(data, file)
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+
+        if self.file is not None:
+            self.file.close()
+
+    def findLine(self, position, indentation=None):
+        # Returns a match for the first line from position that isn't blank
+        # and is indented no more than indentation spaces, with the
+        # indentation as its first group. position must be the start of a
+        # line.
+        patterns = self.patterns.get(indentation)
+        if patterns is None:
+            spaces = b' *' if indentation is None else b' {0,%d}' % indentation
+            # Searching for the newline in front of a line, rather than using
+            # ^, lets the regular expression engine skip ahead to each newline
+            # instead of trying to match at every character.
+            line = b'(' + spaces + br')(?! )(?=[ \t]*\S)'
+            patterns = (re.compile(line), re.compile(b'\n' + line))
+            self.patterns[indentation] = patterns
+
+        if position == 0:
+            match = patterns[0].match(self.data)
+            if match is not None:
+                return match
+
+        return patterns[1].search(self.data, max(position - 1, 0))
+
+    def readChildren(self, offset=0):
+        r"""Returns the items of the level that starts at offset, as a list of
+        (columns, offset of the item's children or None) tuples.
+
+        A line that is indented less than the level's first item ends the
+        level, even if it is indented more than the parent's line, and one
+        that is indented more starts the children of the item in front of it:
+
+        >>> outline = OutlineFile(b"a\n    b\n    c\n        d\n  e\nf\n")
+        >>> outline.readChildren()
+        [(['a'], 2), (['e'], None), (['f'], None)]
+        >>> outline.readChildren(2)
+        [(['b'], None), (['c'], 14)]
+        >>> outline.readChildren(14)
+        [(['d'], None)]
+        >>> OutlineFile(b"a\n  b\n c\n").readChildren()
+        [(['a'], 2), (['c'], None)]
+        """
+
+        data = self.data
+        items = []
+        match = self.findLine(offset)
+        if match is None:
+            return items
+
+        # The top level starts at no indentation, whatever the indentation of
+        # its first line.
+        levelIndentation = len(match.group(1)) if offset else 0
+
+        while match is not None:
+            if len(match.group(1)) < levelIndentation:
+                break
+
+            end = data.find(b'\n', match.end(1))
+            if end < 0:
+                end = len(data)
+
+            line = data[match.end(1):end].strip()
+            columns = [s for s in line.decode('utf-8', 'replace').split('\t') if s]
+
+            match = self.findLine(end + 1)
+            if match is not None and len(match.group(1)) > levelIndentation:
+                items.append((columns, match.start(1)))
+                # Skip over the item's descendants, which end at the first
+                # line that is indented less than the first of its children.
+                match = self.findLine(match.start(1), len(match.group(1)) - 1)
+            else:
+                items.append((columns, None))
+
+        return items
@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+
+
+#############################################################################
+##
+## Copyright (C) 2013 Riverbank Computing Limited.
+## Copyright (C) 2010 Nokia Corporation and/or its subsidiary(-ies).
+## All rights reserved.
+##
+## This file is part of the examples of PyQt.
+##
+## $QT_BEGIN_LICENSE:BSD$
+## You may use this file under the terms of the BSD license as follows:
+##
+## "Redistribution and use in source and binary forms, with or without
+## modification, are permitted provided that the following conditions are
+## met:
+##   * Redistributions of source code must retain the above copyright
+##     notice, this list of conditions and the following disclaimer.
+##   * Redistributions in binary form must reproduce the above copyright
+##     notice, this list of conditions and the following disclaimer in
+##     the documentation and/or other materials provided with the
+##     distribution.
+##   * Neither the name of Nokia Corporation and its Subsidiary(-ies) nor
+##     the names of its contributors may be used to endorse or promote
+##     products derived from this software without specific prior written
+##     permission.
+##
+## THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+## "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+## LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+## A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+## OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+## SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+## LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+## DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+## THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+## (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+## OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE."
+## $QT_END_LICENSE$
+##
+#############################################################################
+
+
+"""Tree storage shared by the simpletreemodel and editabletreemodel examples.
+
+Each TreeItem only holds its place in the tree: its parent, its children and
+its row within the parent. The column data of all the items at the same depth
+is kept in one TreeLevel, as a flat list per column, and an item just knows
+its slot in those lists. This keeps outlines of millions of items small, and
+lets columns be inserted and removed one level at a time rather than one item
+at a time.
+
+The row of an item is cached. Inserting or removing children only marks the
+rows from that point on as stale, and they are renumbered the next time one
+of them is asked for. This keeps TreeModel.parent(), which the view calls for
+every index it lays out, from searching the parent's list of children.
+"""
+
+
+import sys
+
+
+class TreeLevel(object):
+    __slots__ = ('columns', 'size', 'free', 'deeper')
+
+    def __init__(self, columnCount):
+        self.columns = [[] for column in range(columnCount)]
+        self.size = 0
+        self.free = []
+        self.deeper = None
+
+    def childLevel(self):
+        if self.deeper is None:
+            self.deeper = TreeLevel(len(self.columns))
+
+        return self.deeper
+
+    def allocate(self, data):
+        columns = self.columns
+        count = len(data)
+
+        while len(columns) < count:
+            columns.append([None] * self.size)
+
+        if self.free:
+            slot = self.free.pop()
+            for column, values in enumerate(columns):
+                values[slot] = data[column] if column < count else None
+        else:
+            slot = self.size
+            self.size += 1
+            for column, values in enumerate(columns):
+                values.append(data[column] if column < count else None)
+
+        return slot
+
+    def release(self, slot):
+        for values in self.columns:
+            values[slot] = None
+
+        self.free.append(slot)
+
+    def insertColumns(self, position, columns):
+        level = self
+        while level is not None:
+            for column in range(columns):
+                level.columns.insert(position, [None] * level.size)
+            level = level.deeper
+
+    def removeColumns(self, position, columns):
+        level = self
+        while level is not None:
+            del level.columns[position:position + columns]
+            level = level.deeper
+
+
+class TreeItem(object):
+    __slots__ = ('parentItem', 'childItems', 'level', 'slot', 'cachedRow',
+            'firstStaleRow')
+
+    # The value of firstStaleRow when the rows of all children are valid.
+    AllRowsValid = sys.maxsize
+
+    def __init__(self, data, parent=None):
+        self.parentItem = parent
+        # Leaves don't need a list of their own.
+        self.childItems = None
+
+        if parent is None:
+            self.level = TreeLevel(len(data))
+        else:
+            self.level = parent.level.childLevel()
+
+        self.slot = self.level.allocate(data)
+        self.cachedRow = 0
+        self.firstStaleRow = TreeItem.AllRowsValid
+
+    def appendChild(self, item):
+        if self.childItems is None:
+            self.childItems = []
+
+        item.cachedRow = len(self.childItems)
+        self.childItems.append(item)
+
+    def appendChildren(self, rows):
+        # Creates a child for the data of each row, and returns the children.
+        if self.childItems is None:
+            self.childItems = []
+
+        items = [TreeItem(data, self) for data in rows]
+        for row, item in enumerate(items, len(self.childItems)):
+            item.cachedRow = row
+
+        self.childItems.extend(items)
+
+        return items
+
+    def child(self, row):
+        if self.childItems is None or row < 0 or row >= len(self.childItems):
+            return None
+
+        return self.childItems[row]
+
+    def childCount(self):
+        if self.childItems is None:
+            return 0
+
+        return len(self.childItems)
+
+    def row(self):
+        parent = self.parentItem
+        if parent is None:
+            return 0
+
+        # The children in front of firstStaleRow have their own row cached,
+        # and the ones after it have a cached row of at least firstStaleRow.
+        if self.cachedRow >= parent.firstStaleRow:
+            parent.renumberChildren()
+
+        return self.cachedRow
+
+    childNumber = row
+
+    def renumberChildren(self):
+        children = self.childItems
+        for row in range(self.firstStaleRow, len(children)):
+            children[row].cachedRow = row
+
+        self.firstStaleRow = TreeItem.AllRowsValid
+
+    def columnCount(self):
+        return len(self.level.columns)
+
+    def data(self, column):
+        try:
+            return self.level.columns[column][self.slot]
+        except IndexError:
+            return None
+
+    def setData(self, column, value):
+        if column < 0 or column >= len(self.level.columns):
+            return False
+
+        self.level.columns[column][self.slot] = value
+
+        return True
+
+    def insertChildren(self, position, count, columns):
+        if position < 0 or position > self.childCount():
+            return False
+
+        if self.childItems is None:
+            self.childItems = []
+
+        data = [None] * columns
+        items = []
+        for row in range(position, position + count):
+            item = TreeItem(data, self)
+            item.cachedRow = row
+            items.append(item)
+
+        if position < len(self.childItems):
+            self.firstStaleRow = min(self.firstStaleRow, position)
+
+        self.childItems[position:position] = items
+
+        return True
+
+    def removeChildren(self, position, count):
+        if position < 0 or position + count > self.childCount():
+            return False
+
+        removed = self.childItems[position:position + count]
+        del self.childItems[position:position + count]
+
+        if position < len(self.childItems):
+            self.firstStaleRow = min(self.firstStaleRow, position)
+
+        # Give the slots of the removed items, and of their descendants, back
+        # to their levels.
+        while removed:
+            item = removed.pop()
+            item.level.release(item.slot)
+            if item.childItems:
+                removed.extend(item.childItems)
+
+        return True
+
+    # All the items at the same depth have the same columns. So these change
+    # the columns of this item's level, and of the levels below it.
+
+    def insertColumns(self, position, columns):
+        if position < 0 or position > len(self.level.columns):
+            return False
+
+        self.level.insertColumns(position, columns)
+
+        return True
+
+    def removeColumns(self, position, columns):
+        if position < 0 or position + columns > len(self.level.columns):
+            return False
+
+        self.level.removeColumns(position, columns)
+
+        return True
+
+    def parent(self):
+        return self.parentItem
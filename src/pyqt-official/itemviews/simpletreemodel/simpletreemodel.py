@@ -42,52 +42,36 @@
 #############################################################################
 
 
+import sys
+import os.path
+
 from PyQt5.QtCore import QAbstractItemModel, QFile, QIODevice, QModelIndex, Qt
 from PyQt5.QtWidgets import QApplication, QTreeView
 
-import simpletreemodel_rc
-
-
-class TreeItem(object):
-    def __init__(self, data, parent=None):
-        self.parentItem = parent
-        self.itemData = data
-        self.childItems = []
-
-    def appendChild(self, item):
-        self.childItems.append(item)
+# Access the shared module.
+sys.path.insert(1,
+        os.path.join(
+                os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                'shared'))
+from outline import OutlineFile
+from treestorage import TreeItem
 
-    def child(self, row):
-        return self.childItems[row]
-
-    def childCount(self):
-        return len(self.childItems)
-
-    def columnCount(self):
-        return len(self.itemData)
-
-    def data(self, column):
-        try:
-            return self.itemData[column]
-        except IndexError:
-            return None
-
-    def parent(self):
-        return self.parentItem
-
-    def row(self):
-        if self.parentItem:
-            return self.parentItem.childItems.index(self)
-
-        return 0
+import simpletreemodel_rc
 
 
 class TreeModel(QAbstractItemModel):
-    def __init__(self, data, parent=None):
+    def __init__(self, outline, parent=None):
         super(TreeModel, self).__init__(parent)
 
         self.rootItem = TreeItem(("Title", "Summary"))
-        self.setupModelData(data.split('\n'), self.rootItem)
+        self.outline = outline
+        # The items whose children have yet to be read, and the offsets of
+        # those children in the outline.
+        self.unfetched = {}
+        self.setupModelData(outline, self.rootItem)
+
+    def canFetchMore(self, parent):
+        return self.getItem(parent) in self.unfetched
 
     def columnCount(self, parent):
         if parent.isValid():
@@ -106,12 +90,44 @@ class TreeModel(QAbstractItemModel):
 
         return item.data(index.column())
 
+    def fetchMore(self, parent):
+        parentItem = self.getItem(parent)
+        offset = self.unfetched.pop(parentItem, None)
+        if offset is None:
+            return
+
+        rows = self.outline.readChildren(offset)
+        if not rows:
+            return
+
+        self.beginInsertRows(parent, 0, len(rows) - 1)
+        children = parentItem.appendChildren([columns for columns, _ in rows])
+        for child, (_, childOffset) in zip(children, rows):
+            if childOffset is not None:
+                self.unfetched[child] = childOffset
+        self.endInsertRows()
+
     def flags(self, index):
         if not index.isValid():
             return Qt.NoItemFlags
 
         return Qt.ItemIsEnabled | Qt.ItemIsSelectable
 
+    def getItem(self, index):
+        if index.isValid():
+            return index.internalPointer()
+
+        return self.rootItem
+
+    def hasChildren(self, parent=QModelIndex()):
+        if parent.column() > 0:
+            return False
+
+        parentItem = self.getItem(parent)
+
+        # Don't read an item's children just to find out that it has some.
+        return parentItem.childCount() > 0 or parentItem in self.unfetched
+
     def headerData(self, section, orientation, role):
         if orientation == Qt.Horizontal and role == Qt.DisplayRole:
             return self.rootItem.data(section)
@@ -156,42 +172,11 @@ class TreeModel(QAbstractItemModel):
 
         return parentItem.childCount()
 
-    def setupModelData(self, lines, parent):
-        parents = [parent]
-        indentations = [0]
-
-        number = 0
-
-        while number < len(lines):
-            position = 0
-            while position < len(lines[number]):
-                if lines[number][position] != ' ':
-                    break
-                position += 1
-
-            lineData = lines[number][position:].trimmed()
-
-            if lineData:
-                # Read the column data from the rest of the line.
-                columnData = [s for s in lineData.split('\t') if s]
-
-                if position > indentations[-1]:
-                    # The last child of the current parent is now the new
-                    # parent unless the current parent has no children.
-
-                    if parents[-1].childCount() > 0:
-                        parents.append(parents[-1].child(parents[-1].childCount() - 1))
-                        indentations.append(position)
-
-                else:
-                    while position < indentations[-1] and len(parents) > 0:
-                        parents.pop()
-                        indentations.pop()
-
-                # Append a new item to the current parent's list of children.
-                parents[-1].appendChild(TreeItem(columnData, parents[-1]))
-
-            number += 1
+    def setupModelData(self, outline, parent):
+        # Only the top level items are read here. The children of an item
+        # are read by fetchMore() when the view first shows them.
+        self.unfetched[parent] = 0
+        self.fetchMore(QModelIndex())
 
 
 if __name__ == '__main__':
@@ -200,10 +185,15 @@ if __name__ == '__main__':
 
     app = QApplication(sys.argv)
 
-    f = QFile(':/default.txt')
-    f.open(QIODevice.ReadOnly)
-    model = TreeModel(f.readAll())
-    f.close()
+    if len(sys.argv) > 1:
+        outline = OutlineFile.open(sys.argv[1])
+    else:
+        f = QFile(':/default.txt')
+        f.open(QIODevice.ReadOnly)
+        outline = OutlineFile(bytes(f.readAll()))
+        f.close()
+
+    model = TreeModel(outline)
 
     view = QTreeView()
     view.setModel(model)
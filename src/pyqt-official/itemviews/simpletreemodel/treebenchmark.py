@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+
+
+#############################################################################
+##
+## Copyright (C) 2013 Riverbank Computing Limited.
+## Copyright (C) 2010 Nokia Corporation and/or its subsidiary(-ies).
+## All rights reserved.
+##
+## This file is part of the examples of PyQt.
+##
+## $QT_BEGIN_LICENSE:BSD$
+## You may use this file under the terms of the BSD license as follows:
+##
+## "Redistribution and use in source and binary forms, with or without
+## modification, are permitted provided that the following conditions are
+## met:
+##   * Redistributions of source code must retain the above copyright
+##     notice, this list of conditions and the following disclaimer.
+##   * Redistributions in binary form must reproduce the above copyright
+##     notice, this list of conditions and the following disclaimer in
+##     the documentation and/or other materials provided with the
+##     distribution.
+##   * Neither the name of Nokia Corporation and its Subsidiary(-ies) nor
+##     the names of its contributors may be used to endorse or promote
+##     products derived from this software without specific prior written
+##     permission.
+##
+## THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+## "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+## LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+## A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+## OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+## SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+## LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+## DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+## THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+## (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+## OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE."
+## $QT_END_LICENSE$
+##
+#############################################################################
+
+
+"""Measures how the simpletreemodel copes with a wide tree.
+
+The tree has --top top level items, each with --width children, each of which
+has --leaves children of its own. The benchmark builds the model, expands the
+first two levels in a QTreeView and scrolls through it, jumping to --pages
+evenly spaced pages from the top to the bottom. It
+does this once with the original TreeItem, which looks up its row with
+list.index(), and once with the TreeItem of the shared tree storage, each in
+a process of its own so that their memory use can be compared:
+
+    python treebenchmark.py --top 10 --width 5000 --leaves 2
+
+To only build a tree and report its memory use, eg. one of 10 million items:
+
+    python treebenchmark.py --top 100 --width 50000 --leaves 1 --build-only
+"""
+
+
+import argparse
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+from PyQt5.QtWidgets import QApplication, QTreeView
+
+from simpletreemodel import OutlineFile, TreeItem, TreeModel
+
+
+class ListTreeItem(object):
+    # The TreeItem the example used to have.
+
+    def __init__(self, data, parent=None):
+        self.parentItem = parent
+        self.itemData = data
+        self.childItems = []
+
+    def appendChild(self, item):
+        self.childItems.append(item)
+
+    def child(self, row):
+        return self.childItems[row]
+
+    def childCount(self):
+        return len(self.childItems)
+
+    def columnCount(self):
+        return len(self.itemData)
+
+    def data(self, column):
+        try:
+            return self.itemData[column]
+        except IndexError:
+            return None
+
+    def parent(self):
+        return self.parentItem
+
+    def row(self):
+        if self.parentItem:
+            return self.parentItem.childItems.index(self)
+
+        return 0
+
+
+Implementations = {'list': ListTreeItem, 'shared': TreeItem}
+
+
+def peakMemory():
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        rss //= 1024
+
+    return rss / 1024.0
+
+
+def buildModel(itemClass, top, width, leaves):
+    model = TreeModel(OutlineFile(b''))
+    root = model.rootItem = itemClass(("Title", "Summary"))
+
+    for i in range(top):
+        topItem = itemClass(("Item %d" % i, "Top level"), root)
+        root.appendChild(topItem)
+        for j in range(width):
+            item = itemClass(("Item %d.%d" % (i, j), "Second level"), topItem)
+            topItem.appendChild(item)
+            for k in range(leaves):
+                item.appendChild(itemClass(("Item %d.%d.%d" % (i, j, k), "Leaf"),
+                        item))
+
+    return model
+
+
+def run(implementation, top, width, leaves, pages, buildOnly):
+    app = QApplication(sys.argv)
+    baseline = peakMemory()
+
+    start = time.perf_counter()
+    model = buildModel(Implementations[implementation], top, width, leaves)
+    buildTime = time.perf_counter() - start
+    memory = peakMemory() - baseline
+
+    if buildOnly:
+        return buildTime, memory, 0.0, 0.0, 0.0, peakMemory()
+
+    view = QTreeView()
+    view.setUniformRowHeights(True)
+    view.resize(800, 600)
+    view.setModel(model)
+    view.show()
+    app.processEvents()
+
+    start = time.perf_counter()
+    view.expandToDepth(1)
+    app.processEvents()
+    expandTime = time.perf_counter() - start
+
+    scrollBar = view.verticalScrollBar()
+    pageTimes = []
+    start = time.perf_counter()
+    for page in range(1, pages + 1):
+        pageStart = time.perf_counter()
+        scrollBar.setValue(scrollBar.maximum() * page // pages)
+        view.viewport().repaint()
+        pageTimes.append(time.perf_counter() - pageStart)
+    scrollTime = time.perf_counter() - start
+
+    return (buildTime, memory, expandTime, scrollTime,
+            statistics.median(pageTimes) if pageTimes else 0.0, peakMemory())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--width', type=int, default=5000)
+    parser.add_argument('--leaves', type=int, default=2)
+    parser.add_argument('--pages', type=int, default=500)
+    parser.add_argument('--build-only', action='store_true')
+    parser.add_argument('--implementation', choices=sorted(Implementations),
+            help="run a single implementation and print the raw results")
+    args = parser.parse_args()
+
+    if args.implementation:
+        print(*run(args.implementation, args.top, args.width, args.leaves,
+                args.pages, args.build_only))
+        return
+
+    numItems = args.top * (1 + args.width * (1 + args.leaves))
+    print("%d items" % numItems)
+    print("%-8s %10s %12s %11s %11s %14s %10s" % ("storage", "build (s)",
+            "tree (MB)", "expand (s)", "scroll (s)", "page (ms)",
+            "peak (MB)"))
+
+    for implementation in sorted(Implementations):
+        command = [sys.executable, __file__, '--top', str(args.top),
+                '--width', str(args.width), '--leaves', str(args.leaves),
+                '--pages', str(args.pages),
+                '--implementation', implementation]
+        if args.build_only:
+            command.append('--build-only')
+
+        output = subprocess.check_output(command, universal_newlines=True)
+        build, memory, expand, scroll, page, peak = map(float,
+                output.split()[-6:])
+        print("%-8s %10.2f %12.1f %11.2f %11.2f %14.2f %10.1f" % (
+                implementation, build, memory, expand, scroll, page * 1000,
+                peak))
+
+
+if __name__ == '__main__':
+    main()
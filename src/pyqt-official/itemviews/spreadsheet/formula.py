@@ -0,0 +1,424 @@
+#############################################################################
+##
+## Copyright (C) 2012 Hans-Peter Jansen <hpj@urpla.net>.
+## Copyright (C) 2011 Nokia Corporation and/or its subsidiary(-ies).
+## All rights reserved.
+## Contact: Nokia Corporation (qt-info@nokia.com)
+##
+## This file is part of the examples of PyQt.
+##
+## $QT_BEGIN_LICENSE:LGPL$
+## GNU Lesser General Public License Usage
+## This file may be used under the terms of the GNU Lesser General Public
+## License version 2.1 as published by the Free Software Foundation and
+## appearing in the file LICENSE.LGPL included in the packaging of this
+## file. Please review the following information to ensure the GNU Lesser
+## General Public License version 2.1 requirements will be met:
+## http:#www.gnu.org/licenses/old-licenses/lgpl-2.1.html.
+##
+## In addition, as a special exception, Nokia gives you certain additional
+## rights. These rights are described in the Nokia Qt LGPL Exception
+## version 1.1, included in the file LGPL_EXCEPTION.txt in this package.
+##
+## GNU General Public License Usage
+## Alternatively, this file may be used under the terms of the GNU General
+## Public License version 3.0 as published by the Free Software Foundation
+## and appearing in the file LICENSE.GPL included in the packaging of this
+## file. Please review the following information to ensure the GNU General
+## Public License version 3.0 requirements will be met:
+## http:#www.gnu.org/copyleft/gpl.html.
+##
+## Other Usage
+## Alternatively, this file may be used in accordance with the terms and
+## conditions contained in a signed written agreement between you and Nokia.
+## $QT_END_LICENSE$
+##
+#############################################################################
+
+
+
+import math
+
+from collections import defaultdict
+
+from util import decode_pos
+
+
+CycleError = "#CYCLE"
+
+
+class Formula(object):
+    """A cell formula that has been parsed into an operator and its cells."""
+
+    RangeOperators = ("sum", "avg", "min", "max", "count")
+    Operators = RangeOperators + ("+", "-", "*", "/", "=")
+
+    def __init__(self, op, first, second):
+        self.op = op
+        self.first = first
+        self.second = second
+
+    def isRange(self):
+        return self.op in Formula.RangeOperators
+
+    def cellRange(self):
+        """Return (firstRow, lastRow, firstCol, lastCol) of a range formula."""
+
+        (firstRow, firstCol), (lastRow, lastCol) = self.first, self.second
+        return firstRow, lastRow, firstCol, lastCol
+
+    def references(self):
+        """Return the individual cells read by a non-range formula."""
+
+        if self.op == "=":
+            return [self.first]
+        return [self.first, self.second]
+
+
+def parseFormula(text):
+    """Return a Formula for text, or None if it is a plain value."""
+
+    if not text:
+        return None
+
+    slist = text.split(' ')
+    op = slist[0].lower()
+    if op not in Formula.Operators:
+        return None
+
+    first = (-1, -1)
+    second = (-1, -1)
+    if len(slist) > 1:
+        first = decode_pos(slist[1])
+    if len(slist) > 2:
+        second = decode_pos(slist[2])
+
+    return Formula(op, first, second)
+
+
+def toText(value):
+    """Return the text a cell with the given value shows, as QVariant does."""
+
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def parseNumber(text):
+    """Return text as a float if it is a number that reads back as the same
+    text, otherwise None.
+    """
+
+    try:
+        number = float(text)
+    except (TypeError, ValueError):
+        return None
+
+    if not math.isfinite(number) or toText(number) != text:
+        return None
+    return number
+
+
+def toNumber(value):
+    """Return the number a cell with the given value shows, or None.
+
+    This reads numbers the same way as SheetModel does, so that a formula
+    over a float result such as an average gives the same value with either
+    engine.
+    """
+
+    return parseNumber(toText(value))
+
+
+class FormulaEngine(object):
+    """Evaluates the formulas of a sheet incrementally.
+
+    Every formula is parsed once, when its cell changes.  The engine keeps
+    track of which cells each formula reads, so an edit only recomputes the
+    cells that depend on the edited one, in topological order.  Cells that
+    depend on themselves get the value CycleError.
+
+    The engine only knows about formulas.  Subclasses connect it to the
+    storage of the sheet by implementing valueOf(), numberOf(), hasCell()
+    and storeValue(), and may provide a faster aggregate().
+    """
+
+    def __init__(self):
+        self.formulas = {}
+
+        # The non-range formulas that read a cell, by cell.
+        self.dependents = defaultdict(set)
+
+        # The range formulas, by each column their range covers.  Ranges
+        # can be large, so they are not expanded into individual cells.
+        self.rangesByColumn = defaultdict(set)
+
+    def cellChanged(self, cell, text):
+        """Update the formula of a cell and recompute what depends on it.
+
+        Returns the set of cells whose value changed.
+        """
+
+        self.unregister(cell)
+        self.register(cell, text)
+        return self.recompute([cell])
+
+    def register(self, cell, text):
+        formula = parseFormula(text)
+        if formula is None:
+            return
+
+        self.formulas[cell] = formula
+        if formula.isRange():
+            firstRow, lastRow, firstCol, lastCol = formula.cellRange()
+            for col in range(max(firstCol, 0), lastCol + 1):
+                self.rangesByColumn[col].add(cell)
+        else:
+            for ref in formula.references():
+                self.dependents[ref].add(cell)
+
+    def unregister(self, cell):
+        formula = self.formulas.pop(cell, None)
+        if formula is None:
+            return
+
+        if formula.isRange():
+            firstRow, lastRow, firstCol, lastCol = formula.cellRange()
+            for col in range(max(firstCol, 0), lastCol + 1):
+                self.rangesByColumn[col].discard(cell)
+        else:
+            for ref in formula.references():
+                self.dependents[ref].discard(cell)
+
+    def dependentsOf(self, cell):
+        result = list(self.dependents.get(cell, ()))
+
+        row, col = cell
+        for rangeCell in self.rangesByColumn.get(col, ()):
+            # A range skips its own cell, as the original sum did.
+            firstRow, lastRow, _, _ = self.formulas[rangeCell].cellRange()
+            if firstRow <= row <= lastRow and rangeCell != cell:
+                result.append(rangeCell)
+
+        return result
+
+    def recompute(self, cells):
+        """Recompute the given cells and everything that depends on them.
+
+        Returns the set of cells whose value changed.
+        """
+
+        changed = set()
+
+        for component in self.evaluationOrder(cells):
+            cyclic = len(component) > 1 or component[0] in self.dependentsOf(component[0])
+
+            for cell in component:
+                value = CycleError if cyclic else self.evaluate(cell)
+                if self.storeValue(cell, value):
+                    changed.add(cell)
+
+        return changed
+
+    def evaluationOrder(self, cells):
+        """Return the strongly connected components of the cells reachable
+        from the given ones, precedents before their dependents.
+
+        This is an iterative version of Tarjan's algorithm, so that long
+        chains of formulas do not hit the recursion limit.  A component with
+        more than one cell, or a cell that depends on itself, is a cycle.
+        """
+
+        index = {}
+        lowlink = {}
+        onStack = set()
+        stack = []
+        components = []
+
+        for start in cells:
+            if start in index:
+                continue
+
+            index[start] = lowlink[start] = len(index)
+            stack.append(start)
+            onStack.add(start)
+            work = [(start, iter(self.dependentsOf(start)))]
+
+            while work:
+                cell, successors = work[-1]
+
+                for successor in successors:
+                    if successor not in index:
+                        index[successor] = lowlink[successor] = len(index)
+                        stack.append(successor)
+                        onStack.add(successor)
+                        work.append((successor, iter(self.dependentsOf(successor))))
+                        break
+                    if successor in onStack:
+                        lowlink[cell] = min(lowlink[cell], index[successor])
+                else:
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        lowlink[parent] = min(lowlink[parent], lowlink[cell])
+
+                    if lowlink[cell] == index[cell]:
+                        component = []
+                        while True:
+                            member = stack.pop()
+                            onStack.discard(member)
+                            component.append(member)
+                            if member == cell:
+                                break
+                        components.append(component)
+
+        # Tarjan's algorithm finds dependents before their precedents.
+        components.reverse()
+        return components
+
+    def evaluate(self, cell):
+        formula = self.formulas.get(cell)
+        if formula is None:
+            return self.valueOf(cell)
+
+        if formula.isRange():
+            return self.aggregate(formula.op, formula.cellRange(), cell)
+
+        if formula.op == "=":
+            if not self.hasCell(formula.first):
+                return None
+            return toText(self.valueOf(formula.first))
+
+        firstVal = self.numberOf(formula.first) or 0
+        secondVal = self.numberOf(formula.second) or 0
+
+        if formula.op == "+":
+            return firstVal + secondVal
+        if formula.op == "-":
+            return firstVal - secondVal
+        if formula.op == "*":
+            return firstVal * secondVal
+        if secondVal == 0:
+            return "nan"
+        return firstVal / secondVal
+
+    def aggregate(self, op, cellRange, cell):
+        """Return sum, avg, min, max or count of the numbers in a range,
+        leaving out the cell of the formula itself.
+        """
+
+        firstRow, lastRow, firstCol, lastCol = cellRange
+        numbers = []
+        for r in range(firstRow, lastRow + 1):
+            for c in range(firstCol, lastCol + 1):
+                if (r, c) != cell:
+                    number = self.numberOf((r, c))
+                    if number is not None:
+                        numbers.append(number)
+
+        if op == "sum":
+            return sum(numbers)
+        if op == "count":
+            return len(numbers)
+        if not numbers:
+            return "nan"
+        if op == "avg":
+            return sum(numbers) / len(numbers)
+        if op == "min":
+            return min(numbers)
+        return max(numbers)
+
+    def valueOf(self, cell):
+        raise NotImplementedError
+
+    def numberOf(self, cell):
+        return toNumber(self.valueOf(cell))
+
+    def hasCell(self, cell):
+        raise NotImplementedError
+
+    def storeValue(self, cell, value):
+        """Store the value of a cell and return whether it changed."""
+
+        raise NotImplementedError
+
+
+class TableFormulaEngine(FormulaEngine):
+    """A FormulaEngine for a QTableWidget of SpreadSheetItems.
+
+    Results are stored in the items' value attribute, so painting never
+    evaluates a formula.
+    """
+
+    def __init__(self, table):
+        super(TableFormulaEngine, self).__init__()
+
+        self.table = table
+
+        # The text of every cell we have seen.
+        self.texts = {}
+
+        self.reset()
+
+        table.itemChanged.connect(self.itemChanged)
+
+    def reset(self):
+        """Re-read every item of the table and recompute everything."""
+
+        for cell in list(self.texts):
+            self.unregister(cell)
+        self.texts.clear()
+
+        for row in range(self.table.rowCount()):
+            for col in range(self.table.columnCount()):
+                item = self.table.item(row, col)
+                if item is not None:
+                    self.texts[(row, col)] = item.formula()
+                    self.register((row, col), item.formula())
+
+        self.recompute(list(self.texts))
+
+    def itemChanged(self, item):
+        cell = (self.table.row(item), self.table.column(item))
+        text = item.formula()
+
+        # Our own notifications about recomputed values end up here too.
+        if cell in self.texts and self.texts[cell] == text:
+            return
+
+        self.texts[cell] = text
+        changed = self.cellChanged(cell, text)
+        changed.discard(cell)
+        self.notify(changed)
+
+    def valueOf(self, cell):
+        if cell not in self.formulas:
+            return self.texts.get(cell)
+        item = self.table.item(*cell)
+        if item is None:
+            return None
+        return item.value
+
+    def hasCell(self, cell):
+        return self.table.item(*cell) is not None
+
+    def storeValue(self, cell, value):
+        item = self.table.item(*cell)
+        if item is None or item.value == value:
+            return False
+        item.value = value
+        return True
+
+    def notify(self, cells):
+        """Tell the views about cells whose values were recomputed."""
+
+        if not cells:
+            return
+
+        rows = [row for row, _ in cells]
+        cols = [col for _, col in cells]
+        model = self.table.model()
+        model.dataChanged.emit(model.index(min(rows), min(cols)),
+                model.index(max(rows), max(cols)))
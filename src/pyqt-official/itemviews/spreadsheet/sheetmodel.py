@@ -0,0 +1,284 @@
+#############################################################################
+##
+## Copyright (C) 2012 Hans-Peter Jansen <hpj@urpla.net>.
+## Copyright (C) 2011 Nokia Corporation and/or its subsidiary(-ies).
+## All rights reserved.
+## Contact: Nokia Corporation (qt-info@nokia.com)
+##
+## This file is part of the examples of PyQt.
+##
+## $QT_BEGIN_LICENSE:LGPL$
+## GNU Lesser General Public License Usage
+## This file may be used under the terms of the GNU Lesser General Public
+## License version 2.1 as published by the Free Software Foundation and
+## appearing in the file LICENSE.LGPL included in the packaging of this
+## file. Please review the following information to ensure the GNU Lesser
+## General Public License version 2.1 requirements will be met:
+## http:#www.gnu.org/licenses/old-licenses/lgpl-2.1.html.
+##
+## In addition, as a special exception, Nokia gives you certain additional
+## rights. These rights are described in the Nokia Qt LGPL Exception
+## version 1.1, included in the file LGPL_EXCEPTION.txt in this package.
+##
+## GNU General Public License Usage
+## Alternatively, this file may be used under the terms of the GNU General
+## Public License version 3.0 as published by the Free Software Foundation
+## and appearing in the file LICENSE.GPL included in the packaging of this
+## file. Please review the following information to ensure the GNU General
+## Public License version 3.0 requirements will be met:
+## http:#www.gnu.org/copyleft/gpl.html.
+##
+## Other Usage
+## Alternatively, this file may be used in accordance with the terms and
+## conditions contained in a signed written agreement between you and Nokia.
+## $QT_END_LICENSE$
+##
+#############################################################################
+
+
+
+import math
+
+import numpy as np
+
+from PyQt5.QtCore import QAbstractTableModel, QModelIndex, Qt
+
+from formula import FormulaEngine, parseNumber, toText
+from spreadsheetitem import textAlignment, textColor
+
+
+class SheetFormulaEngine(FormulaEngine):
+    """A FormulaEngine that reads and writes the columns of a SheetModel and
+    computes range aggregates on whole column slices at a time.
+    """
+
+    def __init__(self, model):
+        super(SheetFormulaEngine, self).__init__()
+
+        self.model = model
+
+    def contains(self, cell):
+        row, col = cell
+        return 0 <= row < self.model.rows and 0 <= col < self.model.cols
+
+    def valueOf(self, cell):
+        if not self.contains(cell):
+            return None
+        return self.model.value(*cell)
+
+    def numberOf(self, cell):
+        if not self.contains(cell):
+            return None
+        number = self.model.number(*cell)
+        if math.isnan(number):
+            return None
+        return number
+
+    def hasCell(self, cell):
+        return self.contains(cell) and (not math.isnan(self.model.number(*cell))
+                or cell in self.model.texts)
+
+    def storeValue(self, cell, value):
+        row, col = cell
+        old = self.model.value(row, col)
+        if cell in self.formulas:
+            if isinstance(value, (int, float)) and math.isfinite(value):
+                self.model.results.pop(cell, None)
+                self.model.storeNumber(row, col, float(value))
+            else:
+                self.model.results[cell] = value
+                self.model.storeNumber(row, col, math.nan)
+        return old != self.model.value(row, col)
+
+    def aggregate(self, op, cellRange, cell):
+        firstRow, lastRow, firstCol, lastCol = cellRange
+        firstRow = max(firstRow, 0)
+        lastRow = min(lastRow, self.model.rows - 1)
+        firstCol = max(firstCol, 0)
+        lastCol = min(lastCol, self.model.cols - 1)
+
+        total = 0.0
+        count = 0
+        lowest = math.inf
+        highest = -math.inf
+
+        for col in range(firstCol, lastCol + 1):
+            column = self.model.numbers[col]
+            if column is None or firstRow > lastRow:
+                continue
+
+            values = column[firstRow:lastRow + 1]
+            if cell[1] == col and firstRow <= cell[0] <= lastRow:
+                # A range leaves out its own cell.
+                values = values.copy()
+                values[cell[0] - firstRow] = math.nan
+
+            if op in ("sum", "avg"):
+                total += np.nansum(values)
+            if op in ("avg", "count"):
+                count += np.count_nonzero(~np.isnan(values))
+            if op == "min":
+                lowest = min(lowest, np.fmin.reduce(values))
+            if op == "max":
+                highest = max(highest, np.fmax.reduce(values))
+
+        if op == "sum":
+            return float(total)
+        if op == "count":
+            return int(count)
+        if op == "avg":
+            return float(total / count) if count else "nan"
+        if op == "min":
+            return float(lowest) if math.isfinite(lowest) else "nan"
+        return float(highest) if math.isfinite(highest) else "nan"
+
+
+class SheetModel(QAbstractTableModel):
+    """A spreadsheet model that stores its cells by column.
+
+    The numeric value of every cell, typed in or computed by a formula, is
+    kept in one float64 array per column, with NaN for cells that are not
+    numbers.  A column's array is only allocated once it holds a number.
+    Everything else is kept in dictionaries that only have entries for the
+    cells that need them: the text of cells that are not plain numbers,
+    including formulas, non-numeric results of formulas, and other roles
+    such as backgrounds and fonts.
+    """
+
+    def __init__(self, rows, cols, parent=None):
+        super(SheetModel, self).__init__(parent)
+
+        self.rows = rows
+        self.cols = cols
+        self.numbers = [None] * cols
+        self.texts = {}
+        self.results = {}
+        self.attributes = {}
+        self.engine = SheetFormulaEngine(self)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return self.rows
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return self.cols
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return chr(ord('A') + section)
+        return super(SheetModel, self).headerData(section, orientation, role)
+
+    def flags(self, index):
+        return Qt.ItemIsSelectable | Qt.ItemIsEditable | Qt.ItemIsEnabled
+
+    def number(self, row, col):
+        column = self.numbers[col]
+        if column is None:
+            return math.nan
+        return column[row]
+
+    def storeNumber(self, row, col, number):
+        column = self.numbers[col]
+        if column is None:
+            if math.isnan(number):
+                return
+            column = self.numbers[col] = np.full(self.rows, math.nan)
+        column[row] = number
+
+    def value(self, row, col):
+        """Return the value a cell shows."""
+
+        cell = (row, col)
+        if cell in self.results:
+            return self.results[cell]
+        number = self.number(row, col)
+        if not math.isnan(number):
+            return float(number)
+        return self.texts.get(cell)
+
+    def formula(self, row, col):
+        """Return the text of a cell as it was typed in."""
+
+        text = self.texts.get((row, col))
+        if text is not None:
+            return text
+        number = self.number(row, col)
+        if math.isnan(number):
+            return None
+        return toText(float(number))
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        row, col = index.row(), index.column()
+        if role in (Qt.EditRole, Qt.StatusTipRole):
+            return self.formula(row, col)
+        if role == Qt.DisplayRole:
+            value = self.value(row, col)
+            if isinstance(value, float):
+                return toText(value)
+            return value
+        if role == Qt.TextColorRole:
+            return textColor(toText(self.value(row, col)))
+        if role == Qt.TextAlignmentRole:
+            return textAlignment(toText(self.value(row, col)))
+        return self.attributes.get((row, col), {}).get(role)
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid():
+            return False
+
+        if role in (Qt.EditRole, Qt.DisplayRole):
+            self.setText(index.row(), index.column(), value)
+        else:
+            self.attributes.setdefault((index.row(), index.column()), {})[role] = value
+            self.dataChanged.emit(index, index, [role])
+        return True
+
+    def setText(self, row, col, text):
+        cell = (row, col)
+        text = str(text) if text else None
+        number = parseNumber(text)
+
+        self.results.pop(cell, None)
+        if number is None:
+            if text:
+                self.texts[cell] = text
+            else:
+                self.texts.pop(cell, None)
+            self.storeNumber(row, col, math.nan)
+        else:
+            self.texts.pop(cell, None)
+            self.storeNumber(row, col, number)
+
+        changed = self.engine.cellChanged(cell, text)
+        changed.add(cell)
+        self.notify(changed)
+
+    def setColumn(self, col, numbers):
+        """Replace a whole column with an array of numbers in one go."""
+
+        self.beginResetModel()
+        for cell in [cell for cell in self.texts if cell[1] == col]:
+            self.engine.unregister(cell)
+            del self.texts[cell]
+        for cell in [cell for cell in self.results if cell[1] == col]:
+            del self.results[cell]
+
+        column = np.full(self.rows, math.nan)
+        numbers = np.asarray(numbers, dtype=np.float64)[:self.rows]
+        column[:len(numbers)] = numbers
+        self.numbers[col] = column
+
+        self.engine.recompute(list(self.engine.formulas))
+        self.endResetModel()
+
+    def notify(self, cells):
+        rows = [row for row, _ in cells]
+        cols = [col for _, col in cells]
+        self.dataChanged.emit(self.index(min(rows), min(cols)),
+                self.index(max(rows), max(cols)))
@@ -40,19 +40,22 @@
 #############################################################################
 
 
-from PyQt5.QtCore import QDate, QPoint, Qt
-from PyQt5.QtGui import QColor, QIcon, QKeySequence, QPainter, QPixmap
+from PyQt5.QtCore import QDate, QModelIndex, QPoint, Qt
+from PyQt5.QtGui import (QBrush, QColor, QIcon, QKeySequence, QPainter,
+        QPixmap)
 from PyQt5.QtWidgets import (QAction, QActionGroup, QApplication, QColorDialog,
         QComboBox, QDialog, QFontDialog, QGroupBox, QHBoxLayout, QLabel,
-        QLineEdit, QMainWindow, QMessageBox, QPushButton, QTableWidget,
-        QTableWidgetItem, QToolBar, QVBoxLayout)
+        QLineEdit, QMainWindow, QMessageBox, QPushButton, QTableView,
+        QTableWidget, QTableWidgetItem, QToolBar, QVBoxLayout)
 from PyQt5.QtPrintSupport import QPrinter, QPrintPreviewDialog
 
 import spreadsheet_rc
 
+from formula import TableFormulaEngine
 from spreadsheetdelegate import SpreadSheetDelegate
 from spreadsheetitem import SpreadSheetItem
 from printview import PrintView
+from sheetmodel import SheetModel
 from util import decode_pos, encode_pos
 
 
@@ -62,7 +65,7 @@ class SpreadSheet(QMainWindow):
 
     currentDateFormat = dateFormats[0]
 
-    def __init__(self, rows, cols, parent = None):
+    def __init__(self, rows, cols, parent = None, columnar = False):
         super(SpreadSheet, self).__init__(parent)
 
         self.toolBar = QToolBar()
@@ -72,26 +75,35 @@ class SpreadSheet(QMainWindow):
         self.cellLabel.setMinimumSize(80, 0)
         self.toolBar.addWidget(self.cellLabel)
         self.toolBar.addWidget(self.formulaInput)
-        self.table = QTableWidget(rows, cols, self)
-        for c in range(cols):
-            character = chr(ord('A') + c)
-            self.table.setHorizontalHeaderItem(c, QTableWidgetItem(character))
+        if columnar:
+            # Suitable for millions of cells: the model keeps numbers in
+            # arrays instead of one QTableWidgetItem per cell.
+            self.table = QTableView(self)
+            self.table.setModel(SheetModel(rows, cols, self.table))
+        else:
+            self.table = QTableWidget(rows, cols, self)
+            for c in range(cols):
+                character = chr(ord('A') + c)
+                self.table.setHorizontalHeaderItem(c, QTableWidgetItem(character))
+
+            self.table.setItemPrototype(SpreadSheetItem())
+            self.formulaEngine = TableFormulaEngine(self.table)
 
-        self.table.setItemPrototype(self.table.item(rows - 1, cols - 1))
+        # Everything below works on the model, so that it works with both.
+        self.model = self.table.model()
         self.table.setItemDelegate(SpreadSheetDelegate(self))
         self.createActions()
-        self.updateColor(0)
+        self.updateColor(QModelIndex())
         self.setupMenuBar()
         self.setupContents()
         self.setupContextMenu()
         self.setCentralWidget(self.table)
         self.statusBar()
-        self.table.currentItemChanged.connect(self.updateStatus)
-        self.table.currentItemChanged.connect(self.updateColor)
-        self.table.currentItemChanged.connect(self.updateLineEdit)
-        self.table.itemChanged.connect(self.updateStatus)
+        self.table.selectionModel().currentChanged.connect(self.updateStatus)
+        self.table.selectionModel().currentChanged.connect(self.updateColor)
+        self.table.selectionModel().currentChanged.connect(self.updateLineEdit)
+        self.model.dataChanged.connect(self.cellChanged)
         self.formulaInput.returnPressed.connect(self.returnPressed)
-        self.table.itemChanged.connect(self.updateLineEdit)
         self.setWindowTitle("Spreadsheet")
 
     def createActions(self):
@@ -173,22 +185,33 @@ class SpreadSheet(QMainWindow):
         action = self.sender()
         oldFormat = self.currentDateFormat
         newFormat = self.currentDateFormat = action.text()
-        for row in range(self.table.rowCount()):
-            item = self.table.item(row, 1)
-            date = QDate.fromString(item.text(), oldFormat)
-            item.setText(date.toString(newFormat))
-
-    def updateStatus(self, item):
-        if item and item == self.table.currentItem():
-            self.statusBar().showMessage(item.data(Qt.StatusTipRole), 1000)
-            self.cellLabel.setText("Cell: (%s)" % encode_pos(self.table.row(item),
-                                                                     self.table.column(item)))
-
-    def updateColor(self, item):
+        for row in range(self.model.rowCount()):
+            index = self.model.index(row, 1)
+            text = self.model.data(index, Qt.EditRole)
+            if not text:
+                continue
+            date = QDate.fromString(text, oldFormat)
+            self.model.setData(index, date.toString(newFormat))
+
+    def cellChanged(self, topLeft, bottomRight):
+        # Only edits of single cells, not values recomputed in bulk.
+        if topLeft == bottomRight:
+            self.updateStatus(topLeft)
+            self.updateLineEdit(topLeft)
+
+    def updateStatus(self, index):
+        if index.isValid() and index == self.table.currentIndex():
+            self.statusBar().showMessage(self.model.data(index, Qt.StatusTipRole), 1000)
+            self.cellLabel.setText("Cell: (%s)" % encode_pos(index.row(),
+                                                                     index.column()))
+
+    def updateColor(self, index):
         pixmap = QPixmap(16, 16)
         color = QColor()
-        if item:
-            color = item.backgroundColor()
+        if index.isValid():
+            background = self.model.data(index, Qt.BackgroundRole)
+            if background is not None:
+                color = QBrush(background).color()
         if not color.isValid():
             color = self.palette().base().color()
         painter = QPainter(pixmap)
@@ -203,55 +226,48 @@ class SpreadSheet(QMainWindow):
         painter.end()
         self.colorAction.setIcon(QIcon(pixmap))
 
-    def updateLineEdit(self, item):
-        if item != self.table.currentItem():
+    def updateLineEdit(self, index):
+        if index != self.table.currentIndex():
             return
-        if item:
-            self.formulaInput.setText(item.data(Qt.EditRole))
+        if index.isValid():
+            self.formulaInput.setText(self.model.data(index, Qt.EditRole))
         else:
             self.formulaInput.clear()
 
     def returnPressed(self):
         text = self.formulaInput.text()
-        row = self.table.currentRow()
-        col = self.table.currentColumn()
-        item = self.table.item(row, col)
-        if not item:
-            self.table.setItem(row, col, SpreadSheetItem(text))
-        else:
-            item.setData(Qt.EditRole, text)
-        self.table.viewport().update()
+        self.model.setData(self.table.currentIndex(), text)
 
     def selectColor(self):
-        item = self.table.currentItem()
-        color = item and QColor(item.background()) or self.table.palette().base().color()
+        background = self.model.data(self.table.currentIndex(), Qt.BackgroundRole)
+        color = background is not None and QBrush(background).color() or self.table.palette().base().color()
         color = QColorDialog.getColor(color, self)
         if not color.isValid():
             return
-        selected = self.table.selectedItems()
+        selected = self.table.selectionModel().selectedIndexes()
         if not selected:
             return
-        for i in selected:
-            i and i.setBackground(color)
-        self.updateColor(self.table.currentItem())
+        for index in selected:
+            self.model.setData(index, QBrush(color), Qt.BackgroundRole)
+        self.updateColor(self.table.currentIndex())
 
     def selectFont(self):
-        selected = self.table.selectedItems()
+        selected = self.table.selectionModel().selectedIndexes()
         if not selected:
             return
         font, ok = QFontDialog.getFont(self.font(), self)
         if not ok:
             return
-        for i in selected:
-            i and i.setFont(font)
+        for index in selected:
+            self.model.setData(index, font, Qt.FontRole)
 
     def runInputDialog(self, title, c1Text, c2Text, opText,
                        outText, cell1, cell2, outCell):
         rows = []
         cols = []
-        for r in range(self.table.rowCount()):
+        for r in range(self.model.rowCount()):
             rows.append(str(r + 1))
-        for c in range(self.table.columnCount()):
+        for c in range(self.model.columnCount()):
             cols.append(chr(ord('A') + c))
         addDialog = QDialog(self)
         addDialog.setWindowTitle(title)
@@ -343,19 +359,17 @@ class SpreadSheet(QMainWindow):
         col_first = 0
         col_last = 0
         col_cur = 0
-        selected = self.table.selectedItems()
+        selected = self.table.selectionModel().selectedIndexes()
         if selected:
-            first = selected[0]
-            last = selected[-1]
-            row_first = self.table.row(first)
-            row_last = self.table.row(last)
-            col_first = self.table.column(first)
-            col_last = self.table.column(last)
-
-        current = self.table.currentItem()
-        if current:
-            row_cur = self.table.row(current)
-            col_cur = self.table.column(current)
+            row_first = min(index.row() for index in selected)
+            row_last = max(index.row() for index in selected)
+            col_first = min(index.column() for index in selected)
+            col_last = max(index.column() for index in selected)
+
+        current = self.table.currentIndex()
+        if current.isValid():
+            row_cur = current.row()
+            col_cur = current.column()
 
         cell1 = encode_pos(row_first, col_first)
         cell2 = encode_pos(row_last, col_last)
@@ -365,20 +379,20 @@ class SpreadSheet(QMainWindow):
                 cell1, cell2, out)
         if ok:
             row, col = decode_pos(out)
-            self.table.item(row, col).setText("sum %s %s" % (cell1, cell2))
+            self.model.setData(self.model.index(row, col), "sum %s %s" % (cell1, cell2))
 
     def actionMath_helper(self, title, op):
         cell1 = "C1"
         cell2 = "C2"
         out = "C3"
-        current = self.table.currentItem()
-        if current:
-            out = encode_pos(self.table.currentRow(), self.table.currentColumn())
+        current = self.table.currentIndex()
+        if current.isValid():
+            out = encode_pos(current.row(), current.column())
         ok, cell1, cell2, out = self.runInputDialog(title, "Cell 1", "Cell 2",
                 op, "Output to:", cell1, cell2, out)
         if ok:
             row, col = decode_pos(out)
-            self.table.item(row, col).setText("%s %s %s" % (op, cell1, cell2))
+            self.model.setData(self.model.index(row, col), "%s %s %s" % (op, cell1, cell2))
 
     def actionAdd(self):
         self.actionMath_helper("Addition", "+")
@@ -393,8 +407,8 @@ class SpreadSheet(QMainWindow):
         self.actionMath_helper("Division", "/")
 
     def clear(self):
-        for i in self.table.selectedItems():
-            i.setText("")
+        for index in self.table.selectionModel().selectedIndexes():
+            self.model.setData(index, "")
 
     def setupContextMenu(self):
         self.addAction(self.cell_addAction)
@@ -409,101 +423,100 @@ class SpreadSheet(QMainWindow):
         self.addAction(self.clearAction)
         self.setContextMenuPolicy(Qt.ActionsContextMenu)
 
+    def setCell(self, row, col, value, role=Qt.EditRole):
+        self.model.setData(self.model.index(row, col), value, role)
+
     def setupContents(self):
         titleBackground = QColor(Qt.lightGray)
         titleFont = self.table.font()
         titleFont.setBold(True)
         # column 0
-        self.table.setItem(0, 0, SpreadSheetItem("Item"))
-        self.table.item(0, 0).setBackground(titleBackground)
-        self.table.item(0, 0).setToolTip("This column shows the purchased item/service")
-        self.table.item(0, 0).setFont(titleFont)
-        self.table.setItem(1, 0, SpreadSheetItem("AirportBus"))
-        self.table.setItem(2, 0, SpreadSheetItem("Flight (Munich)"))
-        self.table.setItem(3, 0, SpreadSheetItem("Lunch"))
-        self.table.setItem(4, 0, SpreadSheetItem("Flight (LA)"))
-        self.table.setItem(5, 0, SpreadSheetItem("Taxi"))
-        self.table.setItem(6, 0, SpreadSheetItem("Dinner"))
-        self.table.setItem(7, 0, SpreadSheetItem("Hotel"))
-        self.table.setItem(8, 0, SpreadSheetItem("Flight (Oslo)"))
-        self.table.setItem(9, 0, SpreadSheetItem("Total:"))
-        self.table.item(9, 0).setFont(titleFont)
-        self.table.item(9, 0).setBackground(Qt.lightGray)
+        self.setCell(0, 0, "Item")
+        self.setCell(0, 0, QBrush(titleBackground), Qt.BackgroundRole)
+        self.setCell(0, 0, "This column shows the purchased item/service", Qt.ToolTipRole)
+        self.setCell(0, 0, titleFont, Qt.FontRole)
+        self.setCell(1, 0, "AirportBus")
+        self.setCell(2, 0, "Flight (Munich)")
+        self.setCell(3, 0, "Lunch")
+        self.setCell(4, 0, "Flight (LA)")
+        self.setCell(5, 0, "Taxi")
+        self.setCell(6, 0, "Dinner")
+        self.setCell(7, 0, "Hotel")
+        self.setCell(8, 0, "Flight (Oslo)")
+        self.setCell(9, 0, "Total:")
+        self.setCell(9, 0, titleFont, Qt.FontRole)
+        self.setCell(9, 0, QBrush(Qt.lightGray), Qt.BackgroundRole)
         # column 1
-        self.table.setItem(0, 1, SpreadSheetItem("Date"))
-        self.table.item(0, 1).setBackground(titleBackground)
-        self.table.item(0, 1).setToolTip("This column shows the purchase date, double click to change")
-        self.table.item(0, 1).setFont(titleFont)
-        self.table.setItem(1, 1, SpreadSheetItem("15/6/2006"))
-        self.table.setItem(2, 1, SpreadSheetItem("15/6/2006"))
-        self.table.setItem(3, 1, SpreadSheetItem("15/6/2006"))
-        self.table.setItem(4, 1, SpreadSheetItem("21/5/2006"))
-        self.table.setItem(5, 1, SpreadSheetItem("16/6/2006"))
-        self.table.setItem(6, 1, SpreadSheetItem("16/6/2006"))
-        self.table.setItem(7, 1, SpreadSheetItem("16/6/2006"))
-        self.table.setItem(8, 1, SpreadSheetItem("18/6/2006"))
-        self.table.setItem(9, 1, SpreadSheetItem())
-        self.table.item(9, 1).setBackground(Qt.lightGray)
+        self.setCell(0, 1, "Date")
+        self.setCell(0, 1, QBrush(titleBackground), Qt.BackgroundRole)
+        self.setCell(0, 1, "This column shows the purchase date, double click to change", Qt.ToolTipRole)
+        self.setCell(0, 1, titleFont, Qt.FontRole)
+        self.setCell(1, 1, "15/6/2006")
+        self.setCell(2, 1, "15/6/2006")
+        self.setCell(3, 1, "15/6/2006")
+        self.setCell(4, 1, "21/5/2006")
+        self.setCell(5, 1, "16/6/2006")
+        self.setCell(6, 1, "16/6/2006")
+        self.setCell(7, 1, "16/6/2006")
+        self.setCell(8, 1, "18/6/2006")
+        self.setCell(9, 1, QBrush(Qt.lightGray), Qt.BackgroundRole)
         # column 2
-        self.table.setItem(0, 2, SpreadSheetItem("Price"))
-        self.table.item(0, 2).setBackground(titleBackground)
-        self.table.item(0, 2).setToolTip("This column shows the price of the purchase")
-        self.table.item(0, 2).setFont(titleFont)
-        self.table.setItem(1, 2, SpreadSheetItem("150"))
-        self.table.setItem(2, 2, SpreadSheetItem("2350"))
-        self.table.setItem(3, 2, SpreadSheetItem("-14"))
-        self.table.setItem(4, 2, SpreadSheetItem("980"))
-        self.table.setItem(5, 2, SpreadSheetItem("5"))
-        self.table.setItem(6, 2, SpreadSheetItem("120"))
-        self.table.setItem(7, 2, SpreadSheetItem("300"))
-        self.table.setItem(8, 2, SpreadSheetItem("1240"))
-        self.table.setItem(9, 2, SpreadSheetItem())
-        self.table.item(9, 2).setBackground(Qt.lightGray)
+        self.setCell(0, 2, "Price")
+        self.setCell(0, 2, QBrush(titleBackground), Qt.BackgroundRole)
+        self.setCell(0, 2, "This column shows the price of the purchase", Qt.ToolTipRole)
+        self.setCell(0, 2, titleFont, Qt.FontRole)
+        self.setCell(1, 2, "150")
+        self.setCell(2, 2, "2350")
+        self.setCell(3, 2, "-14")
+        self.setCell(4, 2, "980")
+        self.setCell(5, 2, "5")
+        self.setCell(6, 2, "120")
+        self.setCell(7, 2, "300")
+        self.setCell(8, 2, "1240")
+        self.setCell(9, 2, QBrush(Qt.lightGray), Qt.BackgroundRole)
         # column 3
-        self.table.setItem(0, 3, SpreadSheetItem("Currency"))
-        self.table.item(0, 3).setBackgroundColor(titleBackground)
-        self.table.item(0, 3).setToolTip("This column shows the currency")
-        self.table.item(0, 3).setFont(titleFont)
-        self.table.setItem(1, 3, SpreadSheetItem("NOK"))
-        self.table.setItem(2, 3, SpreadSheetItem("NOK"))
-        self.table.setItem(3, 3, SpreadSheetItem("EUR"))
-        self.table.setItem(4, 3, SpreadSheetItem("EUR"))
-        self.table.setItem(5, 3, SpreadSheetItem("USD"))
-        self.table.setItem(6, 3, SpreadSheetItem("USD"))
-        self.table.setItem(7, 3, SpreadSheetItem("USD"))
-        self.table.setItem(8, 3, SpreadSheetItem("USD"))
-        self.table.setItem(9, 3, SpreadSheetItem())
-        self.table.item(9,3).setBackground(Qt.lightGray)
+        self.setCell(0, 3, "Currency")
+        self.setCell(0, 3, QBrush(titleBackground), Qt.BackgroundRole)
+        self.setCell(0, 3, "This column shows the currency", Qt.ToolTipRole)
+        self.setCell(0, 3, titleFont, Qt.FontRole)
+        self.setCell(1, 3, "NOK")
+        self.setCell(2, 3, "NOK")
+        self.setCell(3, 3, "EUR")
+        self.setCell(4, 3, "EUR")
+        self.setCell(5, 3, "USD")
+        self.setCell(6, 3, "USD")
+        self.setCell(7, 3, "USD")
+        self.setCell(8, 3, "USD")
+        self.setCell(9, 3, QBrush(Qt.lightGray), Qt.BackgroundRole)
         # column 4
-        self.table.setItem(0, 4, SpreadSheetItem("Ex. Rate"))
-        self.table.item(0, 4).setBackground(titleBackground)
-        self.table.item(0, 4).setToolTip("This column shows the exchange rate to NOK")
-        self.table.item(0, 4).setFont(titleFont)
-        self.table.setItem(1, 4, SpreadSheetItem("1"))
-        self.table.setItem(2, 4, SpreadSheetItem("1"))
-        self.table.setItem(3, 4, SpreadSheetItem("8"))
-        self.table.setItem(4, 4, SpreadSheetItem("8"))
-        self.table.setItem(5, 4, SpreadSheetItem("7"))
-        self.table.setItem(6, 4, SpreadSheetItem("7"))
-        self.table.setItem(7, 4, SpreadSheetItem("7"))
-        self.table.setItem(8, 4, SpreadSheetItem("7"))
-        self.table.setItem(9, 4, SpreadSheetItem())
-        self.table.item(9,4).setBackground(Qt.lightGray)
+        self.setCell(0, 4, "Ex. Rate")
+        self.setCell(0, 4, QBrush(titleBackground), Qt.BackgroundRole)
+        self.setCell(0, 4, "This column shows the exchange rate to NOK", Qt.ToolTipRole)
+        self.setCell(0, 4, titleFont, Qt.FontRole)
+        self.setCell(1, 4, "1")
+        self.setCell(2, 4, "1")
+        self.setCell(3, 4, "8")
+        self.setCell(4, 4, "8")
+        self.setCell(5, 4, "7")
+        self.setCell(6, 4, "7")
+        self.setCell(7, 4, "7")
+        self.setCell(8, 4, "7")
+        self.setCell(9, 4, QBrush(Qt.lightGray), Qt.BackgroundRole)
         # column 5
-        self.table.setItem(0, 5, SpreadSheetItem("NOK"))
-        self.table.item(0, 5).setBackground(titleBackground)
-        self.table.item(0, 5).setToolTip("This column shows the expenses in NOK")
-        self.table.item(0, 5).setFont(titleFont)
-        self.table.setItem(1, 5, SpreadSheetItem("* C2 E2"))
-        self.table.setItem(2, 5, SpreadSheetItem("* C3 E3"))
-        self.table.setItem(3, 5, SpreadSheetItem("* C4 E4"))
-        self.table.setItem(4, 5, SpreadSheetItem("* C5 E5"))
-        self.table.setItem(5, 5, SpreadSheetItem("* C6 E6"))
-        self.table.setItem(6, 5, SpreadSheetItem("* C7 E7"))
-        self.table.setItem(7, 5, SpreadSheetItem("* C8 E8"))
-        self.table.setItem(8, 5, SpreadSheetItem("* C9 E9"))
-        self.table.setItem(9, 5, SpreadSheetItem("sum F2 F9"))
-        self.table.item(9,5).setBackground(Qt.lightGray)
+        self.setCell(0, 5, "NOK")
+        self.setCell(0, 5, QBrush(titleBackground), Qt.BackgroundRole)
+        self.setCell(0, 5, "This column shows the expenses in NOK", Qt.ToolTipRole)
+        self.setCell(0, 5, titleFont, Qt.FontRole)
+        self.setCell(1, 5, "* C2 E2")
+        self.setCell(2, 5, "* C3 E3")
+        self.setCell(3, 5, "* C4 E4")
+        self.setCell(4, 5, "* C5 E5")
+        self.setCell(5, 5, "* C6 E6")
+        self.setCell(6, 5, "* C7 E7")
+        self.setCell(7, 5, "* C8 E8")
+        self.setCell(8, 5, "* C9 E9")
+        self.setCell(9, 5, "sum F2 F9")
+        self.setCell(9, 5, QBrush(Qt.lightGray), Qt.BackgroundRole)
 
     def showAbout(self):
         QMessageBox.about(self, "About Spreadsheet", """
@@ -536,7 +549,11 @@ if __name__ == '__main__':
     import sys
 
     app = QApplication(sys.argv)
-    sheet = SpreadSheet(10, 6)
+    if '--columnar' in sys.argv:
+        # A million rows, kept in NumPy arrays.
+        sheet = SpreadSheet(1000000, 6, columnar=True)
+    else:
+        sheet = SpreadSheet(10, 6)
     sheet.setWindowIcon(QIcon(QPixmap(":/images/interview.png")))
     sheet.resize(640, 420)
     sheet.show()
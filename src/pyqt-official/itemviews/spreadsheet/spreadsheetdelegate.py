@@ -43,6 +43,10 @@ from PyQt5.QtWidgets import QCompleter, QDateTimeEdit, QItemDelegate, QLineEdit
 
 class SpreadSheetDelegate(QItemDelegate):
 
+    # The completer offers the strings of at most this many rows, so that
+    # opening an editor stays quick on a large sheet.
+    MaxCompletionRows = 10000
+
     def __init__(self, parent = None):
         super(SpreadSheetDelegate, self).__init__(parent)
 
@@ -54,14 +58,16 @@ class SpreadSheetDelegate(QItemDelegate):
             return editor
 
         editor = QLineEdit(parent)
-        # create a completer with the strings in the column as model
-        allStrings = []
-        for i in range(1, index.model().rowCount()):
-            strItem = index.model().data(index.sibling(i, index.column()), Qt.EditRole)
-            if strItem not in allStrings:
-                allStrings.append(strItem)
+        # create a completer with the distinct strings in the column, below
+        # the header row
+        model = index.model()
+        rowCount = min(model.rowCount(), 1 + self.MaxCompletionRows)
+        allStrings = dict.fromkeys(
+                model.data(index.sibling(i, index.column()), Qt.EditRole)
+                for i in range(1, rowCount))
+        allStrings.pop(None, None)
 
-        autoComplete = QCompleter(allStrings)
+        autoComplete = QCompleter(list(allStrings), editor)
         editor.setCompleter(autoComplete)
         editor.editingFinished.connect(self.commitAndCloseEditor)
         return editor
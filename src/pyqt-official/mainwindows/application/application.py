@@ -42,12 +42,16 @@
 #############################################################################
 
 
-from PyQt5.QtCore import (QFile, QFileInfo, QPoint, QRect, QSettings, QSize,
-        Qt, QTextStream)
+import os
+
+from PyQt5.QtCore import (QFileInfo, QPoint, QRect, QSettings, QSize,
+        QStandardPaths, Qt)
 from PyQt5.QtGui import QIcon, QKeySequence
 from PyQt5.QtWidgets import (QAction, QApplication, QFileDialog, QMainWindow,
         QMessageBox, QTextEdit)
 
+from documentio import AutosaveJournal, FileWorker
+
 
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -69,8 +73,27 @@ class MainWindow(QMainWindow):
 
         self.setCurrentFile('')
 
+        # Files are read and written on a background thread, and the changes
+        # since the last save are journaled so that they survive a crash.
+        self.saving = None
+        self.worker = FileWorker(self)
+        self.worker.opened.connect(self.fileLoaded)
+        self.worker.openFailed.connect(self.loadFailed)
+        self.worker.saved.connect(self.fileSaved)
+        self.worker.saveFailed.connect(self.saveFailed)
+
+        journalPath = os.path.join(
+                QStandardPaths.writableLocation(
+                        QStandardPaths.GenericDataLocation),
+                "Trolltech", "Application Example", "autosave.journal")
+        self.journal = AutosaveJournal(self.textEdit.document(), journalPath,
+                self.worker, self)
+        self.recoverJournal()
+
     def closeEvent(self, event):
         if self.maybeSave():
+            self.journal.stop()
+            self.worker.wait()
             self.writeSettings()
             event.accept()
         else:
@@ -78,8 +101,10 @@ class MainWindow(QMainWindow):
 
     def newFile(self):
         if self.maybeSave():
+            self.journal.stop()
             self.textEdit.clear()
             self.setCurrentFile('')
+            self.journal.start(None)
 
     def open(self):
         if self.maybeSave():
@@ -214,44 +239,72 @@ class MainWindow(QMainWindow):
                     QMessageBox.Save | QMessageBox.Discard | QMessageBox.Cancel)
 
             if ret == QMessageBox.Save:
-                return self.save()
+                # Wait for the file to be written.
+                return self.save() and self.saving.result() is None
 
             if ret == QMessageBox.Cancel:
                 return False
 
         return True
 
+    def recoverJournal(self):
+        if (self.journal.exists() and not self.journal.isStale() and
+                QMessageBox.question(self, "Application",
+                        "The application did not exit normally.\nDo you "
+                        "want to recover your unsaved changes?") == QMessageBox.Yes):
+            fileName = self.journal.recover()
+            self.setCurrentFile(fileName or '')
+            self.textEdit.document().setModified(True)
+            self.setWindowModified(True)
+            self.journal.start(fileName, self.textEdit.toPlainText())
+        else:
+            self.journal.start(None)
+
     def loadFile(self, fileName):
-        file = QFile(fileName)
-        if not file.open(QFile.ReadOnly | QFile.Text):
-            QMessageBox.warning(self, "Application",
-                    "Cannot read file %s:\n%s." % (fileName, file.errorString()))
-            return
-
-        inf = QTextStream(file)
-        QApplication.setOverrideCursor(Qt.WaitCursor)
-        self.textEdit.setPlainText(inf.readAll())
+        QApplication.setOverrideCursor(Qt.BusyCursor)
+        self.statusBar().showMessage("Loading...")
+        self.worker.open(fileName)
+
+    def fileLoaded(self, fileName, text):
         QApplication.restoreOverrideCursor()
 
+        self.journal.stop()
+        self.textEdit.setPlainText(text)
         self.setCurrentFile(fileName)
+        self.journal.start(fileName)
         self.statusBar().showMessage("File loaded", 2000)
 
-    def saveFile(self, fileName):
-        file = QFile(fileName)
-        if not file.open(QFile.WriteOnly | QFile.Text):
-            QMessageBox.warning(self, "Application",
-                    "Cannot write file %s:\n%s." % (fileName, file.errorString()))
-            return False
-
-        outf = QTextStream(file)
-        QApplication.setOverrideCursor(Qt.WaitCursor)
-        outf << self.textEdit.toPlainText()
+    def loadFailed(self, fileName, message):
         QApplication.restoreOverrideCursor()
+        self.statusBar().clearMessage()
+        QMessageBox.warning(self, "Application",
+                "Cannot read file %s:\n%s." % (fileName, message))
 
-        self.setCurrentFile(fileName);
-        self.statusBar().showMessage("File saved", 2000)
+    def saveFile(self, fileName):
+        # The document is written in the background. Changes made meanwhile
+        # mark it as modified again.
+        self.saving = self.journal.save(fileName, self.textEdit.toPlainText())
+
+        self.textEdit.document().setModified(False)
+        self.setWindowModified(False)
+        self.statusBar().showMessage("Saving...")
         return True
 
+    def fileSaved(self, fileName):
+        # Only now that the file is written is it the current file.
+        modified = self.textEdit.document().isModified()
+        self.setCurrentFile(fileName)
+        self.textEdit.document().setModified(modified)
+        self.setWindowModified(modified)
+        self.statusBar().showMessage("File saved", 2000)
+
+    def saveFailed(self, fileName, message):
+        self.textEdit.document().setModified(True)
+        self.setWindowModified(True)
+        self.statusBar().clearMessage()
+        QMessageBox.warning(self, "Application",
+                "Cannot write file %s:\n%s." % (fileName, message))
+
     def setCurrentFile(self, fileName):
         self.curFile = fileName
         self.textEdit.document().setModified(False)
@@ -0,0 +1,339 @@
+#!/usr/bin/env python
+
+
+#############################################################################
+##
+## Copyright (C) 2014 Riverbank Computing Limited.
+## Copyright (C) 2010 Nokia Corporation and/or its subsidiary(-ies).
+## All rights reserved.
+##
+## This file is part of the examples of PyQt.
+##
+## $QT_BEGIN_LICENSE:BSD$
+## You may use this file under the terms of the BSD license as follows:
+##
+## "Redistribution and use in source and binary forms, with or without
+## modification, are permitted provided that the following conditions are
+## met:
+##   * Redistributions of source code must retain the above copyright
+##     notice, this list of conditions and the following disclaimer.
+##   * Redistributions in binary form must reproduce the above copyright
+##     notice, this list of conditions and the following disclaimer in
+##     the documentation and/or other materials provided with the
+##     distribution.
+##   * Neither the name of Nokia Corporation and its Subsidiary(-ies) nor
+##     the names of its contributors may be used to endorse or promote
+##     products derived from this software without specific prior written
+##     permission.
+##
+## THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+## "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+## LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+## A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+## OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+## SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+## LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+## DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+## THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+## (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+## OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE."
+## $QT_END_LICENSE$
+##
+#############################################################################
+
+
+"""Background file I/O and an autosave journal for the application example.
+
+A FileWorker reads and writes files on a background thread, so saving a large
+document doesn't block the GUI. A file is written to a temporary file next to
+it first, which is then renamed over it, so a crash while saving never leaves
+a half-written file behind.
+
+An AutosaveJournal keeps the changes since the last save on disk. It starts
+with a snapshot, which usually is just the name of the file as it was opened
+or saved, and then every few seconds appends the changes that
+QTextDocument.contentsChange reported since. So autosaving only writes what
+changed, however large the document is. After a crash the journal is replayed
+on top of the snapshot.
+"""
+
+
+import json
+import os
+import stat
+import tempfile
+
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+from PyQt5.QtGui import QTextCursor
+
+
+def writeAtomically(fileName, text):
+    directory = os.path.dirname(os.path.abspath(fileName))
+    fd, tempName = tempfile.mkstemp(dir=directory,
+            prefix='.' + os.path.basename(fileName))
+
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+
+        # mkstemp() creates the file with mode 0600.
+        os.chmod(tempName, fileMode(fileName))
+        os.replace(tempName, fileName)
+    except BaseException:
+        os.unlink(tempName)
+        raise
+
+
+def fileMode(fileName):
+    """Returns the permissions for writing fileName: those of the existing
+    file, or the default ones for a new file.
+    """
+
+    try:
+        return stat.S_IMODE(os.stat(fileName).st_mode)
+    except FileNotFoundError:
+        return 0o666 & ~_umask
+
+
+def _readUmask():
+    # The umask can only be read by setting it. This is done once, on import,
+    # rather than while other threads may be creating files.
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+_umask = _readUmask()
+
+
+class FileWorker(QObject):
+    # These are emitted on the background thread, and delivered on the GUI
+    # thread.
+    opened = pyqtSignal(str, str)
+    openFailed = pyqtSignal(str, str)
+    saved = pyqtSignal(str)
+    saveFailed = pyqtSignal(str, str)
+
+    def __init__(self, parent=None):
+        super(FileWorker, self).__init__(parent)
+
+        # One thread, so that the tasks run in the order they are submitted.
+        self.pool = ThreadPoolExecutor(1)
+
+    def open(self, fileName):
+        self.pool.submit(self.readFile, fileName)
+
+    def save(self, fileName, text, then=None):
+        """Writes text to fileName in the background, and then calls
+        then(fileName) on the background thread. Returns a future whose result
+        is None, or an error message.
+        """
+
+        return self.pool.submit(self.writeFile, fileName, text, then)
+
+    def submit(self, function, *args):
+        return self.pool.submit(function, *args)
+
+    def wait(self):
+        self.pool.submit(lambda: None).result()
+
+    def readFile(self, fileName):
+        try:
+            with open(fileName) as f:
+                text = f.read()
+        except (OSError, UnicodeDecodeError) as e:
+            self.openFailed.emit(fileName, str(e))
+        else:
+            self.opened.emit(fileName, text)
+
+    def writeFile(self, fileName, text, then):
+        try:
+            writeAtomically(fileName, text)
+        except (OSError, UnicodeEncodeError) as e:
+            self.saveFailed.emit(fileName, str(e))
+            return str(e)
+
+        if then is not None:
+            then(fileName)
+
+        self.saved.emit(fileName)
+
+
+class AutosaveJournal(QObject):
+    # How often the changes are appended to the journal, in milliseconds.
+    Interval = 5000
+
+    # When more characters than this have changed, the journal is started
+    # again with a snapshot of the whole text.
+    MaxChanges = 4 * 1024 * 1024
+
+    def __init__(self, document, path, worker, parent=None):
+        super(AutosaveJournal, self).__init__(parent)
+
+        self.path = path
+        self.document = document
+        self.worker = worker
+        self.changes = []
+        self.changedCount = 0
+        # The file that the snapshot refers to. It is only used on the
+        # background thread, so that it changes along with the journal.
+        self.fileName = None
+        self.recording = False
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.flush)
+
+    def start(self, fileName, text=None):
+        """Starts a new journal on top of fileName as it is on disk, or on top
+        of text if the document isn't the same as the file.
+        """
+
+        self.discardChanges()
+        self.worker.submit(self.writeSnapshot, fileName, text)
+
+        if not self.recording:
+            self.document.contentsChange.connect(self.recordChange)
+            self.recording = True
+            self.timer.start(self.Interval)
+
+    def stop(self):
+        """Stops recording and deletes the journal."""
+
+        if self.recording:
+            self.document.contentsChange.disconnect(self.recordChange)
+            self.recording = False
+            self.timer.stop()
+
+        self.discardChanges()
+        self.worker.submit(self.remove)
+
+    def save(self, fileName, text):
+        # Once the file is written, it is the new snapshot. Until then, the
+        # journal must have all the changes, in case the save fails.
+        self.flush()
+
+        return self.worker.save(fileName, text, self.writeSnapshot)
+
+    def flush(self):
+        if self.changedCount > self.MaxChanges:
+            # Replaying the changes would take longer than loading the text.
+            self.discardChanges()
+            self.worker.submit(self.writeTextSnapshot,
+                    self.document.toPlainText())
+        elif self.changes:
+            changes = self.changes
+            self.changes = []
+            self.worker.submit(self.append, changes)
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def isStale(self):
+        # The journal can't be replayed when the file it was started on has
+        # changed since.
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                header = json.loads(f.readline())
+        except (OSError, ValueError):
+            return True
+
+        if 'text' in header or header['fileName'] is None:
+            return False
+
+        try:
+            stat = os.stat(header['fileName'])
+        except OSError:
+            return True
+
+        return [stat.st_size, stat.st_mtime_ns] != header['stat']
+
+    def recover(self):
+        """Replays the journal into the document, and returns the name of
+        the file the changes were made to, or None.
+        """
+
+        with open(self.path, encoding='utf-8') as f:
+            header = json.loads(f.readline())
+            if 'text' in header:
+                text = header['text']
+            elif header['fileName'] is None:
+                text = ''
+            else:
+                with open(header['fileName']) as documentFile:
+                    text = documentFile.read()
+
+            self.document.setPlainText(text)
+            cursor = QTextCursor(self.document)
+            end = self.document.characterCount() - 1
+
+            for line in f:
+                try:
+                    position, removed, added = json.loads(line)
+                except ValueError:
+                    # The line was cut short by the crash.
+                    break
+
+                # Some changes include the paragraph separator at the end of
+                # the document. Leave it out.
+                cursor.setPosition(min(position, end))
+                cursor.setPosition(min(position + removed, end),
+                        QTextCursor.KeepAnchor)
+                cursor.insertText(added)
+                end = self.document.characterCount() - 1
+
+        self.document.setModified(True)
+
+        return header['fileName']
+
+    def recordChange(self, position, removed, added):
+        text = ''
+        if added:
+            cursor = QTextCursor(self.document)
+            cursor.setPosition(position)
+            cursor.setPosition(
+                    min(position + added, self.document.characterCount() - 1),
+                    QTextCursor.KeepAnchor)
+            # selectedText() separates paragraphs with U+2029.
+            text = cursor.selectedText().replace('\u2029', '\n')
+
+        self.changes.append((position, removed, text))
+        self.changedCount += len(text) + 1
+
+    def discardChanges(self):
+        self.changes = []
+        self.changedCount = 0
+
+    # These run on the background thread.
+
+    def writeTextSnapshot(self, text):
+        self.writeSnapshot(self.fileName, text)
+
+    def writeSnapshot(self, fileName, text=None):
+        self.fileName = fileName
+
+        header = {'fileName': fileName}
+        if text is not None:
+            header['text'] = text
+        elif fileName is not None:
+            stat = os.stat(fileName)
+            header['stat'] = [stat.st_size, stat.st_mtime_ns]
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        writeAtomically(self.path, json.dumps(header) + '\n')
+
+    def append(self, changes):
+        lines = [json.dumps(change) + '\n' for change in changes]
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.writelines(lines)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
@@ -44,16 +44,20 @@
 #############################################################################
 
 
+import heapq
 import math
+from collections import OrderedDict
 
-from PyQt5.QtCore import (pyqtSignal, QBasicTimer, QObject, QPoint, QPointF,
-        QRect, QSize, QStandardPaths, Qt, QUrl)
+from PyQt5.QtCore import (pyqtSignal, QBasicTimer, QElapsedTimer, QObject,
+        QPoint, QPointF, QRect, QSize, QStandardPaths, Qt, QTimer, QUrl)
 from PyQt5.QtGui import (QColor, QDesktopServices, QImage, QPainter,
         QPainterPath, QPixmap, QRadialGradient)
 from PyQt5.QtWidgets import QAction, QApplication, QMainWindow, QWidget
 from PyQt5.QtNetwork import (QNetworkAccessManager, QNetworkDiskCache,
         QNetworkRequest)
 
+from tilestore import TILE_URL, openStore
+
 
 # how long (milliseconds) the user need to hold (after a tap on the screen)
 # before triggering the magnifying glass feature
@@ -68,6 +72,30 @@ MAX_MAGNIFIER = 229
 # tile size in pixels
 TDIM = 256
 
+# the highest zoom level served by tile.openstreetmap.org
+MAX_ZOOM = 19
+
+# how many tile requests are kept in flight at once; Qt opens at most six
+# connections per host, so more than that would only queue inside Qt
+MAX_CONNECTIONS = 6
+
+# how much memory the decoded tiles of all maps may use
+CACHE_SIZE_MB = 64
+
+# how long (milliseconds) to spend decoding tiles from an offline store before
+# letting the event loop paint; this keeps panning at 60 fps
+STORE_BUDGET = 8
+
+# how long (milliseconds) to wait before asking again for a tile that could
+# not be loaded; the delay doubles with every failure, up to RETRY_MAX
+RETRY_DELAY = 2000
+RETRY_MAX = 5 * 60 * 1000
+
+# download priorities: the visible tiles first, then the ring of tiles just
+# outside the viewport, then the tiles of the next zoom level (used by the
+# magnifier)
+VISIBLE, RING, NEXT_ZOOM = range(3)
+
 
 class Point(QPoint):
     """QPoint, that is fully qualified as a dict key"""
@@ -108,33 +136,214 @@ def latitudeFromTile(ty, zoom):
     return lng
 
 
+class PixmapCache(object):
+    """A least recently used cache of tile pixmaps bounded by their size in
+    bytes. Pixmaps are keyed by (zoom, x, y)."""
+
+    def __init__(self, maxBytes):
+        self.maxBytes = maxBytes
+        self.totalBytes = 0
+        self.pixmaps = OrderedDict()
+
+    def __contains__(self, key):
+        return key in self.pixmaps
+
+    def __len__(self):
+        return len(self.pixmaps)
+
+    def find(self, key):
+        pixmap = self.pixmaps.get(key)
+        if pixmap is not None:
+            self.pixmaps.move_to_end(key)
+        return pixmap
+
+    def insert(self, key, pixmap):
+        old = self.pixmaps.pop(key, None)
+        if old is not None:
+            self.totalBytes -= self.byteSize(old)
+
+        self.pixmaps[key] = pixmap
+        self.totalBytes += self.byteSize(pixmap)
+
+        while self.totalBytes > self.maxBytes and len(self.pixmaps) > 1:
+            _, evicted = self.pixmaps.popitem(last=False)
+            self.totalBytes -= self.byteSize(evicted)
+
+    @staticmethod
+    def byteSize(pixmap):
+        return pixmap.width() * pixmap.height() * pixmap.depth() // 8
+
+
+class TileLoader(QObject):
+    """Downloads tiles for any number of maps, keeping up to maxConnections
+    requests in flight. If an offline store (see tilestore.py) is given,
+    tiles are read from it first; if url is None, only the store is used.
+
+    Each map tells the loader which tiles it wants and how urgently through
+    setWanted(); the loader always starts the most urgent wanted tile that is
+    neither cached nor already being downloaded. Requests for tiles that no
+    map wants any more are aborted, so that panning quickly does not leave
+    the connections busy with tiles that have scrolled away.
+    """
+
+    tileLoaded = pyqtSignal(int, int, int)
+
+    def __init__(self, url=TILE_URL, maxConnections=MAX_CONNECTIONS,
+            cacheSize=CACHE_SIZE_MB * 1024 * 1024, store=None, parent=None):
+        super(TileLoader, self).__init__(parent)
+
+        self.url = url
+        self.store = store
+        self.maxConnections = maxConnections
+        self.cache = PixmapCache(cacheSize)
+        self._wanted = {}   # map to {(zoom, x, y): priority}
+        self._queue = []    # heap of (priority, (zoom, x, y))
+        self._inFlight = {} # (zoom, x, y) to QNetworkReply
+        self._failed = {}   # (zoom, x, y) to (retry time, delay)
+        self._scheduled = False
+        self._clock = QElapsedTimer()
+        self._clock.start()
+        self._retryTimer = QTimer(self)
+        self._retryTimer.setSingleShot(True)
+        self._retryTimer.timeout.connect(self.updateQueue)
+
+        self._manager = QNetworkAccessManager(self)
+        cache = QNetworkDiskCache(self)
+        cache.setCacheDirectory(
+            QStandardPaths.writableLocation(QStandardPaths.CacheLocation))
+        self._manager.setCache(cache)
+        self._manager.finished.connect(self.handleNetworkData)
+
+    def tile(self, key):
+        return self.cache.find(key)
+
+    def setWanted(self, owner, wanted):
+        """Replace the tiles wanted by owner with wanted, a dict mapping
+        (zoom, x, y) to a priority; lower priorities are downloaded first."""
+
+        self._wanted[owner] = wanted
+        self.updateQueue()
+
+    def updateQueue(self):
+        merged = {}
+        for tiles in self._wanted.values():
+            for key, priority in tiles.items():
+                if key not in merged or priority < merged[key]:
+                    merged[key] = priority
+
+        for key in list(self._inFlight):
+            if key not in merged:
+                self._inFlight.pop(key).abort()
+
+        # forget the failures of tiles nobody wants any more, so that they
+        # are tried again straight away if the map comes back to them
+        for key in list(self._failed):
+            if key not in merged:
+                del self._failed[key]
+
+        now = self._clock.elapsed()
+        self._queue = []
+        retryAt = None
+        for key, priority in merged.items():
+            if key in self.cache or key in self._inFlight:
+                continue
+            if key in self._failed and self._failed[key][0] > now:
+                if retryAt is None or self._failed[key][0] < retryAt:
+                    retryAt = self._failed[key][0]
+                continue
+            self._queue.append((priority, key))
+        heapq.heapify(self._queue)
+
+        # ask again for the failed tiles that are still wanted once the
+        # first of them is due
+        if retryAt is None:
+            self._retryTimer.stop()
+        else:
+            self._retryTimer.start(retryAt - now)
+
+        self.download()
+
+    # slots
+    def handleNetworkData(self, reply):
+        key = reply.request().attribute(QNetworkRequest.User)
+        reply.deleteLater()
+        if self._inFlight.get(key) is not reply:
+            # aborted because nobody wants it any more
+            return
+
+        del self._inFlight[key]
+        self.insertTile(key, None if reply.error() else reply.readAll())
+        self.download()
+
+    def insertTile(self, key, data):
+        img = QImage()
+        if data is not None and img.loadFromData(data):
+            self._failed.pop(key, None)
+            self.cache.insert(key, QPixmap.fromImage(img))
+            self.tileLoaded.emit(*key)
+        else:
+            # don't ask for it again and again, but back off rather than
+            # giving up, as the network may come back
+            _, delay = self._failed.get(key, (0, RETRY_DELAY // 2))
+            delay = min(2 * delay, RETRY_MAX)
+            self._failed[key] = (self._clock.elapsed() + delay, delay)
+            if not self._retryTimer.isActive() or \
+                    self._retryTimer.remainingTime() > delay:
+                self._retryTimer.start(delay)
+
+    def download(self):
+        self._scheduled = False
+        timer = QElapsedTimer()
+        timer.start()
+        while self._queue and len(self._inFlight) < self.maxConnections:
+            if timer.elapsed() > STORE_BUDGET:
+                # carry on once the event loop has painted the tiles so far
+                if not self._scheduled:
+                    self._scheduled = True
+                    QTimer.singleShot(0, self.download)
+                return
+
+            _, key = heapq.heappop(self._queue)
+            if key in self.cache or key in self._inFlight:
+                continue
+
+            zoom, x, y = key
+            if self.store is not None:
+                data = self.store.tile(zoom, x, y)
+                if data is not None or self.url is None:
+                    self.insertTile(key, data)
+                    continue
+
+            request = QNetworkRequest()
+            request.setUrl(QUrl(self.url.format(z=zoom, x=x, y=y)))
+            request.setRawHeader(b'User-Agent', b'Nokia (PyQt) Graphics Dojo 1.0')
+            request.setAttribute(QNetworkRequest.User, key)
+            self._inFlight[key] = self._manager.get(request)
+
+
 class SlippyMap(QObject):
 
     updated = pyqtSignal(QRect)
 
-    def __init__(self, parent=None):
+    def __init__(self, loader, parent=None):
         super(SlippyMap, self).__init__(parent)
 
         self._offset = QPoint()
         self._tilesRect = QRect()
-        self._tilePixmaps = {} # Point(x, y) to QPixmap mapping
-        self._manager = QNetworkAccessManager()
-        self._url = QUrl()
+        self._loader = loader
         # public vars
         self.width = 400
         self.height = 300
         self.zoom = 15
         self.latitude = 59.9138204
         self.longitude = 10.7387413
+        # whether to download the tiles around and below the visible ones
+        self.prefetch = True
 
         self._emptyTile = QPixmap(TDIM, TDIM)
         self._emptyTile.fill(Qt.lightGray)
 
-        cache = QNetworkDiskCache()
-        cache.setCacheDirectory(
-            QStandardPaths.writableLocation(QStandardPaths.CacheLocation))
-        self._manager.setCache(cache)
-        self._manager.finished.connect(self.handleNetworkData)
+        self._loader.tileLoaded.connect(self.handleTileLoaded)
 
     def invalidate(self):
         if self.width <= 0 or self.height <= 0:
@@ -149,8 +358,8 @@ class SlippyMap(QObject):
         yp = int(self.height / 2 - (ty - math.floor(ty)) * TDIM)
 
         # first tile vertical and horizontal
-        xa = (xp + TDIM - 1) / TDIM
-        ya = (yp + TDIM - 1) / TDIM
+        xa = (xp + TDIM - 1) // TDIM
+        ya = (yp + TDIM - 1) // TDIM
         xs = int(tx) - xa
         ys = int(ty) - ya
 
@@ -158,14 +367,13 @@ class SlippyMap(QObject):
         self._offset = QPoint(xp - xa * TDIM, yp - ya * TDIM)
 
         # last tile vertical and horizontal
-        xe = int(tx) + (self.width - xp - 1) / TDIM
-        ye = int(ty) + (self.height - yp - 1) / TDIM
+        xe = int(tx) + (self.width - xp - 1) // TDIM
+        ye = int(ty) + (self.height - yp - 1) // TDIM
 
         # build a rect
         self._tilesRect = QRect(xs, ys, xe - xs + 1, ye - ys + 1)
 
-        if self._url.isEmpty():
-            self.download()
+        self.download(tx, ty)
 
         self.updated.emit(QRect(0, 0, self.width, self.height))
 
@@ -175,7 +383,8 @@ class SlippyMap(QObject):
                 tp = Point(x + self._tilesRect.left(), y + self._tilesRect.top())
                 box = self.tileRect(tp)
                 if rect.intersects(box):
-                    p.drawPixmap(box, self._tilePixmaps.get(tp, self._emptyTile))
+                    pixmap = self._loader.tile((self.zoom, tp.x(), tp.y()))
+                    p.drawPixmap(box, pixmap or self._emptyTile)
    
     def pan(self, delta):
         dx = QPointF(delta) / float(TDIM)
@@ -185,43 +394,45 @@ class SlippyMap(QObject):
         self.invalidate()
 
     # slots
-    def handleNetworkData(self, reply):
-        img = QImage()
-        tp = Point(reply.request().attribute(QNetworkRequest.User))
-        url = reply.url()
-        if not reply.error():
-            if img.load(reply, None):
-                self._tilePixmaps[tp] = QPixmap.fromImage(img)
-        reply.deleteLater()
-        self.updated.emit(self.tileRect(tp))
-
-        # purge unused tiles
-        bound = self._tilesRect.adjusted(-2, -2, 2, 2)
-        for tp in list(self._tilePixmaps.keys()):
-            if not bound.contains(tp):
-                del self._tilePixmaps[tp]
-        self.download()
+    def handleTileLoaded(self, zoom, x, y):
+        tp = Point(x, y)
+        if zoom == self.zoom and self._tilesRect.contains(tp):
+            self.updated.emit(self.tileRect(tp))
+
+    def download(self, tx, ty):
+        """Ask for the visible tiles, the ring around them and the tiles of
+        the next zoom level, each group ordered by the distance of the tiles
+        from the centre (tx, ty) of the map."""
+
+        wanted = {}
+
+        def want(zoom, x, y, priority):
+            if 0 <= x < 1 << zoom and 0 <= y < 1 << zoom:
+                distance = (x + 0.5 - tx) ** 2 + (y + 0.5 - ty) ** 2
+                wanted.setdefault((zoom, x, y), (priority, distance))
+
+        rect = self._tilesRect
+        for x in range(rect.left(), rect.right() + 1):
+            for y in range(rect.top(), rect.bottom() + 1):
+                want(self.zoom, x, y, VISIBLE)
+
+        if not self.prefetch:
+            self._loader.setWanted(self, wanted)
+            return
 
-    def download(self):
-        grab = None
-        for x in range(self._tilesRect.width()):
-            for y in range(self._tilesRect.height()):
-                tp = Point(self._tilesRect.topLeft() + QPoint(x, y))
-                if tp not in self._tilePixmaps:
-                    grab = QPoint(tp)
-                    break
+        ring = rect.adjusted(-1, -1, 1, 1)
+        for x in range(ring.left(), ring.right() + 1):
+            for y in range(ring.top(), ring.bottom() + 1):
+                want(self.zoom, x, y, RING)
 
-        if grab is None:
-            self._url = QUrl()
-            return
+        if self.zoom < MAX_ZOOM:
+            tx *= 2
+            ty *= 2
+            for x in range(2 * rect.left(), 2 * rect.right() + 2):
+                for y in range(2 * rect.top(), 2 * rect.bottom() + 2):
+                    want(self.zoom + 1, x, y, NEXT_ZOOM)
 
-        path = 'http://tile.openstreetmap.org/%d/%d/%d.png' % (self.zoom, grab.x(), grab.y())
-        self._url = QUrl(path)
-        request = QNetworkRequest()
-        request.setUrl(self._url)
-        request.setRawHeader(b'User-Agent', b'Nokia (PyQt) Graphics Dojo 1.0')
-        request.setAttribute(QNetworkRequest.User, grab)
-        self._manager.get(request)
+        self._loader.setWanted(self, wanted)
 
     def tileRect(self, tp):
         t = tp - self._tilesRect.topLeft()
@@ -232,15 +443,19 @@ class SlippyMap(QObject):
 
 
 class LightMaps(QWidget):
-    def __init__(self, parent = None):
+    def __init__(self, parent = None, url=TILE_URL, store=None):
         super(LightMaps, self).__init__(parent)
 
         self.pressed = False
         self.snapped = False
         self.zoomed = False
         self.invert = False
-        self._normalMap = SlippyMap(self)
-        self._largeMap = SlippyMap(self)
+        # both maps share the loader, so that the tiles the normal map
+        # prefetches for the next zoom level are there for the magnifier
+        self._loader = TileLoader(url, store=store, parent=self)
+        self._normalMap = SlippyMap(self._loader, self)
+        self._largeMap = SlippyMap(self._loader, self)
+        self._largeMap.prefetch = False
         self.pressPos = QPoint()
         self.dragPos = QPoint()
         self.tapTimer = QBasicTimer()
@@ -428,10 +643,10 @@ class LightMaps(QWidget):
 
 
 class MapZoom(QMainWindow):
-    def __init__(self):
+    def __init__(self, url=TILE_URL, store=None):
         super(MapZoom, self).__init__(None)
 
-        self.map_ = LightMaps(self)
+        self.map_ = LightMaps(self, url, store)
         self.setCentralWidget(self.map_)
         self.map_.setFocus()
         self.osloAction = QAction("&Oslo", self)
@@ -473,9 +688,22 @@ if __name__ == '__main__':
 
     import sys
 
+    # eg. lightmaps.py http://localhost:8080/{z}/{x}/{y}.png
+    # or, to work offline, lightmaps.py oslo.mbtiles
+    # or, to fill in missing tiles from the network, lightmaps.py oslo.tiles URL
+    url = TILE_URL
+    store = None
+    for arg in sys.argv[1:]:
+        if '://' in arg:
+            url = arg
+        else:
+            store = openStore(arg)
+            if len(sys.argv) == 2:
+                url = None
+
     app = QApplication(sys.argv)
     app.setApplicationName('LightMaps')
-    w = MapZoom()
+    w = MapZoom(url, store)
     w.setWindowTitle("OpenStreetMap")
     w.resize(600, 450)
     w.show()
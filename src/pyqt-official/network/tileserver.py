@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+
+
+#############################################################################
+##
+## Copyright (C) 2013 Riverbank Computing Limited
+## All rights reserved.
+##
+## This file is part of the examples of PyQt.
+##
+## $QT_BEGIN_LICENSE:LGPL$
+## Commercial Usage
+## Licensees holding valid Qt Commercial licenses may use this file in
+## accordance with the Qt Commercial License Agreement provided with the
+## Software or, alternatively, in accordance with the terms contained in
+## a written agreement between you and Nokia.
+##
+## GNU Lesser General Public License Usage
+## Alternatively, this file may be used under the terms of the GNU Lesser
+## General Public License version 2.1 as published by the Free Software
+## Foundation and appearing in the file LICENSE.LGPL included in the
+## packaging of this file.  Please review the following information to
+## ensure the GNU Lesser General Public License version 2.1 requirements
+## will be met: http://www.gnu.org/licenses/old-licenses/lgpl-2.1.html.
+##
+## In addition, as a special exception, Nokia gives you certain additional
+## rights.  These rights are described in the Nokia Qt LGPL Exception
+## version 1.1, included in the file LGPL_EXCEPTION.txt in this package.
+##
+## GNU General Public License Usage
+## Alternatively, this file may be used under the terms of the GNU
+## General Public License version 3.0 as published by the Free Software
+## Foundation and appearing in the file LICENSE.GPL included in the
+## packaging of this file.  Please review the following information to
+## ensure the GNU General Public License version 3.0 requirements will be
+## met: http://www.gnu.org/copyleft/gpl.html.
+##
+## If you have questions regarding the use of this file, please contact
+## Nokia at qt-info@nokia.com.
+## $QT_END_LICENSE$
+##
+#############################################################################
+
+
+"""A stand-in for tile.openstreetmap.org that the lightmaps example can be
+tested against without a network:
+
+    python tileserver.py [port] [latency in milliseconds]
+    python lightmaps.py http://localhost:8080/{z}/{x}/{y}.png
+
+Every tile is a flat colour derived from its coordinates, with a darker
+border so that the tile grid is visible. The latency is added to every
+request to simulate the round trip to a real tile server.
+"""
+
+
+import re
+import struct
+import sys
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+TDIM = 256
+
+
+def png(width, height, rows):
+    """Encode rows of RGB bytes as a PNG image."""
+
+    def chunk(kind, data):
+        return (struct.pack('>I', len(data)) + kind + data +
+                struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff))
+
+    raw = b''.join(b'\x00' + row for row in rows)
+    return (b'\x89PNG\r\n\x1a\n' +
+            chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)) +
+            chunk(b'IDAT', zlib.compress(raw, 1)) +
+            chunk(b'IEND', b''))
+
+
+def tileImage(zoom, x, y):
+    color = bytes(((x * 53 + zoom * 31) % 200 + 40,
+                   (y * 97 + zoom * 17) % 200 + 40,
+                   (x * 11 + y * 7) % 200 + 40))
+    border = bytes(c // 2 for c in color)
+    edge = border * TDIM
+    inner = border + color * (TDIM - 2) + border
+    return png(TDIM, TDIM, [edge] + [inner] * (TDIM - 2) + [edge])
+
+
+class TileRequestHandler(BaseHTTPRequestHandler):
+
+    # keep connections open between tiles, like a real tile server
+    protocol_version = 'HTTP/1.1'
+
+    PATH = re.compile(r'^/(\d+)/(\d+)/(\d+)\.png$')
+
+    def do_GET(self):
+        self.server.countRequest()
+        match = self.PATH.match(self.path)
+        if match is None:
+            self.send_error(404)
+            return
+
+        zoom, x, y = map(int, match.groups())
+        if not (0 <= x < 1 << zoom and 0 <= y < 1 << zoom):
+            self.send_error(404)
+            return
+
+        time.sleep(self.server.latency)
+        body = tileImage(zoom, x, y)
+        try:
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/png')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # the viewer aborted the request because the tile scrolled away
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TileServer(ThreadingHTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self, address=('localhost', 8080), latency=0.0):
+        super(TileServer, self).__init__(address, TileRequestHandler)
+
+        self.latency = latency
+        self.numRequests = 0
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return 'http://%s:%d/{z}/{x}/{y}.png' % (host, port)
+
+    def countRequest(self):
+        with self._lock:
+            self.numRequests += 1
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+if __name__ == '__main__':
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8080
+    latency = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.0
+    server = TileServer(('localhost', port), latency)
+    print("Serving tiles at %s" % server.url)
+    server.serve_forever()
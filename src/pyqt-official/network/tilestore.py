@@ -0,0 +1,336 @@
+#!/usr/bin/env python
+
+
+#############################################################################
+##
+## Copyright (C) 2013 Riverbank Computing Limited
+## All rights reserved.
+##
+## This file is part of the examples of PyQt.
+##
+## $QT_BEGIN_LICENSE:LGPL$
+## Commercial Usage
+## Licensees holding valid Qt Commercial licenses may use this file in
+## accordance with the Qt Commercial License Agreement provided with the
+## Software or, alternatively, in accordance with the terms contained in
+## a written agreement between you and Nokia.
+##
+## GNU Lesser General Public License Usage
+## Alternatively, this file may be used under the terms of the GNU Lesser
+## General Public License version 2.1 as published by the Free Software
+## Foundation and appearing in the file LICENSE.LGPL included in the
+## packaging of this file.  Please review the following information to
+## ensure the GNU Lesser General Public License version 2.1 requirements
+## will be met: http://www.gnu.org/licenses/old-licenses/lgpl-2.1.html.
+##
+## In addition, as a special exception, Nokia gives you certain additional
+## rights.  These rights are described in the Nokia Qt LGPL Exception
+## version 1.1, included in the file LGPL_EXCEPTION.txt in this package.
+##
+## GNU General Public License Usage
+## Alternatively, this file may be used under the terms of the GNU
+## General Public License version 3.0 as published by the Free Software
+## Foundation and appearing in the file LICENSE.GPL included in the
+## packaging of this file.  Please review the following information to
+## ensure the GNU General Public License version 3.0 requirements will be
+## met: http://www.gnu.org/copyleft/gpl.html.
+##
+## If you have questions regarding the use of this file, please contact
+## Nokia at qt-info@nokia.com.
+## $QT_END_LICENSE$
+##
+#############################################################################
+
+
+"""Offline tile stores for the lightmaps example.
+
+Two formats are supported:
+
+ * MBTiles (*.mbtiles), the SQLite based format used by most map tools.
+ * Packed tile archives (*.tiles): the tile images are stored back to back,
+   followed by an index sorted by tile. The archive is memory mapped, so
+   looking up a tile is a binary search over the index and a slice of the
+   mapping, without any I/O calls.
+
+A store is filled for a region with the seed command, eg. for central Oslo:
+
+    python tilestore.py seed oslo.mbtiles 10.6,59.85,10.9,59.97 10-15
+    python tilestore.py pack oslo.mbtiles oslo.tiles
+    python lightmaps.py oslo.tiles
+"""
+
+
+import argparse
+import bisect
+import math
+import mmap
+import os
+import sqlite3
+import struct
+import sys
+import urllib.request
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+
+TILE_URL = 'http://tile.openstreetmap.org/{z}/{x}/{y}.png'
+
+USER_AGENT = 'Nokia (PyQt) Graphics Dojo 1.0'
+
+
+def tileKey(zoom, x, y):
+    """Pack a tile's coordinates into one integer that sorts by zoom, then x,
+    then y."""
+
+    return (zoom << 58) | (x << 29) | y
+
+
+def tileForCoordinate(lat, lng, zoom):
+    zn = float(1 << zoom)
+    tx = (lng + 180.0) / 360.0
+    ty = (1.0 - math.log(math.tan(lat * math.pi / 180.0) +
+          1.0 / math.cos(lat * math.pi / 180.0)) / math.pi) / 2.0
+
+    return tx * zn, ty * zn
+
+
+def tilesInBox(west, south, east, north, zoom):
+    """Yield the (x, y) of all tiles at zoom that cover the bounding box."""
+
+    last = (1 << zoom) - 1
+    x0, y0 = tileForCoordinate(north, west, zoom)
+    x1, y1 = tileForCoordinate(south, east, zoom)
+    for x in range(max(int(x0), 0), min(int(x1), last) + 1):
+        for y in range(max(int(y0), 0), min(int(y1), last) + 1):
+            yield x, y
+
+
+class MBTilesStore(object):
+    """Tiles in an MBTiles file. MBTiles numbers rows from the bottom (TMS),
+    whereas the map numbers them from the top, so rows are flipped."""
+
+    def __init__(self, path, writable=False):
+        if writable:
+            self._db = sqlite3.connect(path)
+            self._db.execute("CREATE TABLE IF NOT EXISTS metadata "
+                    "(name TEXT PRIMARY KEY, value TEXT)")
+            self._db.execute("CREATE TABLE IF NOT EXISTS tiles "
+                    "(zoom_level INTEGER, tile_column INTEGER, "
+                    "tile_row INTEGER, tile_data BLOB, "
+                    "PRIMARY KEY (zoom_level, tile_column, tile_row))")
+        else:
+            self._db = sqlite3.connect('file:%s?mode=ro' % path, uri=True)
+
+    def tile(self, zoom, x, y):
+        row = self._db.execute("SELECT tile_data FROM tiles WHERE "
+                "zoom_level = ? AND tile_column = ? AND tile_row = ?",
+                (zoom, x, (1 << zoom) - 1 - y)).fetchone()
+        return None if row is None else bytes(row[0])
+
+    def __contains__(self, key):
+        zoom, x, y = key
+        return self._db.execute("SELECT 1 FROM tiles WHERE "
+                "zoom_level = ? AND tile_column = ? AND tile_row = ?",
+                (zoom, x, (1 << zoom) - 1 - y)).fetchone() is not None
+
+    def tiles(self):
+        """Yield (zoom, x, y, data) for all tiles in the store."""
+
+        for zoom, x, row, data in self._db.execute("SELECT zoom_level, "
+                "tile_column, tile_row, tile_data FROM tiles"):
+            yield zoom, x, (1 << zoom) - 1 - row, bytes(data)
+
+    def insert(self, zoom, x, y, data):
+        self._db.execute("INSERT OR REPLACE INTO tiles VALUES (?, ?, ?, ?)",
+                (zoom, x, (1 << zoom) - 1 - y, sqlite3.Binary(data)))
+
+    def setMetadata(self, **values):
+        self._db.executemany("INSERT OR REPLACE INTO metadata VALUES (?, ?)",
+                [(name, str(value)) for name, value in values.items()])
+
+    def commit(self):
+        self._db.commit()
+
+    def close(self):
+        self._db.commit()
+        self._db.close()
+
+
+class PackedTileStore(object):
+    """Tiles in a memory mapped archive with the layout
+
+        magic | tile data ... | keys | offsets | lengths | count | index offset
+
+    keys are tileKey()s in ascending order, offsets and lengths locate the
+    data of each tile. All numbers are unsigned 64 bit little endian.
+    """
+
+    MAGIC = b'PQTILES1'
+    FOOTER = struct.Struct('<QQ')
+
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(self.MAGIC)] != self.MAGIC:
+            raise ValueError("%s is not a packed tile archive" % path)
+
+        count, indexOffset = self.FOOTER.unpack_from(self._map,
+                len(self._map) - self.FOOTER.size)
+        self._keys = self._column(indexOffset, count)
+        self._offsets = self._column(indexOffset + 8 * count, count)
+        self._lengths = self._column(indexOffset + 16 * count, count)
+
+    def _column(self, offset, count):
+        column = array('Q')
+        column.frombytes(self._map[offset:offset + 8 * count])
+        if sys.byteorder != 'little':
+            column.byteswap()
+        return column
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _find(self, zoom, x, y):
+        key = tileKey(zoom, x, y)
+        i = bisect.bisect_left(self._keys, key)
+        if i < len(self._keys) and self._keys[i] == key:
+            return i
+        return -1
+
+    def tile(self, zoom, x, y):
+        i = self._find(zoom, x, y)
+        if i < 0:
+            return None
+        offset = self._offsets[i]
+        return self._map[offset:offset + self._lengths[i]]
+
+    def __contains__(self, key):
+        return self._find(*key) >= 0
+
+    def tiles(self):
+        for i, key in enumerate(self._keys):
+            offset = self._offsets[i]
+            yield (key >> 58, (key >> 29) & 0x1fffffff, key & 0x1fffffff,
+                    self._map[offset:offset + self._lengths[i]])
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    @classmethod
+    def write(cls, path, tiles):
+        """Write the (zoom, x, y, data) tuples of tiles to a new archive."""
+
+        index = []
+        with open(path, 'wb') as f:
+            f.write(cls.MAGIC)
+            for zoom, x, y, data in tiles:
+                index.append((tileKey(zoom, x, y), f.tell(), len(data)))
+                f.write(data)
+
+            index.sort()
+            indexOffset = f.tell()
+            for column in zip(*index) if index else ((), (), ()):
+                column = array('Q', column)
+                if sys.byteorder != 'little':
+                    column.byteswap()
+                f.write(column.tobytes())
+            f.write(cls.FOOTER.pack(len(index), indexOffset))
+
+
+def openStore(path, writable=False):
+    """Open the store at path; its format is chosen by the file extension."""
+
+    if os.path.splitext(path)[1] == '.mbtiles':
+        return MBTilesStore(path, writable)
+    if writable:
+        raise ValueError("packed tile archives are read-only; seed an "
+                "MBTiles file and pack it")
+    return PackedTileStore(path)
+
+
+def download(url, zoom, x, y):
+    request = urllib.request.Request(url.format(z=zoom, x=x, y=y),
+            headers={'User-Agent': USER_AGENT})
+    try:
+        with urllib.request.urlopen(request, timeout=30) as reply:
+            return zoom, x, y, reply.read()
+    except OSError:
+        return zoom, x, y, None
+
+
+def seed(store, bbox, minZoom, maxZoom, url=TILE_URL, connections=6,
+        progress=None):
+    """Download the tiles of the bounding box (west, south, east, north) for
+    the zoom levels minZoom to maxZoom into store, skipping those it has
+    already. Returns the number of tiles downloaded and failed."""
+
+    missing = [(zoom, x, y) for zoom in range(minZoom, maxZoom + 1)
+            for x, y in tilesInBox(*bbox, zoom=zoom)
+            if (zoom, x, y) not in store]
+
+    downloaded = failed = 0
+    with ThreadPoolExecutor(connections) as pool:
+        replies = pool.map(lambda key: download(url, *key), missing)
+        for zoom, x, y, data in replies:
+            if data is None:
+                failed += 1
+                continue
+            store.insert(zoom, x, y, data)
+            downloaded += 1
+            # commit now and then, so that an interrupted seed keeps most of
+            # its work and can be resumed
+            if downloaded % 256 == 0:
+                store.commit()
+            if progress is not None:
+                progress(downloaded + failed, len(missing))
+
+    west, south, east, north = bbox
+    store.setMetadata(name='lightmaps', format='png',
+            bounds='%f,%f,%f,%f' % (west, south, east, north),
+            minzoom=minZoom, maxzoom=maxZoom)
+    store.commit()
+    return downloaded, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage offline tiles for "
+            "the lightmaps example.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    seedParser = commands.add_parser('seed', help="download the tiles of a "
+            "region into an MBTiles file")
+    seedParser.add_argument('store')
+    seedParser.add_argument('bbox', help="west,south,east,north in degrees")
+    seedParser.add_argument('zoom', help="a zoom level or a range like 10-15")
+    seedParser.add_argument('--url', default=TILE_URL)
+    seedParser.add_argument('--connections', type=int, default=6)
+
+    packParser = commands.add_parser('pack', help="convert a store to a "
+            "packed tile archive")
+    packParser.add_argument('source')
+    packParser.add_argument('archive')
+
+    args = parser.parse_args()
+
+    if args.command == 'seed':
+        bbox = tuple(float(v) for v in args.bbox.split(','))
+        zooms = args.zoom.split('-')
+        minZoom, maxZoom = int(zooms[0]), int(zooms[-1])
+
+        def progress(done, total):
+            sys.stderr.write("\r%d/%d tiles" % (done, total))
+
+        store = openStore(args.store, writable=True)
+        downloaded, failed = seed(store, bbox, minZoom, maxZoom, args.url,
+                args.connections, progress)
+        store.close()
+        print("\n%d tiles downloaded, %d failed" % (downloaded, failed))
+    else:
+        source = openStore(args.source)
+        PackedTileStore.write(args.archive, source.tiles())
+        source.close()
+
+
+if __name__ == '__main__':
+    main()
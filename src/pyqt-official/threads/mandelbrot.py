@@ -42,6 +42,12 @@
 #############################################################################
 
 
+from collections import OrderedDict
+from concurrent.futures import as_completed, ThreadPoolExecutor
+import os
+
+import numpy as np
+
 from PyQt5.QtCore import (pyqtSignal, QMutex, QMutexLocker, QPoint, QSize, Qt,
         QThread, QWaitCondition)
 from PyQt5.QtGui import QColor, QImage, QPainter, QPixmap, qRgb
@@ -57,8 +63,123 @@ ZoomOutFactor = 1 / ZoomInFactor
 ScrollStep = 20
 
 
+class Tile(object):
+    """The escape counts of one square tile of the image.
+
+    The points that had not escaped after maxIterations are kept together
+    with their current value of z, so that a later pass can carry on from
+    where this one stopped instead of starting from scratch.
+    """
+
+    def __init__(self, counts, maxIterations, index, z):
+        self.counts = counts
+        self.maxIterations = maxIterations
+        self.index = index
+        self.z = z
+
+    def isResolved(self):
+        return self.index.size == 0
+
+    def byteSize(self):
+        return self.counts.nbytes + self.index.nbytes + self.z.nbytes
+
+
+def computeTile(tileX, tileY, tileSize, scaleFactor, maxIterations, limit=4,
+        previous=None, cancelled=None):
+    """Compute a Tile of escape counts for the given position in the grid.
+
+    Pixel (x, y) of the grid is the point (x * scaleFactor, y * scaleFactor)
+    of the complex plane.  If a previous, shallower Tile is given, only its
+    unresolved points are iterated further.  Only the points that are still
+    iterating are kept in the working arrays, so the cost of a step shrinks
+    as points escape.  Returns None if the computation was cancelled.
+    """
+
+    xs = np.arange(tileX * tileSize, (tileX + 1) * tileSize) * scaleFactor
+    ys = np.arange(tileY * tileSize, (tileY + 1) * tileSize) * scaleFactor
+    c = (xs[np.newaxis, :] + 1j * ys[:, np.newaxis]).ravel()
+
+    if previous is None:
+        counts = np.empty(c.size, dtype=np.int32)
+        index = np.arange(c.size, dtype=np.int32)
+        z = c.copy()
+        first = 1
+    else:
+        counts = previous.counts.ravel().copy()
+        index = previous.index
+        z = previous.z.copy()
+        c = c[index]
+        first = previous.maxIterations + 1
+
+    counts[index] = maxIterations
+    limitSquared = limit * limit
+
+    for i in range(first, maxIterations + 1):
+        z *= z
+        z += c
+        escaped = (z.real * z.real + z.imag * z.imag) >= limitSquared
+
+        if escaped.any():
+            counts[index[escaped]] = i
+            remaining = ~escaped
+            z = z[remaining]
+            c = c[remaining]
+            index = index[remaining]
+            if index.size == 0:
+                break
+
+        if cancelled is not None and i % 64 == 0 and cancelled():
+            return None
+
+    return Tile(counts.reshape(tileSize, tileSize), maxIterations, index, z)
+
+
+class TileCache(object):
+    """A least recently used cache of Tiles bounded by their size in bytes.
+
+    Tiles are keyed by (scale, tile x, tile y); each Tile records the number
+    of iterations it was computed with, and a deeper Tile replaces a
+    shallower one for the same key.
+    """
+
+    def __init__(self, maxBytes):
+        self.maxBytes = maxBytes
+        self.totalBytes = 0
+        self.tiles = OrderedDict()
+
+    def find(self, key):
+        tile = self.tiles.get(key)
+        if tile is not None:
+            self.tiles.move_to_end(key)
+        return tile
+
+    def insert(self, key, tile):
+        old = self.tiles.pop(key, None)
+        if old is not None:
+            self.totalBytes -= old.byteSize()
+
+        self.tiles[key] = tile
+        self.totalBytes += tile.byteSize()
+
+        while self.totalBytes > self.maxBytes and len(self.tiles) > 1:
+            _, evicted = self.tiles.popitem(last=False)
+            self.totalBytes -= evicted.byteSize()
+
+
+def imageArray(image):
+    """Return a writable (height, width) uint32 view of an RGB32 image."""
+
+    ptr = image.bits()
+    ptr.setsize(image.sizeInBytes())
+    pixels = np.frombuffer(ptr, dtype=np.uint32)
+    pixels = pixels.reshape(image.height(), image.bytesPerLine() // 4)
+    return pixels[:, :image.width()]
+
+
 class RenderThread(QThread):
     ColormapSize = 512
+    TileSize = 128
+    CacheSizeMB = 64
 
     renderedImage = pyqtSignal(QImage, float)
 
@@ -71,13 +192,20 @@ class RenderThread(QThread):
         self.centerY = 0.0
         self.scaleFactor = 0.0
         self.resultSize = QSize()
-        self.colormap = []
 
         self.restart = False
         self.abort = False
+        self.generation = 0
+
+        self.colormap = np.array([self.rgbFromWaveLength(380.0 + (i * 400.0 / RenderThread.ColormapSize))
+                for i in range(RenderThread.ColormapSize)], dtype=np.uint32)
+
+        # Only touched by the render thread itself.
+        self.cache = TileCache(RenderThread.CacheSizeMB * 1024 * 1024)
 
-        for i in range(RenderThread.ColormapSize):
-            self.colormap.append(self.rgbFromWaveLength(380.0 + (i * 400.0 / RenderThread.ColormapSize)))
+        # The NumPy kernels release the GIL, so a thread pool keeps every
+        # core busy without having to copy tiles between processes.
+        self.pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 1)
 
     def __del__(self):
         self.mutex.lock()
@@ -86,6 +214,7 @@ class RenderThread(QThread):
         self.mutex.unlock()
 
         self.wait()
+        self.pool.shutdown(wait=True)
 
     def render(self, centerX, centerY, scaleFactor, resultSize):
         locker = QMutexLocker(self.mutex)
@@ -94,6 +223,7 @@ class RenderThread(QThread):
         self.centerY = centerY
         self.scaleFactor = scaleFactor
         self.resultSize = resultSize
+        self.generation += 1
 
         if not self.isRunning():
             self.start(QThread.LowPriority)
@@ -110,61 +240,38 @@ class RenderThread(QThread):
             centerY = self.centerY
             self.mutex.unlock()
 
-            halfWidth = resultSize.width() // 2
-            halfHeight = resultSize.height() // 2
+            # Snap the view to a grid of whole pixels at this scale, so that
+            # panning by whole pixels hits the same tiles as before.
+            originX = int(round(centerX / scaleFactor)) - resultSize.width() // 2
+            originY = int(round(centerY / scaleFactor)) - resultSize.height() // 2
             image = QImage(resultSize, QImage.Format_RGB32)
 
             NumPasses = 8
             curpass = 0
+            shown = False
 
             while curpass < NumPasses:
                 MaxIterations = (1 << (2 * curpass + 6)) + 32
                 Limit = 4
-                allBlack = True
-
-                for y in range(-halfHeight, halfHeight):
-                    if self.restart:
-                        break
-                    if self.abort:
-                        return
-
-                    ay = 1j * (centerY + (y * scaleFactor))
-
-                    for x in range(-halfWidth, halfWidth):
-                        c0 = centerX + (x * scaleFactor) + ay
-                        c = c0
-                        numIterations = 0
-
-                        while numIterations < MaxIterations:
-                            numIterations += 1
-                            c = c*c + c0
-                            if abs(c) >= Limit:
-                                break
-                            numIterations += 1
-                            c = c*c + c0
-                            if abs(c) >= Limit:
-                                break
-                            numIterations += 1
-                            c = c*c + c0
-                            if abs(c) >= Limit:
-                                break
-                            numIterations += 1
-                            c = c*c + c0
-                            if abs(c) >= Limit:
-                                break
-
-                        if numIterations < MaxIterations:
-                            image.setPixel(x + halfWidth, y + halfHeight,
-                                           self.colormap[numIterations % RenderThread.ColormapSize])
-                            allBlack = False
-                        else:
-                            image.setPixel(x + halfWidth, y + halfHeight, qRgb(0, 0, 0))
+                lastPass = curpass == NumPasses - 1
+
+                computed, allBlack = self.renderPass(image, originX, originY,
+                        scaleFactor, MaxIterations, Limit,
+                        lastPass or not shown)
+
+                if self.abort:
+                    return
+                if self.restart:
+                    break
 
                 if allBlack and curpass == 0:
                     curpass = 4
                 else:
-                    if not self.restart:
+                    # Once the view has been shown, passes that were served
+                    # entirely from the cache are not worth showing again.
+                    if computed or lastPass or not shown:
                         self.renderedImage.emit(image, scaleFactor)
+                        shown = True
                     curpass += 1
 
             self.mutex.lock()
@@ -173,6 +280,92 @@ class RenderThread(QThread):
             self.restart = False
             self.mutex.unlock()
 
+    def renderPass(self, image, originX, originY, scaleFactor, maxIterations,
+            limit, force):
+        if image.isNull():
+            return False, False
+
+        tileSize = RenderThread.TileSize
+        scaleKey = float('%.12g' % scaleFactor)
+
+        # Workers may still be running after this pass has been abandoned
+        # and the restart flag has been cleared again, so they also compare
+        # against the number of the request they were started for.
+        generation = self.generation
+        cancelled = lambda: (self.restart or self.abort or
+                self.generation != generation)
+
+        ready = []
+        futures = {}
+        for tileY in range(originY // tileSize,
+                (originY + image.height() - 1) // tileSize + 1):
+            for tileX in range(originX // tileSize,
+                    (originX + image.width() - 1) // tileSize + 1):
+                key = (scaleKey, tileX, tileY)
+                tile = self.cache.find(key)
+                if tile is not None and (tile.isResolved() or
+                        tile.maxIterations >= maxIterations):
+                    ready.append((key, tile))
+                else:
+                    future = self.pool.submit(computeTile, tileX, tileY,
+                            tileSize, scaleFactor, maxIterations, limit, tile,
+                            cancelled)
+                    futures[future] = key
+
+        if not futures and not force:
+            return False, False
+
+        # Fetch the buffer for every pass: the image emitted by the previous
+        # pass is shared with the GUI thread and bits() detaches it.
+        pixels = imageArray(image)
+        allBlack = True
+
+        for key, tile in ready:
+            if self.drawTile(pixels, originX, originY, key, tile):
+                allBlack = False
+
+        for future in as_completed(futures):
+            if cancelled():
+                for pending in futures:
+                    pending.cancel()
+                break
+
+            key = futures[future]
+            tile = future.result()
+            self.cache.insert(key, tile)
+            if self.drawTile(pixels, originX, originY, key, tile):
+                allBlack = False
+
+        return bool(futures), allBlack
+
+    def drawTile(self, pixels, originX, originY, key, tile):
+        """Copy the visible part of a tile into the image.
+
+        Returns whether any of its points escaped.
+        """
+
+        _, tileX, tileY = key
+        tileSize = RenderThread.TileSize
+        height, width = pixels.shape
+
+        left = tileX * tileSize - originX
+        top = tileY * tileSize - originY
+        x0 = max(left, 0)
+        y0 = max(top, 0)
+        x1 = min(left + tileSize, width)
+        y1 = min(top + tileSize, height)
+
+        inside = np.zeros(tileSize * tileSize, dtype=bool)
+        inside[tile.index] = True
+        inside = inside.reshape(tileSize, tileSize)[y0 - top:y1 - top, x0 - left:x1 - left]
+
+        counts = tile.counts[y0 - top:y1 - top, x0 - left:x1 - left]
+        colors = self.colormap[counts % RenderThread.ColormapSize]
+        colors[inside] = qRgb(0, 0, 0)
+        pixels[y0:y1, x0:x1] = colors
+
+        return not inside.all()
+
     def rgbFromWaveLength(self, wave):
         r = 0.0
         g = 0.0